@@ -2,7 +2,8 @@ import gec_metrics
 from gec_metrics.metrics import (
     MetricBaseForReferenceBased,
     MetricBaseForReferenceFree,
-    MetricBaseForSourceFree
+    MetricBaseForSourceFree,
+    ERRANT
 )
 import argparse
 import yaml
@@ -25,11 +26,20 @@ def main():
         metric_config = {}
     scorer = metric_cls(metric_cls.Config(**metric_config))
     srcs = read_lines(args.src)
+    if args.ref_m2 is not None:
+        if isinstance(scorer, ERRANT):
+            # The gold edits are used without parsing the references.
+            _, refs = scorer.load_m2(args.ref_m2)
+        else:
+            _, refs, _ = ERRANT.read_m2(args.ref_m2)
+    elif args.refs is not None:
+        refs = [read_lines(r) for r in args.refs]
+    else:
+        refs = None
     for hyp in args.hyps:
         hyps = read_lines(hyp)
         if isinstance(scorer, MetricBaseForReferenceBased):
-            assert args.refs is not None
-            refs = [read_lines(r) for r in args.refs]
+            assert refs is not None
             score = scorer.score_corpus(
                 srcs, hyps, refs
             )
@@ -38,8 +48,7 @@ def main():
                 srcs, hyps
             )
         elif isinstance(scorer, MetricBaseForSourceFree):
-            assert args.refs is not None
-            refs = [read_lines(r) for r in args.refs]
+            assert refs is not None
             score = scorer.score_corpus(
                 hyps, refs
             )
@@ -50,6 +59,7 @@ def get_parser():
     parser.add_argument('--src', required=True, help='Sources file.')
     parser.add_argument('--hyps', nargs='+', required=True, help='Hypotheses files.')
     parser.add_argument('--refs', nargs='+', help='References files.')
+    parser.add_argument('--ref_m2', help='M2 file of the references. Each annotator is a reference.')
     parser.add_argument('--metric', required=True, choices=gec_metrics.get_metric_ids(), help='ID of the metric.')
     parser.add_argument('--config', help='YAML-based config file.')
     args = parser.parse_args()
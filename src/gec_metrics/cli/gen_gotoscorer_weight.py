@@ -1,6 +1,8 @@
 import argparse
 from gec_metrics.metrics import GoToScorer
+import itertools
 import json
+import textwrap
 
 def annotate_weight(
     source: str,
@@ -18,42 +20,75 @@ def annotate_weight(
             trg=hyp
         ) for hyp in hypotheses
     ]
-    ref_chunks = gotoscorer.generate_chunks(ref_edits, tokens=source.split(' '))
+    tokens = gotoscorer.tokenize(source)
+    ref_chunks = gotoscorer.generate_chunks(ref_edits, tokens=tokens)
     evaluations = [[] for _ in ref_chunks]  # The shape will be (num_chunks, num_hyps)
     for hyp_edits in hyp_edits_list:
-        hyp_chunks = gotoscorer.generate_chunks(hyp_edits, tokens=source.split(' '))
+        # A reference chunk is regarded as correct
+        #   if any of the hypothesis chunks has the same correction.
+        hyp_c_strs = set(
+            h_chunk.c_str for h_chunk in gotoscorer.generate_chunks(hyp_edits, tokens=tokens)
+        )
         for chunk_id, r_chunk in enumerate(ref_chunks):
-            is_correct = False
-            for h_chunk in hyp_chunks:
-                if (r_chunk.o_start, r_chunk.o_end) \
-                    == (r_chunk.o_start, r_chunk.o_end) \
-                    and r_chunk.c_str == h_chunk.c_str:
-                        is_correct = True
-            
-            evaluations[chunk_id].append(int(is_correct))
+            evaluations[chunk_id].append(int(r_chunk.c_str in hyp_c_strs))
     weights = [1 - sum(e) / len(e) for e in evaluations]
     return {
         'evaluations': evaluations,
         'weights': weights
     }
 
+def read_blocks(paths: list[str], block_size: int):
+    '''Read the files in parallel, yielding block_size lines of each file at once.
+        Raise ValueError if the files have different numbers of lines.
+    '''
+    files = [open(path) for path in paths]
+    try:
+        lines = itertools.zip_longest(*[(line.rstrip('\n') for line in f) for f in files])
+        num_lines = 0
+        while True:
+            block = list(itertools.islice(lines, block_size))
+            if block == []:
+                break
+            for sents in block:
+                if None in sents:
+                    short_paths = [path for path, sent in zip(paths, sents) if sent is None]
+                    raise ValueError(
+                        f'{short_paths} have only {num_lines} lines, '
+                        'but the other files have more lines.'
+                    )
+                num_lines += 1
+            yield [list(sents) for sents in zip(*block)]
+    finally:
+        for f in files:
+            f.close()
+
 def main():
     args = get_parser()
-    gotoscorer = GoToScorer(GoToScorer.Config(no_weight=True))
-    sources = open(args.src).read().rstrip().split('\n')
-    references = open(args.ref).read().rstrip().split('\n')
-    hypotheses = [open(h).read().rstrip().split('\n') for h in args.hyps]
-    data = []
-    for sent_id in range(len(sources)):
-        results = annotate_weight(
-            source=sources[sent_id],
-            reference=references[sent_id],
-            hypotheses=[hyp[sent_id] for hyp in hypotheses],
-            gotoscorer=gotoscorer
-        )
-        data.append(results)
+    gotoscorer = GoToScorer(GoToScorer.Config(
+        no_weight=True,
+        num_workers=args.num_workers
+    ))
+    num_sents = 0
     with open(args.out, 'w') as fp:
-        json.dump(data, fp, indent=2)
+        fp.write('[')
+        for sources, references, *hypotheses in read_blocks(
+            [args.src, args.ref] + args.hyps, args.block_size
+        ):
+            # Parse and extract edits of the block for all systems at once.
+            gotoscorer.prepare_edit_extraction(sources, [references] + hypotheses)
+            for sent_id in range(len(sources)):
+                results = annotate_weight(
+                    source=sources[sent_id],
+                    reference=references[sent_id],
+                    hypotheses=[hyp[sent_id] for hyp in hypotheses],
+                    gotoscorer=gotoscorer
+                )
+                # The same format as json.dump(data, fp, indent=2).
+                fp.write((',\n' if num_sents else '\n') \
+                    + textwrap.indent(json.dumps(results, indent=2), '  '))
+                num_sents += 1
+            gotoscorer.clear_memory_cache()
+        fp.write('\n]' if num_sents else ']')
 
 def get_parser():
     parser = argparse.ArgumentParser()
@@ -61,8 +96,10 @@ def get_parser():
     parser.add_argument('--ref', required=True)
     parser.add_argument('--hyps', nargs='+', required=True)
     parser.add_argument('--out', default='sample_weight.json')
+    parser.add_argument('--num_workers', type=int, default=1, help='The number of processes to parse and extract edits.')
+    parser.add_argument('--block_size', type=int, default=10000, help='The number of sentences processed and written at once.')
     args = parser.parse_args()
     return args
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -1,9 +1,11 @@
 import abc
 from dataclasses import dataclass
 import itertools
+from typing import Callable, Hashable
 from gecommon import apply_edits
 import numpy as np
 import trueskill
+from .cache import LRUCache, PersistentCache, CacheInfo
 
 class MetricBase(abc.ABC):
     @dataclass
@@ -13,6 +15,44 @@ class MetricBase(abc.ABC):
         self.config = config if config is not None else self.Config()
         self.apply_edits = apply_edits
 
+    def cache_info(self) -> dict[str, CacheInfo]:
+        '''Get the statistics of the caches held by the metric.
+
+        Returns:
+            dict[str, CacheInfo]: The attribute name of the cache and its statistics.
+                It contains hits, misses, evictions, num_entries and num_bytes.
+        '''
+        return {
+            name: cache.info() for name, cache in vars(self).items() \
+                if isinstance(cache, (LRUCache, PersistentCache))
+        }
+
+    def score_deduplicated(
+        self,
+        keys: list[list[Hashable]],
+        score_fn: Callable[[list[Hashable]], list[float]]
+    ) -> list[list[float]]:
+        '''Score the inputs of multiple systems, where the identical inputs are scored once.
+            Systems often output the same sentence, e.g. the unchanged source,
+            thus the unique inputs are scored at once and the scores are scattered back.
+
+        Args:
+            keys (list[list[Hashable]]): The key of each input, e.g., (source, hypothesis).
+                The inputs having the same key must have the same score.
+                The shape is (num_systems, num_sentences).
+            score_fn (Callable[[list[Hashable]], list[float]]): The function that receives
+                the unique keys and returns the score for each of them.
+
+        Returns:
+            list[list[float]]: The scores of the inputs.
+                The shape is (num_systems, num_sentences).
+        '''
+        # dict keeps the order of the first occurrences.
+        unique_keys = list(dict.fromkeys(k for sys_keys in keys for k in sys_keys))
+        unique_scores = score_fn(unique_keys) if unique_keys else []
+        key2score = dict(zip(unique_keys, unique_scores))
+        return [[key2score[k] for k in sys_keys] for sys_keys in keys]
+
     def make_pairwise_scores(
         self,
         scores: list[list[float]]
@@ -157,6 +197,8 @@ class MetricBaseForReferenceBased(MetricBase, metaclass=abc.ABCMeta):
         - tn: True Negative.
         - beta: The beta for F-beta score. 
         '''
+        __slots__ = ('tp', 'fp', 'fn', 'tn', 'beta')
+
         def __init__(
             self,
             tp: float=0.0,
@@ -180,13 +222,21 @@ class MetricBaseForReferenceBased(MetricBase, metaclass=abc.ABCMeta):
                 tn=self.tn + other.tn,
                 beta=self.beta
             )
+
+        def __iadd__(self, other) -> "Score":
+            '''This overloads += operation to accumulate in place.'''
+            self.tp += other.tp
+            self.fp += other.fp
+            self.fn += other.fn
+            self.tn += other.tn
+            return self
         
         def __lt__(self, other):
             '''This overloads < operation.
                 We first compare F-score, then compare tp, then fp, finally fn.
             '''
-            return [self.f, self.tp, -self.fp, -self.fn] \
-                < [other.f, other.tp, -other.fp, -other.fn]
+            return (self.f, self.tp, -self.fp, -self.fn) \
+                < (other.f, other.tp, -other.fp, -other.fn)
 
         @property
         def precision(self) -> float:
@@ -223,6 +273,136 @@ class MetricBaseForReferenceBased(MetricBase, metaclass=abc.ABCMeta):
             '''This call when you use print() method.'''
             return f"F-{self.beta}={self.f}\n Prec={self.precision}\n Rec={self.recall}\n TP={self.tp}, FP={self.fp}, FN={self.fn}, TN={self.tn}\n"
 
+    class Scores:
+        '''Handle edit or n-gram counts of many scores at once, e.g., for each sentence and reference.
+            The precision, the recall and the F-beta score are computed in batch
+                and are the same as those of Score.
+        - counts: The array whose last axis is TP, FP, FN, and TN.
+            The missing ones are regarded as 0, e.g., the shape can be (..., 2) for TP and FP.
+        - beta: The beta for F-beta score.
+
+        .. code-block:: python
+
+            scores = MetricBaseForReferenceBased.Scores(np.array([[1, 1], [2, 0]]))
+            scores.precision  # array([0.5, 1. ])
+            scores[0]  # Score
+        '''
+        def __init__(self, counts: np.ndarray, beta: float = 0.5):
+            counts = np.asarray(counts, dtype=np.float64)
+            if counts.shape[-1] < 4:
+                pad = [(0, 0)] * (counts.ndim - 1) + [(0, 4 - counts.shape[-1])]
+                counts = np.pad(counts, pad)
+            self.counts: np.ndarray = counts
+            self.beta: float = beta
+
+        @classmethod
+        def from_scores(cls, scores: list, beta: float = None) -> "Scores":
+            '''Convert a (nested) list of Score into Scores.'''
+            def to_list(x):
+                if isinstance(x, MetricBaseForReferenceBased.Score):
+                    return [x.tp, x.fp, x.fn, x.tn]
+                return [to_list(y) for y in x]
+            if beta is None:
+                first = scores
+                while not isinstance(first, MetricBaseForReferenceBased.Score):
+                    first = first[0]
+                beta = first.beta
+            return cls(np.array(to_list(scores), dtype=np.float64), beta=beta)
+
+        @property
+        def shape(self) -> tuple[int]:
+            return self.counts.shape[:-1]
+
+        def __len__(self) -> int:
+            return len(self.counts)
+
+        def __getitem__(self, index) -> "Scores | Score":
+            '''Index the scores except the last axis. A single element is returned as Score.'''
+            counts = self.counts[index]
+            if counts.ndim == 1:
+                tp, fp, fn, tn = counts.tolist()
+                return MetricBaseForReferenceBased.Score(
+                    tp=tp, fp=fp, fn=fn, tn=tn, beta=self.beta
+                )
+            return self.__class__(counts, beta=self.beta)
+
+        def __add__(self, other) -> "Scores":
+            '''This overloads + operation. Score is broadcast.'''
+            if isinstance(other, MetricBaseForReferenceBased.Score):
+                other = self.__class__([other.tp, other.fp, other.fn, other.tn])
+            return self.__class__(self.counts + other.counts, beta=self.beta)
+
+        def sum(self, axis: int | tuple[int] = None) -> "Scores | Score":
+            '''Accumulate the counts over the axes. If None, over all axes.'''
+            if axis is None:
+                axis = tuple(range(self.counts.ndim - 1))
+            return self.__class__(self.counts.sum(axis=axis), beta=self.beta)[()]
+
+        def tolist(self) -> list:
+            '''Convert into a nested list of Score.'''
+            if self.counts.ndim == 1:
+                return self[()]
+            if self.counts.ndim == 2:
+                return [self[i] for i in range(len(self))]
+            return [self[i].tolist() for i in range(len(self))]
+
+        @property
+        def tp(self) -> np.ndarray:
+            return self.counts[..., 0]
+
+        @property
+        def fp(self) -> np.ndarray:
+            return self.counts[..., 1]
+
+        @property
+        def fn(self) -> np.ndarray:
+            return self.counts[..., 2]
+
+        @property
+        def tn(self) -> np.ndarray:
+            return self.counts[..., 3]
+
+        @staticmethod
+        def ratio(numer: np.ndarray, denom: np.ndarray, is_one: np.ndarray) -> np.ndarray:
+            '''numer / denom, but 1.0 where is_one is True.'''
+            return np.divide(
+                numer, denom, out=np.ones_like(numer), where=~is_one
+            )
+
+        @property
+        def precision(self) -> np.ndarray:
+            '''Calculate the precision.'''
+            return self.ratio(self.tp, self.tp + self.fp, self.fp == 0)
+
+        @property
+        def recall(self) -> np.ndarray:
+            '''Calculate the recall.'''
+            return self.ratio(self.tp, self.tp + self.fn, self.fn == 0)
+
+        @property
+        def f(self) -> np.ndarray:
+            '''Calculate the F-beta score.'''
+            p = self.precision
+            r = self.recall
+            beta = self.beta
+            denom = ((beta**2)*p)+r
+            return np.divide(
+                (1+(beta**2))*p*r, denom,
+                out=np.zeros_like(p), where=(p + r) != 0
+            )
+
+        @property
+        def accuracy(self) -> np.ndarray:
+            '''Calculate the accuracy.'''
+            total = self.tp + self.fp + self.fn + self.tn
+            return np.divide(
+                self.tp + self.tn, total,
+                out=np.zeros_like(total), where=total != 0
+            )
+
+        def __repr__(self):
+            return f"Scores(shape={self.shape}, beta={self.beta})"
+
     def score_corpus(
         self,
         sources: list[str],
@@ -250,6 +430,293 @@ class MetricBaseForReferenceBased(MetricBase, metaclass=abc.ABCMeta):
         )
         return sum(scores) / len(scores)
         
+    # Whether the statistics of score_stats() can be summed over sentences.
+    additive_stats: bool = True
+
+    @dataclass
+    class Stats:
+        '''Sufficient statistics of the consecutive sentences
+            [offset, offset + num_sents) of a corpus.
+        - offset (int): The index of the first sentence in the corpus.
+        - num_sents (int): The number of sentences.
+        - counts (dict[str, np.ndarray]): The statistics.
+            The content depends on the metric.
+        '''
+        offset: int = 0
+        num_sents: int = 0
+        counts: dict[str, np.ndarray] = None
+
+        def to_dict(self) -> dict:
+            '''Convert into a JSON serializable dictionary.'''
+            return {
+                'offset': self.offset,
+                'num_sents': self.num_sents,
+                'counts': {k: v.tolist() for k, v in self.counts.items()}
+            }
+
+        @classmethod
+        def from_dict(cls, data: dict) -> "Stats":
+            '''Restore the statistics from the output of to_dict().'''
+            return cls(
+                offset=data['offset'],
+                num_sents=data['num_sents'],
+                counts={k: np.array(v) for k, v in data['counts'].items()}
+            )
+
+    def score_stats(
+        self,
+        sources: list[str],
+        hypotheses: list[str],
+        references: list[list[str]],
+        offset: int = 0
+    ) -> Stats:
+        '''Calculate the sufficient statistics of a shard of a corpus.
+            The statistics of shards can be combined by merge(),
+                and finalize() computes the exact corpus-level score.
+
+        .. code-block:: python
+
+            stats1 = metric.score_stats(srcs[:100], hyps[:100], [r[:100] for r in refs])
+            stats2 = metric.score_stats(srcs[100:], hyps[100:], [r[100:] for r in refs], offset=100)
+            score = metric.finalize(metric.merge([stats1, stats2]))
+            # The same as metric.score_corpus(srcs, hyps, refs)
+
+        Args:
+            sources (list[str]): Source sentence.
+                The shape is (num_sentences, )
+            hypotheses (list[str]): Corrected sentences.
+                The shape is (num_sentences, )
+            references (list[list[str]]): Reference sentences.
+                The shape is (num_references, num_sentences).
+            offset (int): The index of the first sentence in the whole corpus.
+
+        Returns:
+            Stats: The statistics.
+        '''
+        return self.reduce_stats(self.sentence_stats(
+            sources, hypotheses, references, offset=offset
+        ))
+
+    def sentence_stats(
+        self,
+        sources: list[str],
+        hypotheses: list[str],
+        references: list[list[str]],
+        offset: int = 0
+    ) -> Stats:
+        '''Calculate the sufficient statistics for each sentence.
+            Each value of Stats.counts has the sentence axis first,
+                i.e., the shape is (num_sents, ...).
+
+        Args:
+            sources (list[str]): Source sentence.
+                The shape is (num_sentences, )
+            hypotheses (list[str]): Corrected sentences.
+                The shape is (num_sentences, )
+            references (list[list[str]]): Reference sentences.
+                The shape is (num_references, num_sentences).
+            offset (int): The index of the first sentence in the whole corpus.
+
+        Returns:
+            Stats: The sentence-level statistics.
+        '''
+        raise NotImplementedError(f'{self.__class__.__name__} does not support sentence_stats().')
+
+    def reduce_stats(self, stats: Stats, corpus_size: int = None) -> Stats:
+        '''Reduce the output of sentence_stats() into the output of score_stats().
+            By default, the statistics are summed over sentences.
+
+        Args:
+            stats (Stats): The sentence-level statistics.
+            corpus_size (int): The number of sentences in the whole corpus.
+                If None, it is not known.
+
+        Returns:
+            Stats: The statistics of the sentences.
+        '''
+        return self.Stats(
+            offset=stats.offset,
+            num_sents=stats.num_sents,
+            counts={k: v.sum(axis=0) for k, v in stats.counts.items()}
+        )
+
+    def merge(self, stats: list[Stats]) -> Stats:
+        '''Merge the statistics of shards.
+            The shards must cover consecutive sentences without overlap.
+
+        Args:
+            stats (list[Stats]): The statistics of shards in any order.
+
+        Returns:
+            Stats: The merged statistics.
+        '''
+        stats = sorted(stats, key=lambda s: s.offset)
+        for prev, cur in zip(stats, stats[1:]):
+            if prev.offset + prev.num_sents != cur.offset:
+                raise ValueError(
+                    'The statistics should cover consecutive sentences without overlap, '
+                    f'but got offset={cur.offset} after [{prev.offset}, {prev.offset + prev.num_sents}).'
+                )
+        return self.Stats(
+            offset=stats[0].offset,
+            num_sents=sum(s.num_sents for s in stats),
+            counts={
+                k: self.merge_counts(k, [s.counts[k] for s in stats]) \
+                    for k in stats[0].counts
+            }
+        )
+
+    def merge_counts(self, key: str, counts: list[np.ndarray]) -> np.ndarray:
+        '''Merge the statistics of the same key. By default, they are summed.
+
+        Args:
+            key (str): The key of Stats.counts.
+            counts (list[np.ndarray]): The statistics in the order of sentences.
+
+        Returns:
+            np.ndarray: The merged statistics.
+        '''
+        return np.sum(counts, axis=0)
+
+    def finalize(self, stats: Stats) -> float:
+        '''Compute the corpus-level score from the statistics.
+
+        Args:
+            stats (Stats): The statistics of the whole corpus.
+
+        Returns:
+            float: The corpus-level score.
+        '''
+        raise NotImplementedError(f'{self.__class__.__name__} does not support finalize().')
+
+    def incremental_scorer(
+        self,
+        sources: list[str],
+        hypotheses: list[str],
+        references: list[list[str]]
+    ) -> "IncrementalScorer":
+        '''Create IncrementalScorer.
+
+        Args:
+            sources (list[str]): Source sentence.
+                The shape is (num_sentences, )
+            hypotheses (list[str]): Corrected sentences.
+                The shape is (num_sentences, )
+            references (list[list[str]]): Reference sentences.
+                The shape is (num_references, num_sentences).
+
+        Returns:
+            IncrementalScorer: The scorer.
+        '''
+        return self.IncrementalScorer(self, sources, hypotheses, references)
+
+    class IncrementalScorer:
+        '''Keep the sentence-level statistics to refresh the corpus-level score
+            when only a part of hypotheses is changed.
+            Only the changed sentences are evaluated again.
+            If the statistics of the metric are additive (metric.additive_stats),
+                the corpus-level statistics are also updated by the difference.
+            Removed sentences are excluded from the corpus,
+                but the other sentences keep their ids.
+
+        .. code-block:: python
+
+            scorer = metric.incremental_scorer(srcs, hyps, refs)
+            scorer.score()  # The same as metric.score_corpus(srcs, hyps, refs)
+            scorer.update(3, 'A new hypothesis .')
+            scorer.remove(5)
+            scorer.score()
+
+        Args:
+            metric (MetricBaseForReferenceBased): The metric supporting sentence_stats().
+            sources (list[str]): Source sentence.
+                The shape is (num_sentences, )
+            hypotheses (list[str]): Corrected sentences.
+                The shape is (num_sentences, )
+            references (list[list[str]]): Reference sentences.
+                The shape is (num_references, num_sentences).
+        '''
+        def __init__(
+            self,
+            metric: "MetricBaseForReferenceBased",
+            sources: list[str],
+            hypotheses: list[str],
+            references: list[list[str]]
+        ):
+            self.metric = metric
+            self.sources = sources
+            self.hypotheses = list(hypotheses)
+            self.references = references
+            stats = metric.sentence_stats(sources, hypotheses, references)
+            self.counts = stats.counts  # The shape of each value is (num_sents, ...)
+            self.active = np.ones(len(sources), dtype=bool)
+            self.total = None
+            if metric.additive_stats:
+                self.total = metric.reduce_stats(stats, len(sources))
+
+        def sentence(self, sent_id: int) -> "MetricBaseForReferenceBased.Stats":
+            '''The statistics of a sentence.'''
+            return self.metric.Stats(
+                offset=sent_id,
+                num_sents=1,
+                counts={k: v[sent_id:sent_id+1] for k, v in self.counts.items()}
+            )
+
+        def accumulate(self, sent_id: int, sign: int) -> None:
+            '''Add (sign=1) or subtract (sign=-1) a sentence to the corpus-level statistics.'''
+            stats = self.metric.reduce_stats(self.sentence(sent_id), len(self.sources))
+            for k, v in stats.counts.items():
+                self.total.counts[k] = self.total.counts[k] + sign * v
+            self.total.num_sents += sign
+
+        def update(self, sent_id: int, hypothesis: str) -> None:
+            '''Replace the hypothesis of a sentence.
+                A removed sentence is added again.
+
+            Args:
+                sent_id (int): The sentence id.
+                hypothesis (str): The new hypothesis.
+            '''
+            stats = self.metric.sentence_stats(
+                [self.sources[sent_id]],
+                [hypothesis],
+                [[ref[sent_id]] for ref in self.references],
+                offset=sent_id
+            )
+            if self.total is not None and self.active[sent_id]:
+                self.accumulate(sent_id, -1)
+            for k, v in stats.counts.items():
+                self.counts[k][sent_id] = v[0]
+            self.hypotheses[sent_id] = hypothesis
+            self.active[sent_id] = True
+            if self.total is not None:
+                self.accumulate(sent_id, 1)
+
+        def remove(self, sent_id: int) -> None:
+            '''Exclude a sentence from the corpus.
+
+            Args:
+                sent_id (int): The sentence id.
+            '''
+            if not self.active[sent_id]:
+                return
+            if self.total is not None:
+                self.accumulate(sent_id, -1)
+            self.active[sent_id] = False
+
+        def score(self) -> float:
+            '''The corpus-level score of the current hypotheses.'''
+            if self.total is not None:
+                return self.metric.finalize(self.total)
+            stats = self.metric.Stats(
+                offset=0,
+                num_sents=int(self.active.sum()),
+                counts={k: v[self.active] for k, v in self.counts.items()}
+            )
+            return self.metric.finalize(
+                self.metric.reduce_stats(stats, len(self.sources))
+            )
+
         
     @abc.abstractmethod
     def score_sentence(
@@ -354,7 +821,12 @@ class MetricBaseForReferenceBased(MetricBase, metaclass=abc.ABCMeta):
     
 class MetricBaseForReferenceFree(MetricBase, metaclass=abc.ABCMeta):
     @dataclass
-    class Config(MetricBase.Config): ...
+    class Config(MetricBase.Config):
+        '''Reference-free metric configuration.
+            - deduplicate (bool): If True, score_pairwise() and rank_systems()
+                score each unique (source, hypothesis) pair once across the systems.
+        '''
+        deduplicate: bool = True
 
     def score_corpus(
         self,
@@ -362,7 +834,10 @@ class MetricBaseForReferenceFree(MetricBase, metaclass=abc.ABCMeta):
         hypotheses: list[str]
     ) -> float:
         '''Calculate a corpus-level score.
-        By default, we use the average of the sentence-level scores.
+        The sentence-level scores are aggregated by aggregate_sentence_scores().
+        To customize the aggregation, override aggregate_sentence_scores() rather than this,
+            so that rank_systems() can share the sentence-level scores among systems.
+            If this is overridden, rank_systems() calls it for each system.
 
         Args:
             sources (list[str]): Source sentence.
@@ -377,6 +852,19 @@ class MetricBaseForReferenceFree(MetricBase, metaclass=abc.ABCMeta):
             sources=sources,
             hypotheses=hypotheses
         )
+        return self.aggregate_sentence_scores(scores)
+
+    def aggregate_sentence_scores(self, scores: list[float]) -> float:
+        '''Aggregate sentence-level scores into a corpus-level score.
+        By default, we use the average of the sentence-level scores.
+
+        Args:
+            scores (list[float]): The sentence-level scores.
+                The shape is (num_sentences, )
+
+        Returns:
+            float: The corpus-level score.
+        '''
         return sum(scores) / len(scores)
         
         
@@ -398,6 +886,38 @@ class MetricBaseForReferenceFree(MetricBase, metaclass=abc.ABCMeta):
             list[float]: The sentence-level scores.
         '''
         raise NotImplementedError
+
+    def score_sentence_systems(
+        self,
+        sources: list[str],
+        hypotheses: list[list[str]]
+    ) -> list[list[float]]:
+        '''Calculate sentence-level scores of multiple systems.
+        If config.deduplicate is True, each unique (source, hypothesis) pair is scored once.
+
+        Args:
+            sources (list[str]): Source sentence.
+                The shape is (num_sentences, )
+            hypotheses (list[list[str]]): Corrected sentences.
+                The shape is (num_systems, num_sentences).
+
+        Returns:
+            list[list[float]]: The sentence-level scores.
+                The shape is (num_systems, num_sentences).
+        '''
+        if not self.config.deduplicate:
+            return [
+                self.score_sentence(sources, hyps) for hyps in hypotheses
+            ]
+        def score_fn(keys):
+            return self.score_sentence(
+                [s for s, _ in keys],
+                [h for _, h in keys]
+            )
+        return self.score_deduplicated(
+            [list(zip(sources, hyps)) for hyps in hypotheses],
+            score_fn
+        )
     
     def score_pairwise(
         self,
@@ -417,11 +937,9 @@ class MetricBaseForReferenceFree(MetricBase, metaclass=abc.ABCMeta):
             list[list[list]]: Pairwise comparison resutls.
                 The shape is (num_sentences, num_systems, num_systems).
         '''
-        scores = [
-            self.score_sentence(
-                sources, hyps
-            ) for hyps in hypotheses
-        ]  # (num_systems, num_sentences)
+        scores = self.score_sentence_systems(
+            sources, hypotheses
+        )  # (num_systems, num_sentences)
         return self.make_pairwise_scores(scores)
     
     def rank_systems(
@@ -448,11 +966,16 @@ class MetricBaseForReferenceFree(MetricBase, metaclass=abc.ABCMeta):
             list[float]: System-level scores.
         '''
         if aggregation == "default":
-            scores = [
-                self.score_corpus(
-                    sources, hyps
-                ) for hyps in hypotheses
-            ]  # (num_systems, num_sentences)
+            if type(self).score_corpus is not MetricBaseForReferenceFree.score_corpus:
+                # Respect the corpus-level score of the subclass.
+                scores = [
+                    self.score_corpus(sources, hyps) for hyps in hypotheses
+                ]  # (num_systems, )
+            else:
+                scores = [
+                    self.aggregate_sentence_scores(s) \
+                        for s in self.score_sentence_systems(sources, hypotheses)
+                ]  # (num_systems, )
         else:
             rating_functions = {
                 'trueskill': self.run_trueskill,
@@ -475,7 +998,12 @@ class MetricBaseForSourceFree(MetricBase, metaclass=abc.ABCMeta):
             (that will be a component of PT-{ERRANT, M2}.).
     '''
     @dataclass
-    class Config(MetricBase.Config): ...
+    class Config(MetricBase.Config):
+        '''Source-free metric configuration.
+            - deduplicate (bool): If True, score_pairwise() and rank_systems()
+                score each unique (hypothesis, references) pair once across the systems.
+        '''
+        deduplicate: bool = True
 
     def score_corpus(
         self,
@@ -483,7 +1011,10 @@ class MetricBaseForSourceFree(MetricBase, metaclass=abc.ABCMeta):
         references: list[list[str]]
     ) -> float:
         '''Calculate a corpus-level score.
-        By default, we use the average of the sentence-level scores.
+        The sentence-level scores are aggregated by aggregate_sentence_scores().
+        To customize the aggregation, override aggregate_sentence_scores() rather than this,
+            so that rank_systems() can share the sentence-level scores among systems.
+            If this is overridden, rank_systems() calls it for each system.
 
         Args:
             hypotheses (list[str]): Corrected sentences.
@@ -498,6 +1029,19 @@ class MetricBaseForSourceFree(MetricBase, metaclass=abc.ABCMeta):
             hypotheses=hypotheses,
             references=references
         )
+        return self.aggregate_sentence_scores(scores)
+
+    def aggregate_sentence_scores(self, scores: list[float]) -> float:
+        '''Aggregate sentence-level scores into a corpus-level score.
+        By default, we use the average of the sentence-level scores.
+
+        Args:
+            scores (list[float]): The sentence-level scores.
+                The shape is (num_sentences, )
+
+        Returns:
+            float: The corpus-level score.
+        '''
         return sum(scores) / len(scores)
         
         
@@ -519,6 +1063,40 @@ class MetricBaseForSourceFree(MetricBase, metaclass=abc.ABCMeta):
             list[float]: The sentence-level scores.
         '''
         raise NotImplementedError
+
+    def score_sentence_systems(
+        self,
+        hypotheses: list[list[str]],
+        references: list[list[str]]
+    ) -> list[list[float]]:
+        '''Calculate sentence-level scores of multiple systems.
+        If config.deduplicate is True, each unique (hypothesis, references) pair is scored once.
+
+        Args:
+            hypotheses (list[list[str]]): Corrected sentences.
+                The shape is (num_systems, num_sentences).
+            references (list[list[str]]): Reference sentences.
+                The shape is (num_references, num_sentences).
+
+        Returns:
+            list[list[float]]: The sentence-level scores.
+                The shape is (num_systems, num_sentences).
+        '''
+        if not self.config.deduplicate:
+            return [
+                self.score_sentence(hyps, references) for hyps in hypotheses
+            ]
+        # (num_sentences, num_references)
+        sent_refs = list(zip(*references))
+        def score_fn(keys):
+            return self.score_sentence(
+                [h for h, _ in keys],
+                [list(refs) for refs in zip(*[r for _, r in keys])]
+            )
+        return self.score_deduplicated(
+            [list(zip(hyps, sent_refs)) for hyps in hypotheses],
+            score_fn
+        )
     
     def score_pairwise(
         self,
@@ -538,11 +1116,9 @@ class MetricBaseForSourceFree(MetricBase, metaclass=abc.ABCMeta):
             list[list[list]]: Pairwise comparison resutls.
                 The shape is (num_sentences, num_systems, num_systems).
         '''
-        scores = [
-            self.score_sentence(
-                hyps, references
-            ) for hyps in hypotheses
-        ]  # (num_systems, num_sentences)
+        scores = self.score_sentence_systems(
+            hypotheses, references
+        )  # (num_systems, num_sentences)
         return self.make_pairwise_scores(scores)
     
     def rank_systems(
@@ -569,11 +1145,16 @@ class MetricBaseForSourceFree(MetricBase, metaclass=abc.ABCMeta):
             list[float]: System-level scores.
         '''
         if aggregation == "default":
-            scores = [
-                self.score_corpus(
-                    hyps, references
-                ) for hyps in hypotheses
-            ]  # (num_systems, num_sentences)
+            if type(self).score_corpus is not MetricBaseForSourceFree.score_corpus:
+                # Respect the corpus-level score of the subclass.
+                scores = [
+                    self.score_corpus(hyps, references) for hyps in hypotheses
+                ]  # (num_systems, )
+            else:
+                scores = [
+                    self.aggregate_sentence_scores(s) \
+                        for s in self.score_sentence_systems(hypotheses, references)
+                ]  # (num_systems, )
         else:
             rating_functions = {
                 'trueskill': self.run_trueskill,
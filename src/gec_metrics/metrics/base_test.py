@@ -1,5 +1,12 @@
-from .base import MetricBase
+from .base import (
+    MetricBase,
+    MetricBaseForReferenceBased,
+    MetricBaseForReferenceFree,
+    MetricBaseForSourceFree
+)
+import itertools
 import math
+import numpy as np
 
 class TestMetricBase:
     def test_expected_wins(self):
@@ -30,4 +37,91 @@ class TestMetricBase:
         assert all(
             math.isclose(s1, s2, abs_tol=1e-6) 
             for s1, s2 in zip(scores, [0.75, 0.50, 0.25])
-        )
\ No newline at end of file
+        )
+
+class LengthDiff(MetricBaseForReferenceFree):
+    '''Toy metric that records its inputs.'''
+    def __init__(self, config=None):
+        super().__init__(config)
+        self.inputs = []
+
+    def score_sentence(self, sources, hypotheses):
+        self.inputs += list(zip(sources, hypotheses))
+        return [len(h) - len(s) for s, h in zip(sources, hypotheses)]
+
+class RefLengthDiff(MetricBaseForSourceFree):
+    '''Toy metric that records its inputs.'''
+    def __init__(self, config=None):
+        super().__init__(config)
+        self.inputs = []
+
+    def score_sentence(self, hypotheses, references):
+        self.inputs += hypotheses
+        return [
+            sum(len(h) - len(r) for r in refs) for h, *refs in zip(hypotheses, *references)
+        ]
+
+class MaxLengthDiff(LengthDiff):
+    '''Toy metric that overrides score_corpus().'''
+    def score_corpus(self, sources, hypotheses):
+        return max(self.score_sentence(sources, hypotheses))
+
+class TestDeduplicate:
+    sources = ['a b', 'c d', 'a b']
+    hypotheses = [
+        ['a b', 'c e', 'a c'],
+        ['a b', 'c e f', 'a c'],
+        ['a bb', 'c e', 'a b']
+    ]
+    references = [['a bb', 'c e', 'a bb']]
+
+    def test_reference_free(self):
+        metric = LengthDiff()
+        scores = metric.rank_systems(self.sources, self.hypotheses)
+        # ('a b', 'a b') appears in three systems and at two sentences.
+        assert len(metric.inputs) == len(set(metric.inputs)) == 5
+        metric_nodup = LengthDiff(LengthDiff.Config(deduplicate=False))
+        assert scores == metric_nodup.rank_systems(self.sources, self.hypotheses)
+        assert scores == [
+            metric.score_corpus(self.sources, hyps) for hyps in self.hypotheses
+        ]
+        assert metric.score_pairwise(self.sources, self.hypotheses) \
+            == metric_nodup.score_pairwise(self.sources, self.hypotheses)
+
+    def test_overridden_score_corpus(self):
+        metric = MaxLengthDiff()
+        assert metric.rank_systems(self.sources, self.hypotheses) == [
+            metric.score_corpus(self.sources, hyps) for hyps in self.hypotheses
+        ] == [0, 2, 1]
+
+    def test_source_free(self):
+        metric = RefLengthDiff()
+        scores = metric.rank_systems(self.hypotheses, self.references)
+        # ('a b', ['a bb']) appears at the first and the last sentences.
+        assert len(metric.inputs) == 5
+        metric_nodup = RefLengthDiff(RefLengthDiff.Config(deduplicate=False))
+        assert scores == metric_nodup.rank_systems(self.hypotheses, self.references)
+        assert metric.score_pairwise(self.hypotheses, self.references) \
+            == metric_nodup.score_pairwise(self.hypotheses, self.references)
+
+class TestScores:
+    def test_same_as_score(self):
+        Score = MetricBaseForReferenceBased.Score
+        Scores = MetricBaseForReferenceBased.Scores
+        # Including zero counts
+        counts = [list(c) for c in itertools.product([0, 1, 3], repeat=4)]
+        scores = Scores(np.array(counts), beta=2)
+        for i, (tp, fp, fn, tn) in enumerate(counts):
+            score = Score(tp=tp, fp=fp, fn=fn, tn=tn, beta=2)
+            assert scores.precision[i] == score.precision
+            assert scores.recall[i] == score.recall
+            assert scores.f[i] == score.f
+            assert scores.accuracy[i] == score.accuracy
+            assert scores[i].f == score.f
+        total = Score(beta=2)
+        for tp, fp, fn, tn in counts:
+            total += Score(tp=tp, fp=fp, fn=fn, tn=tn)
+        assert scores.sum().f == total.f
+        assert Scores.from_scores(scores.tolist()).counts.tolist() == scores.counts.tolist()
+        # TP and FP only
+        assert Scores(np.array([[1, 3]])).fn.tolist() == [0]
@@ -0,0 +1,63 @@
+from typing import Any, Callable
+
+def length_batches(
+    lengths: list[int],
+    batch_size: int,
+    max_tokens: int = None
+) -> list[list[int]]:
+    '''Split the inputs into batches of similar lengths to reduce padding.
+    The inputs are sorted in descending order of length,
+        thus the first one of each batch is the longest.
+
+    Args:
+        lengths (list[int]): The number of tokens of each input.
+        batch_size (int): The maximum number of inputs in a batch.
+        max_tokens (int): The maximum number of tokens in a batch including padding,
+            i.e., (the longest length) * (the number of inputs).
+            If None, only batch_size is used. A longer input than it makes a batch alone.
+
+    Returns:
+        list[list[int]]: The indices of the inputs for each batch.
+
+    .. code-block:: python
+
+        length_batches([3, 10, 4, 9], batch_size=2)  # [[1, 3], [2, 0]]
+    '''
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches = []
+    batch = []
+    for i in order:
+        if batch and (
+            len(batch) >= batch_size
+            or (max_tokens is not None and lengths[batch[0]] * (len(batch) + 1) > max_tokens)
+        ):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+def run_length_batches(
+    fn: Callable[[list[int]], list[Any]],
+    lengths: list[int],
+    batch_size: int,
+    max_tokens: int = None
+) -> list[Any]:
+    '''Run the inference for each batch of length_batches() and restore the original order.
+
+    Args:
+        fn (Callable[[list[int]], list[Any]]): The function that receives the indices of a batch
+            and returns the result for each of them.
+        lengths (list[int]): The number of tokens of each input.
+        batch_size (int): The maximum number of inputs in a batch.
+        max_tokens (int): The maximum number of tokens in a batch including padding.
+
+    Returns:
+        list[Any]: The results in the order of the inputs.
+    '''
+    results = [None] * len(lengths)
+    for batch in length_batches(lengths, batch_size, max_tokens):
+        for i, result in zip(batch, fn(batch)):
+            results[i] = result
+    return results
@@ -0,0 +1,23 @@
+from .batching import length_batches, run_length_batches
+
+class TestLengthBatches:
+    def test_batch_size(self):
+        batches = length_batches([3, 10, 4, 9, 1], batch_size=2)
+        assert batches == [[1, 3], [2, 0], [4]]
+
+    def test_max_tokens(self):
+        # 10 * 2 > 15, thus the longest one makes a batch alone.
+        batches = length_batches([3, 10, 4, 9, 1], batch_size=4, max_tokens=15)
+        assert batches == [[1], [3], [2, 0, 4]]
+        # Longer than max_tokens
+        assert length_batches([20], batch_size=4, max_tokens=15) == [[0]]
+
+    def test_run_length_batches(self):
+        lengths = [3, 10, 4, 9, 1]
+        results = run_length_batches(
+            lambda ids: [lengths[i] * 2 for i in ids],
+            lengths,
+            batch_size=2
+        )
+        assert results == [6, 20, 8, 18, 2]
+        assert run_length_batches(lambda ids: ids, [], batch_size=2) == []
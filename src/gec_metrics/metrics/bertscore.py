@@ -1,6 +1,10 @@
 from .base import MetricBaseForSourceFree
+from .cache import LRUCache
 from dataclasses import dataclass
 from bert_score import BERTScorer
+from bert_score.utils import get_bert_embedding, greedy_cos_idf
+from collections import defaultdict
+from torch.nn.utils.rnn import pad_sequence
 import os
 import torch
 
@@ -20,6 +24,10 @@ class BertScore(MetricBaseForSourceFree):
             If None, the pre-defined one is used. (See bert_score.rescale_baseline.*.tsv)
         - use_fast_tokenizer (bool): Whether to use fast tokenizer.
         - score_type (str): "p" (precision) or "r" (recall) or "f" (F1) score.
+        - cache_max_entries (int): The maximum number of references in the embedding cache.
+            If None, unbounded.
+        - cache_max_bytes (int): The maximum size of the embedding cache in bytes.
+            If None, unbounded.
         '''
         model_type: str = 'bert-base-uncased'
         num_layers: int = None
@@ -33,6 +41,8 @@ class BertScore(MetricBaseForSourceFree):
         baseline_path: str = None
         use_fast_tokenizer: bool = False
         score_type: str = 'f'
+        cache_max_entries: int = None
+        cache_max_bytes: int = None
 
     def __init__(self, config: Config = None):
         super().__init__(config)
@@ -53,6 +63,96 @@ class BertScore(MetricBaseForSourceFree):
         self.scorer._model.eval()
         if torch.cuda.is_available():
             self.scorer._model.cuda()
+        # Reference -> (token embeddings, idf weights) on CPU.
+        # The references are shared among systems, e.g., in rank_systems().
+        self.cache_embedding = LRUCache(
+            max_entries=self.config.cache_max_entries,
+            max_bytes=self.config.cache_max_bytes,
+            sizeof=lambda stats: sum(t.nelement() * t.element_size() for t in stats)
+        )
+
+    def idf_dict(self) -> dict[int, float]:
+        '''The idf weights of the tokens, as same as BERTScorer.score().'''
+        if self.scorer.idf:
+            assert self.scorer._idf_dict, "IDF weights are not computed"
+            return self.scorer._idf_dict
+        idf_dict = defaultdict(lambda: 1.0)
+        idf_dict[self.scorer._tokenizer.sep_token_id] = 0
+        idf_dict[self.scorer._tokenizer.cls_token_id] = 0
+        return idf_dict
+
+    def embed(
+        self,
+        sents: list[str],
+        idf_dict: dict[int, float]
+    ) -> dict[str, tuple[torch.Tensor, torch.Tensor]]:
+        '''Compute the token embeddings and the idf weights of the sentences.
+            As same as bert_score, the sentences are batched in descending order of length.
+
+        Args:
+            sents (list[str]): The sentences.
+            idf_dict (dict[int, float]): The idf weights.
+
+        Returns:
+            dict[str, tuple[torch.Tensor, torch.Tensor]]: The sentence -> (embeddings, idf weights).
+                The shape of the embeddings is (num_tokens, hidden_size).
+        '''
+        sents = sorted(set(sents), key=lambda x: len(x.split(" ")), reverse=True)
+        stats = dict()
+        for batch_start in range(0, len(sents), self.config.batch_size):
+            sen_batch = sents[batch_start:batch_start + self.config.batch_size]
+            embs, masks, padded_idf = get_bert_embedding(
+                sen_batch,
+                self.scorer._model,
+                self.scorer._tokenizer,
+                idf_dict,
+                device=self.scorer.device,
+                all_layers=self.scorer.all_layers
+            )
+            embs = embs.cpu()
+            masks = masks.cpu()
+            padded_idf = padded_idf.cpu()
+            for i, sen in enumerate(sen_batch):
+                sequence_len = masks[i].sum().item()
+                stats[sen] = (embs[i, :sequence_len], padded_idf[i, :sequence_len])
+        return stats
+
+    def cached_reference_embeddings(
+        self,
+        references: list[str],
+        idf_dict: dict[int, float]
+    ) -> dict[str, tuple[torch.Tensor, torch.Tensor]]:
+        '''Efficient embed() of the references by caching.'''
+        stats = dict()
+        uncached = []
+        for ref in set(references):
+            ref_stats = self.cache_embedding.get(ref)
+            if ref_stats is None:
+                uncached.append(ref)
+            else:
+                stats[ref] = ref_stats
+        for ref, ref_stats in self.embed(uncached, idf_dict).items():
+            # The embeddings are views of the padded batch,
+            #   which would be kept alive by the cache without copying.
+            ref_stats = tuple(t.clone() for t in ref_stats)
+            self.cache_embedding[ref] = ref_stats
+            stats[ref] = ref_stats
+        return stats
+
+    def pad_stats(
+        self,
+        stats: list[tuple[torch.Tensor, torch.Tensor]]
+    ) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        '''Pad the embeddings and the idf weights for greedy_cos_idf().'''
+        device = self.scorer.device
+        emb, idf = zip(*stats)
+        emb = [e.to(device) for e in emb]
+        idf = [i.to(device) for i in idf]
+        lens = torch.tensor([e.size(0) for e in emb], dtype=torch.long)
+        emb_pad = pad_sequence(emb, batch_first=True, padding_value=2.0)
+        idf_pad = pad_sequence(idf, batch_first=True)
+        pad_mask = torch.arange(lens.max()).expand(len(lens), -1) < lens.unsqueeze(1)
+        return emb_pad, pad_mask.to(device), idf_pad
         
     def score_sentence(
         self,
@@ -70,16 +170,42 @@ class BertScore(MetricBaseForSourceFree):
         Returns:
             list[float]: The sentence-level scores.
         '''
-        # (num_refs, num_sents) -> (num_sents, num_refs)
-        references = list(zip(*references))
-        output = self.scorer.score(
-            cands=hypotheses,
-            refs=references
-        )
         idx = {
             'p': 0,
             'r': 1,
             'f': 2
         }[self.config.score_type]
-        scores = output[idx].view(-1).tolist()
-        return scores
\ No newline at end of file
+        if self.scorer.all_layers:
+            # (num_refs, num_sents) -> (num_sents, num_refs)
+            output = self.scorer.score(
+                cands=hypotheses,
+                refs=list(zip(*references))
+            )
+            return output[idx].view(-1).tolist()
+        num_refs = len(references)
+        # The same as BERTScorer.score() except that the reference embeddings are cached.
+        #   Flatten to (num_sents * num_refs, ) in the order of sentences.
+        cands = [hyp for hyp in hypotheses for _ in range(num_refs)]
+        refs = [ref for refs_for_sent in zip(*references) for ref in refs_for_sent]
+        idf_dict = self.idf_dict()
+        stats = self.cached_reference_embeddings(refs, idf_dict)
+        stats.update(self.embed([c for c in cands if c not in stats], idf_dict))
+        preds = []
+        batch_size = self.config.batch_size
+        with torch.no_grad():
+            for batch_start in range(0, len(refs), batch_size):
+                batch_refs = refs[batch_start:batch_start + batch_size]
+                batch_cands = cands[batch_start:batch_start + batch_size]
+                P, R, F1 = greedy_cos_idf(
+                    *self.pad_stats([stats[r] for r in batch_refs]),
+                    *self.pad_stats([stats[c] for c in batch_cands]),
+                    self.scorer.all_layers
+                )
+                preds.append(torch.stack((P, R, F1), dim=-1).cpu())
+        if preds == []:
+            return []
+        # The best reference for each sentence.
+        preds = torch.cat(preds, dim=0).view(len(hypotheses), num_refs, 3).max(dim=1)[0]
+        if self.scorer.rescale_with_baseline:
+            preds = (preds - self.scorer.baseline_vals) / (1 - self.scorer.baseline_vals)
+        return preds[..., idx].tolist()
\ No newline at end of file
@@ -1,5 +1,6 @@
 from .bertscore import BertScore
 import math
+import sys
 import pytest
 
 HYPS = [
@@ -43,3 +44,24 @@ class TestBertScore:
         )
         assert [math.isclose(s1, s2, abs_tol=1e-6) \
                 for s1, s2 in zip(sent_score, gold_sent_score)]
+
+    def test_reference_cache(self):
+        scorer = BertScore(BertScore.Config())
+        gold = scorer.score_sentence(HYPS, REFS)
+        # The references are encoded only once.
+        assert scorer.score_sentence(HYPS[::-1], REFS) \
+            == BertScore(BertScore.Config()).score_sentence(HYPS[::-1], REFS)
+        assert scorer.cache_info()['cache_embedding'].hits == len(set(sum(REFS, [])))
+        assert scorer.score_sentence(HYPS, REFS) == gold
+
+    def test_reference_cache_size(self):
+        scorer = BertScore(BertScore.Config())
+        scorer.score_sentence(HYPS, REFS)
+        # The cache holds only the storage of each reference,
+        #   not the whole padded batch.
+        num_bytes = 0
+        for ref in set(sum(REFS, [])):
+            num_bytes += sys.getsizeof(ref) + sum(
+                t.untyped_storage().nbytes() for t in scorer.cache_embedding[ref]
+            )
+        assert scorer.cache_info()['cache_embedding'].num_bytes == num_bytes
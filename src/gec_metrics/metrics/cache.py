@@ -0,0 +1,281 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable
+import json
+import os
+import sys
+
+@dataclass
+class CacheInfo:
+    '''Statistics of a cache.
+        - hits (int): The number of lookups that found an entry.
+        - misses (int): The number of lookups that did not find an entry.
+        - evictions (int): The number of evicted entries.
+        - num_entries (int): The current number of entries.
+        - num_bytes (int): The current estimated size in bytes.
+    '''
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    num_entries: int = 0
+    num_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        '''The ratio of hits to all lookups.'''
+        if self.hits + self.misses == 0:
+            return 0.0
+        return self.hits / (self.hits + self.misses)
+
+class CacheBudget:
+    '''Budget shared by multiple LRUCache instances.
+    When the total exceeds the budget, the least recently used entry
+        among all of the caches is evicted first.
+
+    Args:
+        max_entries (int): The maximum total number of entries. If None, unbounded.
+        max_bytes (int): The maximum total estimated size in bytes. If None, unbounded.
+
+    .. code-block:: python
+
+        budget = CacheBudget(max_bytes=10**9)
+        cache1 = LRUCache(budget=budget)
+        cache2 = LRUCache(budget=budget)  # cache1 and cache2 use 1GB in total.
+    '''
+    def __init__(self, max_entries: int = None, max_bytes: int = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.caches = []
+        # Incremented on every use to order the entries of all caches.
+        self.clock = 0
+
+    @property
+    def is_bounded(self) -> bool:
+        return self.max_entries is not None or self.max_bytes is not None
+
+    @property
+    def num_entries(self) -> int:
+        return sum(len(cache.data) for cache in self.caches)
+
+    @property
+    def num_bytes(self) -> int:
+        return sum(cache.num_bytes for cache in self.caches)
+
+    def tick(self) -> int:
+        self.clock += 1
+        return self.clock
+
+    def exceeded(self) -> bool:
+        return (self.max_entries is not None and self.num_entries > self.max_entries) \
+            or (self.max_bytes is not None and self.num_bytes > self.max_bytes)
+
+    def evict(self) -> None:
+        '''Remove the least recently used entries among the caches until the budget is satisfied.
+            The most recent entry is always kept.
+        '''
+        if not self.is_bounded:
+            return
+        while self.num_entries > 1 and self.exceeded():
+            # The first entry of each cache is the least recently used one in the cache.
+            oldest = min(
+                (cache for cache in self.caches if cache.data),
+                key=lambda cache: next(iter(cache.data.values()))[2]
+            )
+            oldest.pop_oldest()
+
+class LRUCache:
+    '''Cache with least-recently-used eviction.
+    Keys are used as they are, e.g. a sentence itself or a tuple of sentences,
+        so that a lookup only costs the (cached) hash of the key.
+
+    Args:
+        max_entries (int): The maximum number of entries. If None, unbounded.
+        max_bytes (int): The maximum estimated size in bytes. If None, unbounded.
+        sizeof (Callable): Function to estimate the size of a value in bytes.
+            If None, sys.getsizeof() is used.
+        budget (CacheBudget): The budget shared with other caches.
+            If specified, max_entries and max_bytes must be None.
+
+    .. code-block:: python
+
+        cache = LRUCache(max_entries=2)
+        cache['a'] = 1
+        cache['b'] = 2
+        cache.get('a')  # 1
+        cache['c'] = 3  # 'b' is evicted
+        print(cache.info())
+    '''
+    def __init__(
+        self,
+        max_entries: int = None,
+        max_bytes: int = None,
+        sizeof: Callable[[Any], int] = None,
+        budget: CacheBudget = None
+    ):
+        if budget is None:
+            budget = CacheBudget(max_entries=max_entries, max_bytes=max_bytes)
+        elif max_entries is not None or max_bytes is not None:
+            raise ValueError('max_entries and max_bytes are given by the budget.')
+        self.budget = budget
+        self.budget.caches.append(self)
+        self.sizeof = sizeof if sizeof is not None else sys.getsizeof
+        self.data = OrderedDict()  # key -> [value, size, time of the last use]
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_entries(self) -> int:
+        return self.budget.max_entries
+
+    @property
+    def max_bytes(self) -> int:
+        return self.budget.max_bytes
+
+    @property
+    def is_bounded(self) -> bool:
+        return self.budget.is_bounded
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        '''Get the value and mark it as recently used.'''
+        item = self.data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        budget = self.budget
+        if budget.max_entries is not None or budget.max_bytes is not None:
+            budget.clock += 1
+            item[2] = budget.clock
+            self.data.move_to_end(key)
+        return item[0]
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        size = sys.getsizeof(key) + self.sizeof(value)
+        if isinstance(key, tuple):
+            # e.g. a pair of sentences.
+            size += sum(sys.getsizeof(k) for k in key)
+        if key in self.data:
+            self.num_bytes -= self.data.pop(key)[1]
+        self.data[key] = [value, size, self.budget.tick()]
+        self.num_bytes += size
+        self.evict()
+
+    def __getitem__(self, key: Hashable) -> Any:
+        return self.data[key][0]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def values(self):
+        return (item[0] for item in self.data.values())
+
+    def evict(self) -> None:
+        '''Remove the least recently used entries until the budget is satisfied.
+            The most recent entry is always kept.
+        '''
+        self.budget.evict()
+
+    def pop_oldest(self) -> None:
+        '''Remove the least recently used entry.'''
+        _, (_, size, _) = self.data.popitem(last=False)
+        self.num_bytes -= size
+        self.evictions += 1
+
+    def clear(self) -> None:
+        '''Remove all entries. The statistics are kept.'''
+        self.data.clear()
+        self.num_bytes = 0
+
+    def info(self) -> CacheInfo:
+        '''Get the statistics.'''
+        return CacheInfo(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            num_entries=len(self.data),
+            num_bytes=self.num_bytes
+        )
+
+class PersistentCache:
+    '''Append-only cache on a JSONL file that survives across runs.
+    Each line is {"id": key, "version": version, "results": value}.
+    Lines with another version, e.g., produced by another model, are ignored.
+
+    Args:
+        file_name (str): The path to the cache file. It is created if it does not exist.
+        version (str): The version of the cached values.
+            Use a string that identifies everything the values depend on.
+
+    .. code-block:: python
+
+        cache = PersistentCache('errant.cache', version='spacy-3.8.0')
+        if cache.get('key') is None:
+            cache['key'] = {'value': 1}  # Written to the file immediately.
+    '''
+    def __init__(self, file_name: str, version: str = ''):
+        self.file_name = file_name
+        self.version = version
+        self.data = dict()
+        self.file = None
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(file_name):
+            with open(file_name) as f:
+                for line in f:
+                    try:
+                        json_obj = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line may be broken if a previous run was interrupted.
+                        continue
+                    if json_obj.get('version') == version:
+                        self.data[json_obj['id']] = json_obj['results']
+
+    def get(self, key: str, default: Any = None) -> Any:
+        '''Get the value.'''
+        value = self.data.get(key)
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        '''Set the value and append it to the file.
+            The value must be JSON serializable.'''
+        if self.data.get(key) == value:
+            return
+        self.data[key] = value
+        if self.file is None:
+            self.file = open(self.file_name, 'a')
+        json_str = json.dumps(
+            {'id': key, 'version': self.version, 'results': value},
+            ensure_ascii=False
+        )
+        self.file.write(json_str + '\n')
+        self.file.flush()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def close(self) -> None:
+        '''Close the file. It is opened again on the next write.'''
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def info(self) -> CacheInfo:
+        '''Get the statistics.'''
+        return CacheInfo(
+            hits=self.hits,
+            misses=self.misses,
+            num_entries=len(self.data),
+            num_bytes=os.path.getsize(self.file_name) if os.path.exists(self.file_name) else 0
+        )
@@ -0,0 +1,66 @@
+from .cache import CacheBudget, LRUCache, PersistentCache
+import pytest
+
+class TestLRUCache:
+    def test_max_entries(self):
+        cache = LRUCache(max_entries=2)
+        cache['a'] = 1
+        cache['b'] = 2
+        assert cache.get('a') == 1
+        # 'b' is the least recently used.
+        cache['c'] = 3
+        assert 'b' not in cache
+        assert cache.get('b') is None
+        assert cache.get('a') == 1 and cache.get('c') == 3
+        info = cache.info()
+        assert (info.hits, info.misses, info.evictions, info.num_entries) == (3, 1, 1, 2)
+
+    def test_max_bytes(self):
+        # The size of a key is also counted.
+        cache = LRUCache(max_bytes=200, sizeof=lambda v: v)
+        cache[1] = 50
+        cache[2] = 50
+        assert len(cache) == 2
+        # The total size exceeds the budget, thus the oldest one is evicted.
+        cache[3] = 50
+        assert 1 not in cache
+        assert len(cache) == 2
+        assert cache.info().num_bytes <= 200
+
+    def test_tuple_key_size(self):
+        cache = LRUCache(sizeof=lambda v: 0)
+        pair = ('a' * 1000, 'b' * 1000)
+        cache[pair] = 0
+        # The elements of a tuple key are counted.
+        assert cache.info().num_bytes > 2000
+
+    def test_shared_budget(self):
+        budget = CacheBudget(max_entries=3)
+        cache1 = LRUCache(budget=budget)
+        cache2 = LRUCache(budget=budget)
+        cache1['a'] = 1
+        cache2['b'] = 2
+        cache1['c'] = 3
+        assert cache1.get('a') == 1
+        # 'b' is the least recently used among the caches.
+        cache2['d'] = 4
+        assert 'b' not in cache2
+        assert len(cache1) + len(cache2) == 3
+        assert (cache1.info().evictions, cache2.info().evictions) == (0, 1)
+        with pytest.raises(ValueError):
+            LRUCache(max_entries=1, budget=budget)
+
+class TestPersistentCache:
+    def test_persistence(self, tmp_path):
+        file_name = str(tmp_path / 'test.cache')
+        cache = PersistentCache(file_name, version='v1')
+        cache['a'] = [1, 2]
+        cache['b'] = 'b'
+        cache.close()
+        # Restored in another instance.
+        cache = PersistentCache(file_name, version='v1')
+        assert cache.get('a') == [1, 2] and cache.get('b') == 'b'
+        assert cache.get('c') is None
+        # Another version does not see the values.
+        cache = PersistentCache(file_name, version='v2')
+        assert len(cache) == 0
@@ -1,24 +1,196 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from .base import MetricBaseForReferenceBased, MetricBase
+from .cache import LRUCache, PersistentCache
+from concurrent.futures import ProcessPoolExecutor
+from importlib.metadata import version
+from gecommon import Parallel
+import base64
 import hashlib
+import multiprocessing
+import numpy as np
 import errant
 import spacy
 
 class ERRANT(MetricBaseForReferenceBased):
+    # Sentence pairs per process when config.num_workers > 1.
+    min_shard_size = 1000
+    # The spacy components that ERRANT uses: POS tags, lemmas and dependencies,
+    #   and the shared embedding layers that they listen to.
+    used_pipes = (
+        'tok2vec', 'transformer', 'tagger', 'morphologizer',
+        'attribute_ruler', 'lemmatizer', 'parser'
+    )
+
     @dataclass
     class Config(MetricBaseForReferenceBased.Config):
         '''ERRANT configuration.
             - beta (float): The beta for F-beta score.
             - language (str): The language for spacy.
+            - batch_size (int): The batch size for spacy's nlp.pipe().
+            - n_process (int): The number of processes for spacy's nlp.pipe().
+            - cache (str): The path to the file to persist parses and edits across runs.
+                If None, they are cached only in memory.
+            - num_workers (int): The number of processes to parse and extract edits.
+            - skip_classification (bool): If True, the error type classification is skipped
+                where only the overall score is needed, i.e., score_corpus(), score_sentence(),
+                score_stats() and incremental_scorer().
+                score_corpus_verbose() and score_sentence_verbose() always classify edits.
+            - disable_unused_pipes (bool): If True, disable spacy components
+                other than ERRANT.used_pipes, e.g., senter and ner.
+            - parse_cache_max_entries (int): The maximum number of parses kept in memory
+                for edit_extraction() of a pair that is not prepared.
+                The parses in prepare_edit_extraction() are released once the edits are extracted.
+                If None, the cache is unbounded.
         '''
         beta: float = 0.5
         language: str = 'en'
+        batch_size: int = 1000
+        n_process: int = 1
+        cache: str = None
+        num_workers: int = 1
+        skip_classification: bool = False
+        disable_unused_pipes: bool = False
+        parse_cache_max_entries: int = 1000
+
+    additive_stats: bool = False
+
+    class Edit:
+        '''Compact edit detached from spacy, which is retained in the cache.
+            The error type is interned to an integer id shared among all edits.
+        - o_start (int): Start index of the span for the source words.
+        - o_end (int): End index of the span for the source words.
+        - c_str (str): Corrected version of the span.
+        - type (str): Error type.
+        '''
+        __slots__ = ('o_start', 'o_end', 'c_str', 'type_id')
+        # The interning table of the error types.
+        type2id: dict[str, int] = dict()
+        id2type: list[str] = []
+
+        def __init__(
+            self,
+            o_start: int = 0,
+            o_end: int = 0,
+            c_str: str = '',
+            type: str = 'NA'
+        ):
+            self.o_start: int = o_start
+            self.o_end: int = o_end
+            self.c_str: str = c_str
+            self.type_id: int = self.intern_type(type)
+
+        @classmethod
+        def intern_type(cls, type: str) -> int:
+            '''Get the id of the error type.'''
+            type_id = cls.type2id.get(type)
+            if type_id is None:
+                type_id = len(cls.id2type)
+                cls.type2id[type] = type_id
+                cls.id2type.append(type)
+            return type_id
+
+        @property
+        def type(self) -> str:
+            return self.id2type[self.type_id]
+
+        @classmethod
+        def from_errant(cls, edit: errant.edit.Edit) -> "Edit":
+            '''Convert errant's edit, dropping the references to the spacy objects.'''
+            return cls(edit.o_start, edit.o_end, edit.c_str, edit.type)
+
+        def to_list(self) -> list:
+            '''[o_start, o_end, c_str, type] for serialization.'''
+            return [self.o_start, self.o_end, self.c_str, self.type]
+
+        def __eq__(self, other) -> bool:
+            if not isinstance(other, ERRANT.Edit):
+                return NotImplemented
+            return (self.o_start, self.o_end, self.c_str, self.type_id) \
+                == (other.o_start, other.o_end, other.c_str, other.type_id)
+
+        def __hash__(self) -> int:
+            return hash((self.o_start, self.o_end, self.c_str, self.type_id))
+
+        def __repr__(self) -> str:
+            return f'Edit(o_start={self.o_start}, o_end={self.o_end}, c_str={self.c_str!r}, type={self.type!r})'
+
+    @dataclass
+    class Report:
+        '''The corpus-level scores broken down by the error types,
+            as the `-cat 1`, `-cat 2` and `-cat 3` options of the official ERRANT.
+            - overall (Score): The overall score, the same as score_corpus_verbose().
+            - operation (dict[str, Score]): The scores for each operation, i.e., M, R and U.
+            - pos (dict[str, Score]): The scores for each type without the operation, e.g., NOUN.
+            - type (dict[str, Score]): The scores for each error type, e.g., R:NOUN.
+        '''
+        overall: MetricBaseForReferenceBased.Score = None
+        operation: dict[str, MetricBaseForReferenceBased.Score] = None
+        pos: dict[str, MetricBaseForReferenceBased.Score] = None
+        type: dict[str, MetricBaseForReferenceBased.Score] = None
 
     def __init__(self, config: Config = None):
         super().__init__(config)
         self.errant = errant.load(self.config.language)
-        self.cache_parse = dict()
+        if self.config.disable_unused_pipes:
+            for name in self.errant.nlp.pipe_names:
+                if name not in self.used_pipes:
+                    self.errant.nlp.disable_pipe(name)
+        # Parses are not needed once the edits are extracted,
+        #   thus only a limited number of them are kept for edit_extraction().
+        self.cache_parse = LRUCache(max_entries=self.config.parse_cache_max_entries)
         self.cache_annotate = dict()
+        # The edits without the error type classification.
+        self.cache_align = dict()
+        # Reference edits are shared among hypotheses, e.g., in rank_systems().
+        self.cache_ref_index = dict()
+        self.cache_disk = None
+        if self.config.cache is not None:
+            self.cache_disk = PersistentCache(
+                self.config.cache, version=self.cache_version()
+            )
+
+    def clear_memory_cache(self) -> None:
+        '''Release the parses and the edits cached in memory, e.g., after each block of a large corpus.
+            The persistent cache is kept, while the edits registered by set_reference_edits() are removed.'''
+        self.cache_parse.clear()
+        self.cache_annotate.clear()
+        self.cache_align.clear()
+        self.cache_ref_index.clear()
+
+    def cache_version(self) -> str:
+        '''The version of the persistent cache.
+            The cached parses and edits are valid only with the same spacy model and ERRANT.'''
+        nlp = self.errant.nlp
+        return '|'.join([
+            f'errant-{version("errant")}',
+            f'spacy-{spacy.__version__}',
+            f'{nlp.meta["lang"]}_{nlp.meta["name"]}-{nlp.meta["version"]}',
+            ','.join(nlp.pipe_names)
+        ])
+
+    def load_parse(self, key: str) -> spacy.tokens.doc.Doc:
+        '''Restore the parse from the persistent cache. Returns None if not found.'''
+        if self.cache_disk is None:
+            return None
+        data = self.cache_disk.get('parse:' + key)
+        if data is None:
+            return None
+        doc_bin = spacy.tokens.DocBin().from_bytes(base64.b64decode(data))
+        return next(doc_bin.get_docs(self.errant.nlp.vocab))
+
+    def save_parse(self, key: str, doc: spacy.tokens.doc.Doc) -> None:
+        '''Save the parse to the persistent cache.'''
+        if self.cache_disk is None:
+            return
+        doc_bin = spacy.tokens.DocBin(docs=[doc])
+        self.cache_disk['parse:' + key] = base64.b64encode(doc_bin.to_bytes()).decode()
+
+    def tokenize(self, sent: str) -> list[str]:
+        '''Split a pre-tokenized sentence into tokens.
+            The Doc is built from the tokens as they are, without spacy's tokenizer,
+                thus the token offsets of the edits are the indices of this list.
+        '''
+        return sent.split()
 
     def cached_parse(self, sent: str) -> spacy.tokens.doc.Doc:
         '''Efficient parse() by caching.
@@ -29,34 +201,423 @@ class ERRANT(MetricBaseForReferenceBased):
             spacy.tokens.doc.Doc: The parse results. 
         '''
         key = hashlib.sha256(sent.encode()).hexdigest()
-        if self.cache_parse.get(key) is None:
-            self.cache_parse[key] = self.errant.parse(sent)
-        return self.cache_parse[key]
+        doc = self.cache_parse.get(key)
+        if doc is None:
+            doc = self.load_parse(key)
+            if doc is None:
+                nlp = self.errant.nlp
+                doc = nlp(spacy.tokens.Doc(nlp.vocab, self.tokenize(sent)))
+                self.save_parse(key, doc)
+            self.cache_parse[key] = doc
+        return doc
     
+    def batch_parse(self, sents: list[str]) -> dict[str, spacy.tokens.doc.Doc]:
+        '''Parse sentences in bulk via nlp.pipe().
+            The results are the same as cached_parse(),
+                but they are not kept in memory, while the new parses are saved to the persistent cache.
+
+        Args:
+            sents (list[str]): The sentences to be parsed.
+
+        Returns:
+            dict[str, spacy.tokens.doc.Doc]: The sentence -> the parse.
+        '''
+        docs = dict()
+        keys = dict()  # key -> sentence, to parse each sentence once.
+        for sent in sents:
+            if sent in docs:
+                continue
+            key = hashlib.sha256(sent.encode()).hexdigest()
+            if key in keys:
+                continue
+            doc = self.cache_parse.get(key)
+            if doc is None:
+                doc = self.load_parse(key)
+            if doc is None:
+                keys[key] = sent
+            else:
+                docs[sent] = doc
+        if len(keys) == 0:
+            return docs
+        nlp = self.errant.nlp
+        new_docs = nlp.pipe(
+            (spacy.tokens.Doc(nlp.vocab, self.tokenize(sent)) for sent in keys.values()),
+            batch_size=self.config.batch_size,
+            n_process=self.config.n_process
+        )
+        for (key, sent), doc in zip(keys.items(), new_docs):
+            docs[sent] = doc
+            self.save_parse(key, doc)
+        return docs
+
+    def prepare_edit_extraction(
+        self,
+        sources: list[str],
+        targets: list[list[str]],
+        classify: bool = True
+    ) -> None:
+        '''Parse all sentences needed for the edit extraction in bulk and extract the edits.
+            Pairs whose edits are already cached are skipped.
+            The parses are released once the edits are cached,
+                thus the memory does not grow with the number of parsed sentences.
+            If config.num_workers > 1, the edits are extracted in parallel.
+
+        Args:
+            sources (list[str]): The source sentences.
+                The shape is (num_sents, ).
+            targets (list[list[str]]): The corrected sentences, e.g., hypotheses and references.
+                The shape is (num_targets, num_sents).
+            classify (bool): Whether the error types are needed.
+        '''
+        pairs = dict()  # key -> (src, trg)
+        # Pairs of the same source are adjacent so that a worker parses the source once.
+        for sent_id, src in enumerate(sources):
+            for trgs in targets:
+                trg = trgs[sent_id]
+                key = hashlib.sha256((src + '|||' + trg).encode()).hexdigest()
+                if self.cached_edits(key, classify) is None:
+                    pairs[key] = (src, trg)
+        num_shards = min(
+            self.config.num_workers,
+            len(pairs) // self.min_shard_size
+        )
+        if num_shards > 1:
+            self.parallel_edit_extraction(pairs, num_shards, classify)
+            return
+        items = list(pairs.items())
+        # Parse a chunk of pairs at once to bound the number of parses alive.
+        for start in range(0, len(items), self.config.batch_size):
+            chunk = items[start:start + self.config.batch_size]
+            docs = self.batch_parse([sent for _, pair in chunk for sent in pair])
+            for key, (src, trg) in chunk:
+                self.save_edits(
+                    key, self.extract_edits(docs[src], docs[trg], classify), classify
+                )
+
+    def parallel_edit_extraction(
+        self,
+        pairs: dict[str, tuple[str, str]],
+        num_shards: int,
+        classify: bool = True
+    ) -> None:
+        '''Parse and extract edits by sharding the pairs across processes.
+            The workers are forked after the model is loaded, if possible,
+                thus they share the model without loading it again.
+            Each worker parses its shard in bulk via batch_parse().
+            The workers return the edits as lists of Edit.to_list(),
+                and the results are cached as same as edit_extraction().
+            The parses are returned as DocBin only to be saved to the persistent cache,
+                i.e., if config.cache is set.
+
+        Args:
+            pairs (dict[str, tuple[str, str]]): The key and the pair of source and target.
+            num_shards (int): The number of shards.
+            classify (bool): Whether the error types are needed.
+        '''
+        items = list(pairs.items())
+        # Several shards per worker to balance the load.
+        num_chunks = min(len(items), num_shards * 4)
+        bounds = np.linspace(0, len(items), num_chunks + 1).astype(int).tolist()
+        chunks = [items[s:e] for s, e in zip(bounds[:-1], bounds[1:])]
+        mp_context = None
+        if 'fork' in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(
+            max_workers=num_shards,
+            mp_context=mp_context,
+            initializer=init_edit_extraction_worker,
+            initargs=(self,)
+        ) as executor:
+            results = executor.map(
+                edit_extraction_worker,
+                [[pair for _, pair in chunk] for chunk in chunks],
+                [classify] * len(chunks),
+                [self.cache_disk is not None] * len(chunks)
+            )
+            for chunk, (sent_keys, doc_bytes, edits_list) in zip(chunks, results):
+                if sent_keys:
+                    docs = spacy.tokens.DocBin().from_bytes(doc_bytes).get_docs(
+                        self.errant.nlp.vocab
+                    )
+                    for sent_key, doc in zip(sent_keys, docs):
+                        self.save_parse(sent_key, doc)
+                for (key, _), edits in zip(chunk, edits_list):
+                    self.save_edits(key, [self.Edit(*e) for e in edits], classify)
+
+    def edit_targets(
+        self,
+        hypotheses: list[list[str]],
+        references: list[list[str]]
+    ) -> list[list[str]]:
+        '''The corrected sentences whose edits are used in score_base().
+
+        Args:
+            hypotheses (list[list[str]]): Corrected sentences.
+                The shape is (num_systems, num_sentences).
+            references (list[list[str]]): Reference sentences.
+                The shape is (num_references, num_sentences).
+
+        Returns:
+            list[list[str]]: The shape is (num_targets, num_sentences).
+        '''
+        return hypotheses + references
+
+    def prepare_systems(
+        self,
+        sources: list[str],
+        hypotheses: list[list[str]],
+        references: list[list[str]]
+    ) -> None:
+        '''Prepare the evaluation of multiple systems, i.e., extract the edits of all systems at once.
+
+        Args:
+            sources (list[str]): Source sentences.
+                The shape is (num_sentences, ).
+            hypotheses (list[list[str]]): Corrected sentences.
+                The shape is (num_systems, num_sentences).
+            references (list[list[str]]): Reference sentences.
+                The shape is (num_references, num_sentences).
+        '''
+        self.prepare_edit_extraction(
+            sources,
+            self.edit_targets(hypotheses, references),
+            classify=not self.config.skip_classification
+        )
+
+    def score_pairwise(
+        self,
+        sources: list[str],
+        hypotheses: list[list[str]],
+        references: list[list[str]]
+    ) -> list[list[list[int]]]:
+        '''Calculate pairwise scores for all of combinations of hypotheses.
+            The edits of all systems are extracted at once.
+            See MetricBaseForReferenceBased.score_pairwise() for the details.
+        '''
+        self.prepare_systems(sources, hypotheses, references)
+        return super().score_pairwise(sources, hypotheses, references)
+
+    def rank_systems(
+        self,
+        sources: list[str],
+        hypotheses: list[list[str]],
+        references: list[list[str]],
+        aggregation='default'
+    ) -> list[float]:
+        '''Compute ranking score for multiple systems.
+            The edits of all systems are extracted at once.
+            See MetricBaseForReferenceBased.rank_systems() for the details.
+        '''
+        self.prepare_systems(sources, hypotheses, references)
+        return super().rank_systems(
+            sources, hypotheses, references, aggregation=aggregation
+        )
+
     def edit_extraction(
-        self, src: str, trg: str
-    ) -> list[errant.edit.Edit]:
+        self, src: str, trg: str, classify: bool = True
+    ) -> list[Edit]:
         '''Extract edits given a source and a corrected sentence.
 
         Args:
             src (str): The source sentence.
             trg (str): The corrected sentence.
+            classify (bool): Whether the error types are needed.
+                If False, the types may be 'NA'.
         
         Returns:
-            list[errant.edit.Edit]: Extracted edits.
+            list[Edit]: Extracted edits.
         '''
         key = hashlib.sha256((src + '|||' + trg).encode()).hexdigest()
-        if self.cache_annotate.get(key) is None:
-            self.cache_annotate[key] = self.errant.annotate(
+        edits = self.cached_edits(key, classify)
+        if edits is None:
+            edits = self.extract_edits(
                 self.cached_parse(src),
-                self.cached_parse(trg)
+                self.cached_parse(trg),
+                classify
             )
-        return self.filter_edits(self.cache_annotate[key])
-    
+            self.save_edits(key, edits, classify)
+        return self.filter_edits(edits)
+
+    def extract_edits(
+        self,
+        orig: spacy.tokens.doc.Doc,
+        cor: spacy.tokens.doc.Doc,
+        classify: bool = True
+    ) -> list[Edit]:
+        '''Extract edits from the parses.
+
+        Args:
+            orig (spacy.tokens.doc.Doc): The parse of the source sentence.
+            cor (spacy.tokens.doc.Doc): The parse of the corrected sentence.
+            classify (bool): Whether the error types are needed.
+                If False, only the alignment and the merging are performed,
+                    and the types are 'NA'.
+
+        Returns:
+            list[Edit]: Extracted edits.
+        '''
+        if classify:
+            edits = self.errant.annotate(orig, cor)
+        else:
+            edits = self.errant.merge(self.errant.align(orig, cor))
+            for e in edits:
+                # As same as the classifier, an edit that changes nothing is UNK
+                #   so that filter_edits() removes it.
+                e.type = 'UNK' if e.o_str == e.c_str else 'NA'
+        return [self.Edit.from_errant(e) for e in edits]
+
+    def cached_edits(self, key: str, classify: bool = True) -> list[Edit]:
+        '''Look up the edits from the memory and the persistent cache.
+            The classified edits can be used even if classify=False.
+
+        Args:
+            key (str): The key of the pair of the source and the target.
+            classify (bool): Whether the error types are needed.
+
+        Returns:
+            list[Edit]: The edits, or None if not cached.
+        '''
+        caches = [('edit:', self.cache_annotate)]
+        if not classify:
+            caches.append(('align:', self.cache_align))
+        for _, cache in caches:
+            if cache.get(key) is not None:
+                return cache[key]
+        if self.cache_disk is not None:
+            for prefix, cache in caches:
+                edits = self.cache_disk.get(prefix + key)
+                if edits is not None:
+                    # Restoring edits skips the parse, the alignment and the classification.
+                    cache[key] = [self.Edit(*e) for e in edits]
+                    return cache[key]
+        return None
+
+    def save_edits(
+        self, key: str, edits: list[Edit], classify: bool = True
+    ) -> None:
+        '''Save the edits to the memory and the persistent cache.'''
+        prefix, cache = ('edit:', self.cache_annotate) if classify \
+            else ('align:', self.cache_align)
+        cache[key] = edits
+        if self.cache_disk is not None:
+            self.cache_disk[prefix + key] = [e.to_list() for e in edits]
+
+    @classmethod
+    def read_m2(
+        cls, m2_file: str
+    ) -> tuple[list[str], list[list[str]], list[list[list[Edit]]]]:
+        '''Read the sources, the references and the gold edits from an M2 file.
+            Each annotator is regarded as a reference.
+            The noop and UNK edits are removed.
+
+        Args:
+            m2_file (str): The path to the M2 file.
+
+        Returns:
+            list[str]: The source sentences. The shape is (num_sents, ).
+            list[list[str]]: The reference sentences. The shape is (num_refs, num_sents).
+            list[list[list[Edit]]]: The gold edits. The shape is (num_refs, num_sents, num_edits).
+        '''
+        num_refs = 1
+        with open(m2_file) as f:
+            for line in f:
+                if line.startswith('A '):
+                    num_refs = max(num_refs, int(line.rstrip().split('|||')[-1]) + 1)
+        references = []
+        reference_edits = []
+        for ref_id in range(num_refs):
+            gec = Parallel.from_m2(m2_file, ref_id=ref_id)
+            references.append(gec.trgs)
+            reference_edits.append([
+                [cls.Edit(e.o_start, e.o_end, e.c_str, e.type) for e in edits] \
+                    for edits in gec.edits_list
+            ])
+        return gec.srcs, references, reference_edits
+
+    def load_m2(self, m2_file: str) -> tuple[list[str], list[list[str]]]:
+        '''Read an M2 file and register the gold edits via set_reference_edits().
+            The returned sentences can be passed to the scoring functions as usual.
+
+        Args:
+            m2_file (str): The path to the M2 file.
+
+        Returns:
+            list[str]: The source sentences. The shape is (num_sents, ).
+            list[list[str]]: The reference sentences. The shape is (num_refs, num_sents).
+        '''
+        sources, references, reference_edits = self.read_m2(m2_file)
+        self.set_reference_edits(sources, references, reference_edits)
+        return sources, references
+
+    def set_reference_edits(
+        self,
+        sources: list[str],
+        references: list[list[str]],
+        reference_edits: list[list[list[Edit]]]
+    ) -> None:
+        '''Register pre-extracted reference edits, e.g., the gold edits of an M2 file.
+            The edits are used for the pairs of the source and the reference
+                instead of parsing and aligning the reference.
+            A hypothesis identical to a reference is also given the registered edits.
+
+        Args:
+            sources (list[str]): The source sentences.
+                The shape is (num_sents, ).
+            references (list[list[str]]): The reference sentences.
+                The shape is (num_refs, num_sents).
+            reference_edits (list[list[list[Edit]]]): The edits of each reference.
+                The shape is (num_refs, num_sents, num_edits).
+        '''
+        for refs, edits_list in zip(references, reference_edits):
+            for src, ref, edits in zip(sources, refs, edits_list):
+                key = hashlib.sha256((src + '|||' + ref).encode()).hexdigest()
+                # Only in memory, so that the persistent cache keeps the extracted edits.
+                self.cache_annotate[key] = edits
+                for classify in (True, False):
+                    self.cache_ref_index.pop((key, classify), None)
+
+    def edit_index(
+        self,
+        edits: list[Edit]
+    ) -> tuple[list[tuple], list[str], set[tuple]]:
+        '''Convert edits into hashable keys for the matching.
+
+        Args:
+            edits (list[Edit]): The edits.
+
+        Returns:
+            list[tuple]: (o_start, o_end, c_str) of each edit. Duplicates are retained.
+            list[str]: The error type of each edit.
+            set[tuple]: The set of the keys for O(1) lookup.
+        '''
+        keys = [(e.o_start, e.o_end, e.c_str) for e in edits]
+        types = [e.type for e in edits]
+        return keys, types, set(keys)
+
+    def reference_edit_index(
+        self, src: str, ref: str, classify: bool = True
+    ) -> tuple[list[tuple], list[str], set[tuple]]:
+        '''Efficient edit_index() of the reference edits by caching.
+
+        Args:
+            src (str): The source sentence.
+            ref (str): The reference sentence.
+            classify (bool): Whether the error types are needed.
+
+        Returns:
+            tuple[list[tuple], list[str], set[tuple]]: See edit_index().
+        '''
+        key = (hashlib.sha256((src + '|||' + ref).encode()).hexdigest(), classify)
+        if self.cache_ref_index.get(key) is None:
+            self.cache_ref_index[key] = self.edit_index(
+                self.edit_extraction(src, ref, classify)
+            )
+        return self.cache_ref_index[key]
+
     def filter_edits(
         self,
-        edits: list[errant.edit.Edit]
-    ) -> list[errant.edit.Edit]:
+        edits: list[Edit]
+    ) -> list[Edit]:
         '''Handle edits that will be ignored.'''
         return [e for e in edits if e.type not in ['noop', 'UNK']]
     
@@ -96,7 +657,8 @@ class ERRANT(MetricBaseForReferenceBased):
             float: The corpus-level score.
         '''
         verbose_scores = self.score_corpus_verbose(
-            sources, hypotheses, references
+            sources, hypotheses, references,
+            classify=not self.config.skip_classification
         )
         return verbose_scores.f
 
@@ -104,7 +666,8 @@ class ERRANT(MetricBaseForReferenceBased):
         self,
         sources: list[str],
         hypotheses: list[str],
-        references: list[list[str]]
+        references: list[list[str]],
+        classify: bool = True
     ) -> "Score":
         '''Calculate a corpus level score by aggregating verbose scores.
 
@@ -113,6 +676,7 @@ class ERRANT(MetricBaseForReferenceBased):
             hypothesis (list[str]): Corrected sentences.
             references (list[list[str]]): Reference sentences.
                 The shape is (the number of references, the number of sentences).
+            classify (bool): Whether the error types are classified.
         
         Returns:
             Score: It contains TP, FP, FN, Precision, Recall, and F-beta.
@@ -120,20 +684,184 @@ class ERRANT(MetricBaseForReferenceBased):
         verbose_scores = self.score_base(
             sources,
             hypotheses,
-            references
+            references,
+            classify=classify
         )
+        return self.accumulate_best([
+            [self.aggregate_to_overall(v) for v in v_scores] \
+                for v_scores in verbose_scores
+        ])
+
+    def accumulate_best(self, scores: list[list["Score"]]) -> "Score":
+        '''Accumulate the scores by choosing the best reference for each sentence.
+
+        Args:
+            scores (list[list[Score]]): The overall scores for each reference.
+                The shape is (num_sents, num_refs).
+
+        Returns:
+            Score: The accumulated score.
+        '''
+        return self.accumulate_best_ids(scores)[0]
+
+    def accumulate_best_ids(
+        self, scores: list[list["Score"]]
+    ) -> tuple["Score", list[int]]:
+        '''accumulate_best() that also returns the chosen references.
+
+        Args:
+            scores (list[list[Score]]): The overall scores for each reference.
+                The shape is (num_sents, num_refs).
+
+        Returns:
+            Score: The accumulated score.
+            list[int]: The best reference id of each sentence.
+        '''
         score = self.Score(beta=self.config.beta)
-        for v_scores in verbose_scores:  # sentence loop
+        best_ids = []
+        for v_scores in scores:  # sentence loop
             best_score = None
-            for v_score_for_ref in v_scores:  # reference loop
-                agg_score = self.aggregate_to_overall(v_score_for_ref)
+            best_id = None
+            for ref_id, agg_score in enumerate(v_scores):  # reference loop
                 # The comparison is performed by adding 
                 #   the current sentence-level score to the current accumulated score.
                 # This is not mentioned ERRANT paper but the official implementation is doing so.
                 if best_score is None or (score + best_score) < (score + agg_score):
                     best_score = agg_score
+                    best_id = ref_id
             score += best_score
-        return score
+            best_ids.append(best_id)
+        return score, best_ids
+
+    def score_corpus_report(
+        self,
+        sources: list[str],
+        hypotheses: list[str],
+        references: list[list[str]]
+    ) -> "Report":
+        '''Calculate the overall and the error type-wise corpus-level scores at once.
+            The error types of the best reference for each sentence are accumulated,
+                where the best reference is chosen by the overall score.
+
+        Args:
+            sources (list[str]): Source sentence.
+                The shape is (num_sentences, )
+            hypotheses (list[str]): Corrected sentences.
+                The shape is (num_sentences, )
+            references (list[list[str]]): Reference sentences.
+                The shape is (num_references, num_sentences).
+
+        Returns:
+            Report: The overall score and the scores for each operation, POS and error type.
+        '''
+        verbose_scores = self.score_base(
+            sources,
+            hypotheses,
+            references,
+            classify=True
+        )
+        overall, best_ids = self.accumulate_best_ids([
+            [self.aggregate_to_overall(v) for v in v_scores] \
+                for v_scores in verbose_scores
+        ])
+        report = self.Report(overall=overall, operation=dict(), pos=dict(), type=dict())
+        for v_scores, best_id in zip(verbose_scores, best_ids):
+            for etype, score in v_scores[best_id].items():
+                report.type[etype] = report.type.get(
+                    etype, self.Score(beta=self.config.beta)
+                )
+                report.type[etype] += score
+        for etype, score in report.type.items():
+            if ':' in etype:
+                operation, pos = etype.split(':', 1)
+            else:
+                # e.g., UNK
+                operation, pos = etype, etype
+            for cat, name in ((report.operation, operation), (report.pos, pos)):
+                cat[name] = cat.get(name, self.Score(beta=self.config.beta))
+                cat[name] += score
+        return report
+
+    def sentence_stats(
+        self,
+        sources: list[str],
+        hypotheses: list[str],
+        references: list[list[str]],
+        offset: int = 0
+    ) -> MetricBaseForReferenceBased.Stats:
+        '''Calculate the sufficient statistics for each sentence.
+            Stats.counts['edit'] is TP, FP, FN, and TN for each reference.
+                The shape is (num_sents, num_refs, 4).
+
+        Args:
+            sources (list[str]): Source sentence.
+                The shape is (num_sentences, )
+            hypotheses (list[str]): Corrected sentences.
+                The shape is (num_sentences, )
+            references (list[list[str]]): Reference sentences.
+                The shape is (num_references, num_sentences).
+            offset (int): The index of the first sentence in the whole corpus.
+
+        Returns:
+            Stats: The sentence-level statistics.
+        '''
+        verbose_scores = self.score_base(
+            sources,
+            hypotheses,
+            references,
+            classify=not self.config.skip_classification
+        )
+        return self.verbose_to_stats(verbose_scores, offset)
+
+    def reduce_stats(
+        self,
+        stats: MetricBaseForReferenceBased.Stats,
+        corpus_size: int = None
+    ) -> MetricBaseForReferenceBased.Stats:
+        '''Since the best reference depends on the accumulated score of the preceding sentences,
+            the statistics retain the sentence-level counts as they are.'''
+        return stats
+
+    def verbose_to_stats(
+        self,
+        verbose_scores: list[list[dict[str, "Score"]]],
+        offset: int = 0
+    ) -> MetricBaseForReferenceBased.Stats:
+        '''Convert the output of score_base() into Stats.'''
+        counts = []
+        for v_scores in verbose_scores:
+            counts.append([])
+            for v_score_for_ref in v_scores:
+                s = self.aggregate_to_overall(v_score_for_ref)
+                counts[-1].append([s.tp, s.fp, s.fn, s.tn])
+        return self.Stats(
+            offset=offset,
+            num_sents=len(verbose_scores),
+            counts={'edit': np.array(counts, dtype=np.float64).reshape(
+                len(verbose_scores), -1, 4
+            )}
+        )
+
+    def merge_counts(self, key: str, counts: list[np.ndarray]) -> np.ndarray:
+        '''Concatenate the sentence-level statistics.'''
+        return np.concatenate(counts, axis=0)
+
+    def finalize(self, stats: MetricBaseForReferenceBased.Stats) -> float:
+        '''Compute the corpus-level score from the statistics.
+
+        Args:
+            stats (Stats): The statistics of the whole corpus.
+
+        Returns:
+            float: The corpus-level score.
+        '''
+        score = self.accumulate_best([
+            [self.Score(
+                tp=tp, fp=fp, fn=fn, tn=tn, beta=self.config.beta
+            ) for tp, fp, fn, tn in v_scores] \
+                for v_scores in stats.counts['edit'].tolist()
+        ])
+        return score.f
         
     def score_sentence(
         self,
@@ -155,7 +883,8 @@ class ERRANT(MetricBaseForReferenceBased):
             list[float]: The sentence-level scores.
         '''
         verbose_scores = self.score_sentence_verbose(
-            sources, hypotheses, references
+            sources, hypotheses, references,
+            classify=not self.config.skip_classification
         )
         return [s.f for s in verbose_scores]
     
@@ -163,7 +892,8 @@ class ERRANT(MetricBaseForReferenceBased):
         self,
         sources: list[str],
         hypotheses: list[str],
-        references: list[list[str]]
+        references: list[list[str]],
+        classify: bool = True
     ) -> list["Score"]:
         '''Calculate sentence level scores by aggregating verbose scores.
         "verbose" means that TP, FP, FN, Precisoin, Recall, and F are available.
@@ -175,6 +905,7 @@ class ERRANT(MetricBaseForReferenceBased):
                 The shape is (num_sentences, )
             references (list[list[str]]): Reference sentences.
                 The shape is (num_references, num_sentences).
+            classify (bool): Whether the error types are classified.
         
         Returns:
             list[Score]: The sentence-level scores.
@@ -182,7 +913,8 @@ class ERRANT(MetricBaseForReferenceBased):
         verbose_scores = self.score_base(
             sources,
             hypotheses,
-            references
+            references,
+            classify=classify
         )
         scores = []
         for sent_id, v_scores in enumerate(verbose_scores):  # sentence loop
@@ -198,7 +930,8 @@ class ERRANT(MetricBaseForReferenceBased):
         self,
         sources: list[str],
         hypotheses: list[str],
-        references: list[list[str]]
+        references: list[list[str]],
+        classify: bool = True
     ) -> list[list[dict[str, "Score"]]]:
         '''Calculate scores while retaining sentence and reference boundaries.
             The results can be aggregated according to the purpose,
@@ -209,6 +942,8 @@ class ERRANT(MetricBaseForReferenceBased):
             hypothesis (list[str]): Corrected sentences.
             references (list[list[str]]): Reference sentences.
                 The shape is (the number of references, the number of sentences).
+            classify (bool): Whether the error types are classified.
+                If False, the dict only has the overall score with the 'NA' key.
         
         Returns:
             list[list[dict[str, "Score"]]]: The verbose scores.
@@ -217,34 +952,46 @@ class ERRANT(MetricBaseForReferenceBased):
         '''
         num_sents = len(sources)
         num_refs = len(references)
+        self.prepare_edit_extraction(
+            sources, self.edit_targets([hypotheses], references), classify
+        )
         scores = []  # shape will be: (num_sents, num_refs, )
         for sent_id in range(num_sents):
-            hyp_edits = self.edit_extraction(
-                sources[sent_id],
-                hypotheses[sent_id]
-            )
-            ref_edits_list = [self.edit_extraction(
+            h_edits, h_types, h_set = self.edit_index(self.edit_extraction(
                 sources[sent_id],
-                references[ref_id][sent_id]
-            ) for ref_id in range(num_refs)]
-            
+                hypotheses[sent_id],
+                classify
+            ))
             sent_scores = []  # shape will be: (num_refs, )
-            h_edits = [(e.o_start, e.o_end, e.c_str) for e in hyp_edits]
-            h_types = [e.type for e in hyp_edits]
-            for ref_edits in ref_edits_list:
-                r_edits = [(e.o_start, e.o_end, e.c_str) for e in ref_edits]
-                r_types = [e.type for e in ref_edits]
+            for ref_id in range(num_refs):
+                # Each occurrence of the edits is counted, with O(1) lookup.
+                r_edits, r_types, r_set = self.reference_edit_index(
+                    sources[sent_id],
+                    references[ref_id][sent_id],
+                    classify
+                )
+                if not classify:
+                    # Count without the type-wise bookkeeping.
+                    tp = sum(h_edit in r_set for h_edit in h_edits)
+                    fn = sum(r_edit not in h_set for r_edit in r_edits)
+                    sent_scores.append({'NA': self.Score(
+                        tp=float(tp),
+                        fp=float(len(h_edits) - tp),
+                        fn=float(fn),
+                        beta=self.config.beta
+                    )})
+                    continue
                 this_score = dict()
                 for h_edit, h_type in zip(h_edits, h_types):
                     this_score[h_type] = this_score.get(
                         h_type, self.Score(beta=self.config.beta)
                     )
-                    if h_edit in r_edits:
+                    if h_edit in r_set:
                         this_score[h_type].tp += 1
                     else:
                         this_score[h_type].fp += 1
                 for r_edit, r_type in zip(r_edits, r_types):
-                    if r_edit not in h_edits:
+                    if r_edit not in h_set:
                         this_score[r_type] = this_score.get(
                             r_type, self.Score(beta=self.config.beta)
                         )
@@ -252,3 +999,55 @@ class ERRANT(MetricBaseForReferenceBased):
                 sent_scores.append(this_score)
             scores.append(sent_scores)
         return scores
+
+
+# The metric in a worker process, set by init_edit_extraction_worker().
+worker_metric = None
+# The keys of the parses that the main process already has.
+worker_known_parses = set()
+
+def init_edit_extraction_worker(metric: ERRANT) -> None:
+    '''Set the metric for edit_extraction_worker().
+        With the fork start method, the metric is shared without being pickled.'''
+    global worker_metric, worker_known_parses
+    worker_metric = metric
+    # The parses that the persistent cache of the main process already has.
+    worker_known_parses = metric.cache_disk.data if metric.cache_disk is not None else dict()
+    # Only the main process writes the persistent cache.
+    worker_metric.cache_disk = None
+    # The workers are already parallel, thus nlp.pipe() runs in each of them.
+    worker_metric.config = replace(metric.config, n_process=1)
+
+def edit_extraction_worker(
+    pairs: list[tuple[str, str]],
+    classify: bool = True,
+    return_parses: bool = False
+) -> tuple[list[str], bytes, list[list[list]]]:
+    '''Extract edits of a shard in a worker process.
+        The sentences of the shard are parsed in bulk via nlp.pipe().
+
+    Args:
+        pairs (list[tuple[str, str]]): The pairs of the source and the target.
+        classify (bool): Whether the error types are needed.
+        return_parses (bool): Whether to return the new parses,
+            e.g., to save them to the persistent cache.
+
+    Returns:
+        list[str]: The keys of the new parses. Empty if return_parses is False.
+        bytes: The new parses serialized by DocBin.
+        list[list[list]]: [o_start, o_end, c_str, type] of the edits for each pair.
+    '''
+    metric = worker_metric
+    docs = metric.batch_parse([sent for pair in pairs for sent in pair])
+    edits_list = []
+    for src, trg in pairs:
+        edits = metric.extract_edits(docs[src], docs[trg], classify)
+        edits_list.append([e.to_list() for e in edits])
+    sent_keys = dict()  # key -> doc, the parses that the main process does not have.
+    if return_parses:
+        for sent, doc in docs.items():
+            key = hashlib.sha256(sent.encode()).hexdigest()
+            if 'parse:' + key not in worker_known_parses:
+                sent_keys[key] = doc
+    doc_bytes = spacy.tokens.DocBin(docs=sent_keys.values()).to_bytes() if sent_keys else b''
+    return list(sent_keys), doc_bytes, edits_list
@@ -1,6 +1,9 @@
 from .errant import ERRANT
+import gc
+import hashlib
 import pytest
 import math
+import spacy
 
 SRCS = [
     'This sentences contain gramamtical error .',
@@ -42,3 +45,184 @@ class TestERRANT:
         )
         assert [math.isclose(s1, s2, abs_tol=1e-9) \
                 for s1, s2 in zip(sent_score, gold_sent_score)]
+
+    def test_score_stats(self):
+        scorer = ERRANT()
+        shards = [(2, 4), (0, 2)]
+        stats = [scorer.score_stats(
+            SRCS[i:j], HYPS[i:j], [r[i:j] for r in REFS], offset=i
+        ) for i, j in shards]
+        # Round trip via JSON serializable dict.
+        stats = [scorer.Stats.from_dict(s.to_dict()) for s in stats]
+        assert scorer.finalize(scorer.merge(stats)) \
+            == scorer.score_corpus(SRCS, HYPS, REFS)
+        with pytest.raises(ValueError):
+            scorer.merge(stats[1:] + stats[1:])
+
+    def test_incremental_scorer(self):
+        scorer = ERRANT()
+        hyps = list(HYPS)
+        inc = scorer.incremental_scorer(SRCS, hyps, REFS)
+        assert inc.score() == scorer.score_corpus(SRCS, hyps, REFS)
+        hyps[1] = REFS[0][1]
+        inc.update(1, hyps[1])
+        assert inc.score() == scorer.score_corpus(SRCS, hyps, REFS)
+        inc.remove(0)
+        assert inc.score() == scorer.score_corpus(
+            SRCS[1:], hyps[1:], [r[1:] for r in REFS]
+        )
+
+    def test_batch_parse(self):
+        scorer = ERRANT(ERRANT.Config(batch_size=2))
+        docs = scorer.batch_parse(SRCS + HYPS)
+        assert set(docs) == set(SRCS + HYPS)
+        for sent in SRCS + HYPS:
+            gold = scorer.errant.parse(sent)
+            for doc in (docs[sent], scorer.cached_parse(sent)):
+                assert [(t.text, t.tag_, t.dep_) for t in doc] \
+                    == [(t.text, t.tag_, t.dep_) for t in gold]
+
+    def test_release_parses(self):
+        def num_docs():
+            gc.collect()
+            return sum(isinstance(obj, spacy.tokens.Doc) for obj in gc.get_objects())
+        scorer = ERRANT(ERRANT.Config(batch_size=2))
+        num_docs_before = num_docs()
+        scorer.score_corpus(SRCS, HYPS, REFS)
+        # The edits are cached, while no parse stays reachable.
+        assert len(scorer.cache_annotate) > 0
+        assert len(scorer.cache_parse) == 0
+        assert num_docs() == num_docs_before
+
+    def test_bounded_parse_cache(self):
+        scorer = ERRANT(ERRANT.Config(parse_cache_max_entries=2))
+        for src, hyp in zip(SRCS, HYPS):
+            scorer.edit_extraction(src, hyp)
+        assert len(scorer.cache_parse) == 2
+
+    def test_persistent_cache(self, tmp_path):
+        config = ERRANT.Config(cache=str(tmp_path / 'errant.cache'))
+        gold = ERRANT().score_sentence(SRCS, HYPS, REFS)
+        assert ERRANT(config).score_sentence(SRCS, HYPS, REFS) == gold
+        # Parses and edits are restored from the file.
+        scorer = ERRANT(config)
+        assert scorer.score_sentence(SRCS, HYPS, REFS) == gold
+        assert scorer.cache_info()['cache_disk'].misses == 0
+
+    def test_num_workers(self):
+        scorer = ERRANT(ERRANT.Config(num_workers=2))
+        # Shard even this small input.
+        scorer.min_shard_size = 2
+        serial_scorer = ERRANT()
+        assert scorer.score_sentence(SRCS, HYPS, REFS) \
+            == serial_scorer.score_sentence(SRCS, HYPS, REFS)
+        assert scorer.rank_systems(SRCS, [HYPS, SRCS], REFS) \
+            == serial_scorer.rank_systems(SRCS, [HYPS, SRCS], REFS)
+
+    def test_num_workers_parses(self, tmp_path):
+        scorer = ERRANT(ERRANT.Config(num_workers=2))
+        scorer.min_shard_size = 2
+        gold = scorer.score_sentence(SRCS, HYPS, REFS)
+        # Without the persistent cache, the workers return only the edits.
+        assert len(scorer.cache_parse) == 0
+        config = ERRANT.Config(num_workers=2, cache=str(tmp_path / 'errant.cache'))
+        scorer = ERRANT(config)
+        scorer.min_shard_size = 2
+        assert scorer.score_sentence(SRCS, HYPS, REFS) == gold
+        assert len(scorer.cache_parse) == 0
+        # The parses of the workers are saved to the persistent cache.
+        restored = ERRANT(config)
+        for sent in SRCS + HYPS + sum(REFS, []):
+            key = hashlib.sha256(sent.encode()).hexdigest()
+            assert restored.load_parse(key) is not None
+
+    def test_reference_edit_index(self):
+        scorer = ERRANT()
+        scorer.rank_systems(SRCS, [HYPS, SRCS], REFS)
+        # The reference edits are indexed once and shared among the systems.
+        assert len(scorer.cache_ref_index) == len(set(
+            (s, r) for ref in REFS for s, r in zip(SRCS, ref)
+        ))
+        keys, types, key_set = scorer.edit_index(
+            scorer.edit_extraction(SRCS[0], HYPS[0]) * 2
+        )
+        # Duplicates are retained, thus each of them is counted.
+        assert len(keys) == len(types) == 2 * len(key_set)
+
+    def test_compact_edit(self):
+        scorer = ERRANT()
+        edits = scorer.edit_extraction(SRCS[0], HYPS[0])
+        gold = scorer.errant.annotate(
+            scorer.errant.parse(SRCS[0]), scorer.errant.parse(HYPS[0])
+        )
+        assert [e.to_list() for e in edits] \
+            == [[e.o_start, e.o_end, e.c_str, e.type] for e in gold]
+        # The error types are interned.
+        assert all(ERRANT.Edit.id2type[e.type_id] == e.type for e in edits)
+        assert not hasattr(edits[0], '__dict__')
+
+    def test_edit_eq(self):
+        scorer = ERRANT()
+        edit = scorer.edit_extraction(SRCS[0], HYPS[0])[0]
+        copy = ERRANT.Edit(*edit.to_list())
+        assert edit == copy
+        assert edit != None
+        assert edit in [None, edit]
+        assert len({edit, copy}) == 1
+
+    def test_skip_classification(self):
+        scorer = ERRANT(ERRANT.Config(skip_classification=True))
+        gold_scorer = ERRANT()
+        assert scorer.score_corpus(SRCS, HYPS, REFS) \
+            == gold_scorer.score_corpus(SRCS, HYPS, REFS)
+        assert scorer.score_sentence(SRCS, HYPS, REFS) \
+            == gold_scorer.score_sentence(SRCS, HYPS, REFS)
+        assert all(e.type == 'NA' for e in scorer.edit_extraction(SRCS[0], HYPS[0], classify=False))
+        # The verbose results keep the error types.
+        verbose_scores = scorer.score_base(SRCS, HYPS, REFS)
+        assert 'NA' not in verbose_scores[0][0]
+
+    def test_disable_unused_pipes(self):
+        scorer = ERRANT(ERRANT.Config(disable_unused_pipes=True))
+        assert all(name in ERRANT.used_pipes for name in scorer.errant.nlp.pipe_names)
+        assert scorer.score_sentence(SRCS, HYPS, REFS) \
+            == ERRANT().score_sentence(SRCS, HYPS, REFS)
+
+    def test_load_m2(self, tmp_path):
+        scorer = ERRANT()
+        lines = []
+        for sent_id, src in enumerate(SRCS):
+            lines.append('S ' + src)
+            for ref_id in range(len(REFS)):
+                for e in scorer.edit_extraction(src, REFS[ref_id][sent_id]):
+                    lines.append(f'A {e.o_start} {e.o_end}|||{e.type}|||{e.c_str}|||REQUIRED|||-NONE-|||{ref_id}')
+            lines.append('')
+        m2_file = tmp_path / 'ref.m2'
+        m2_file.write_text('\n'.join(lines) + '\n')
+        m2_scorer = ERRANT()
+        srcs, refs = m2_scorer.load_m2(str(m2_file))
+        assert srcs == SRCS
+        assert refs == REFS
+        parsed = []
+        batch_parse = m2_scorer.batch_parse
+        cached_parse = m2_scorer.cached_parse
+        m2_scorer.batch_parse = lambda sents: parsed.extend(sents) or batch_parse(sents)
+        m2_scorer.cached_parse = lambda sent: parsed.append(sent) or cached_parse(sent)
+        assert m2_scorer.score_corpus(srcs, HYPS, refs) \
+            == scorer.score_corpus(SRCS, HYPS, REFS)
+        # The references are neither parsed nor aligned.
+        assert len(parsed) > 0
+        assert set(parsed).isdisjoint(set(sum(REFS, [])) - set(SRCS + HYPS))
+
+    def test_score_corpus_report(self):
+        scorer = ERRANT()
+        report = scorer.score_corpus_report(SRCS, HYPS, REFS)
+        overall = scorer.score_corpus_verbose(SRCS, HYPS, REFS)
+        assert (report.overall.tp, report.overall.fp, report.overall.fn) \
+            == (overall.tp, overall.fp, overall.fn)
+        for cat in (report.operation, report.pos, report.type):
+            total = scorer.aggregate_to_overall(cat)
+            assert (total.tp, total.fp, total.fn) \
+                == (overall.tp, overall.fp, overall.fn)
+        assert set(report.operation) <= {'M', 'R', 'U'}
+        assert set(report.pos) == set(t[2:] for t in report.type)
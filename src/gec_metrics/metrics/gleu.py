@@ -8,6 +8,7 @@ from dataclasses import dataclass
 from tqdm import tqdm
 import time
 from .green import GREEN
+from .cache import LRUCache
 
 class GLEU(GREEN):
     '''GLEU implemented using GREEN reformulation (https://aclanthology.org/2024.inlg-main.25.pdf).
@@ -17,12 +18,48 @@ class GLEU(GREEN):
         '''GLEU configuration.
         Args:
             - iter (int): The number of iterations.
+                This is the maximum number of iterations if tolerance is specified.
             - n (int): The maximum n of n-gram.
             - unit (str): Word-level or character-level. Can be 'word' or 'char'.
+            - tolerance (float): If specified, the iterations stop early
+                when the standard error of the mean score falls below this value.
+            - min_iter (int): The minimum number of iterations when tolerance is specified.
+            - cache_max_entries (int): The maximum number of entries, e.g. sentences,
+                shared by all of the caches. If None, the caches are unbounded.
+            - cache_max_bytes (int): The maximum estimated size of all of the caches in bytes.
+                If None, the caches are unbounded.
+                The interned n-gram vocabulary is not counted.
+            - num_workers (int): The number of processes to compute n-gram statistics.
         '''
         iter: int = 500
         n: int = 4
         unit: str = 'word'
+        tolerance: float = None
+        min_iter: int = 10
+        cache_max_entries: int = None
+        cache_max_bytes: int = None
+        num_workers: int = 1
+
+    @dataclass
+    class Estimate:
+        '''The corpus-level score estimated by the iterations.
+            - score (float): The mean of the scores of the iterations.
+            - num_iters (int): The number of iterations used.
+            - std_error (float): The standard error of the mean.
+        '''
+        score: float = None
+        num_iters: int = None
+        std_error: float = None
+
+    def __init__(self, config: Config = None):
+        super().__init__(config)
+        # The sampled reference ids only depend on (offset, num_sents, num_refs),
+        #   thus they are shared among all hypotheses, e.g., in rank_systems().
+        self.cache_ref_ids = LRUCache(
+            budget=self.cache_budget,
+            sizeof=lambda ref_ids: ref_ids.nbytes
+        )
+        self.cache_ref_len = LRUCache(budget=self.cache_budget)
     
     def aggregate_score(
         self,
@@ -38,12 +75,30 @@ class GLEU(GREEN):
             hyp_len (int): The length of the hypothesis.
             ref_len (int): The length of the reference.
         
+        Returns:
+            float: The aggregated score.
+        '''
+        return self.aggregate_precision(
+            [s.precision for s in scores], hyp_len, ref_len
+        )
+
+    def aggregate_precision(
+        self,
+        ps: list[float],
+        hyp_len: int,
+        ref_len: int
+    ) -> float:
+        '''Aggregate n-gram precisions to an overall score by the geometric mean.
+
+        Args:
+            ps (list[float]): The precision of each n-gram. The shape is (n, )
+            hyp_len (int): The length of the hypothesis.
+            ref_len (int): The length of the reference.
+
         Returns:
             float: The aggregated score.
         '''
         log_bp = min(0, 1 - ref_len / hyp_len)
-        ps = [s.precision for s in scores]
-        
         if any(p <= 0 for p in ps):
             return 0
         else:
@@ -69,30 +124,226 @@ class GLEU(GREEN):
         Returns:
             float: The corpus-level score.
         '''
+        return self.score_corpus_verbose(
+            sources, hypotheses, references
+        ).score
+
+    def score_corpus_verbose(
+        self,
+        sources: list[str],
+        hypotheses: list[str],
+        references: list[list[str]]
+    ) -> Estimate:
+        '''Calculate a corpus-level score with the information of the iterations.
+            If config.tolerance is specified, the iterations stop
+                once the standard error of the mean falls below it.
+
+        Args:
+            sources (list[str]): Source sentence.
+                The shape is (num_sentences, )
+            hypotheses (list[str]): Corrected sentences.
+                The shape is (num_sentences, )
+            references (list[list[str]]): Reference sentences.
+                The shape is (num_references, num_sentences).
+        
+        Returns:
+            Estimate: The score, the number of iterations, and the standard error.
+        '''
         verbose_scores, hyp_lens, ref_lens = self.score_base(
             sources,
             hypotheses,
             references
         )
+        num_sents = len(sources)
+        num_refs = len(references)
+        corpus_level_hyp_len = int(hyp_lens.sum())
+        max_iter = self.config.iter
+        # Without the tolerance, all iterations are computed at once.
+        block_size = max_iter if self.config.tolerance is None \
+            else max(self.config.min_iter, 1)
         scores = []  # The shape will be (num_iters,)
-        for iter_id, iter_scores in enumerate(verbose_scores):
-            ngram_wise_scores = [self.Score() for _ in range(self.config.n)]
-            corpus_level_hyp_len = 0
-            corpus_level_ref_len = 0
-            for sent_id, sent_score in enumerate(iter_scores):
-                for n, ngram_score in enumerate(sent_score):
-                    ngram_wise_scores[n] += ngram_score
-                corpus_level_hyp_len += hyp_lens[iter_id][sent_id]
-                corpus_level_ref_len += ref_lens[iter_id][sent_id]
-            s = self.aggregate_score(
-                ngram_wise_scores,
-                corpus_level_hyp_len,
-                corpus_level_ref_len
+        while len(scores) < max_iter:
+            start = len(scores)
+            end = min(start + block_size, max_iter)
+            ref_ids = self.sample_ref_ids(num_sents, num_refs, end)[start:end]
+            iter_scores, iter_ref_lens = self.accumulate_iterations(
+                verbose_scores, ref_lens, ref_ids
+            )
+            scores += self.iteration_scores(
+                iter_scores, corpus_level_hyp_len, iter_ref_lens
             )
-            scores.append(s)
+            if self.config.tolerance is not None:
+                num_iters = self.converged_iters(scores)
+                if num_iters is not None:
+                    scores = scores[:num_iters]
+                    break
         # Average of iterations
         score = sum(scores) / len(scores)
-        return score
+        return self.Estimate(
+            score=score,
+            num_iters=len(scores),
+            std_error=float(self.std_errors(scores)[-1])
+        )
+
+    def iteration_scores(
+        self,
+        iter_scores: np.ndarray,
+        hyp_len: int,
+        iter_ref_lens: np.ndarray
+    ) -> list[float]:
+        '''Aggregate the corpus-level statistics of each iteration into a score.
+
+        Args:
+            iter_scores (np.ndarray): The corpus-level TP and FP for each iteration.
+                The shape is (num_iterations, max_ngram, 2).
+            hyp_len (int): The corpus-level hypothesis length.
+            iter_ref_lens (np.ndarray): The corpus-level reference length for each iteration.
+                The shape is (num_iterations, ).
+
+        Returns:
+            list[float]: The score of each iteration.
+        '''
+        precisions = self.Scores(iter_scores).precision.tolist()
+        return [
+            self.aggregate_precision(ps, hyp_len, corpus_level_ref_len) \
+                for ps, corpus_level_ref_len in zip(precisions, iter_ref_lens.tolist())
+        ]
+
+    def sentence_stats(
+        self,
+        sources: list[str],
+        hypotheses: list[str],
+        references: list[list[str]],
+        offset: int = 0
+    ) -> MetricBaseForReferenceBased.Stats:
+        '''Calculate the sufficient statistics for each sentence.
+            Stats.counts contains:
+                - 'ngram': TP and FP for each reference. The shape is (num_sents, num_refs, max_ngram, 2).
+                - 'ref_len': The reference length. The shape is (num_sents, num_refs).
+                - 'hyp_len': The hypothesis length. The shape is (num_sents, ).
+
+        Args:
+            sources (list[str]): Source sentence.
+                The shape is (num_sentences, )
+            hypotheses (list[str]): Corrected sentences.
+                The shape is (num_sentences, )
+            references (list[list[str]]): Reference sentences.
+                The shape is (num_references, num_sentences).
+            offset (int): The index of the first sentence in the whole corpus.
+
+        Returns:
+            Stats: The sentence-level statistics.
+        '''
+        verbose_scores, hyp_lens, ref_lens = self.score_base(
+            sources,
+            hypotheses,
+            references
+        )
+        return self.Stats(
+            offset=offset,
+            num_sents=len(sources),
+            counts={
+                'ngram': verbose_scores.transpose(1, 0, 2, 3),
+                'ref_len': ref_lens.T,
+                'hyp_len': hyp_lens
+            }
+        )
+
+    def reduce_stats(
+        self,
+        stats: MetricBaseForReferenceBased.Stats,
+        corpus_size: int = None
+    ) -> MetricBaseForReferenceBased.Stats:
+        '''Accumulate the sentence-level statistics for each iteration.
+            The references are sampled as if the sentences are located at stats.offset of the corpus,
+                thus the merged statistics result in the same score as score_corpus()
+                with config.iter iterations.
+            The output Stats.counts contains:
+                - 'iter_scores': TP and FP for each iteration. The shape is (num_iterations, max_ngram, 2).
+                - 'iter_ref_lens': The reference length for each iteration. The shape is (num_iterations, ).
+                - 'hyp_len': The hypothesis length. The shape is ().
+
+        Args:
+            stats (Stats): The output of sentence_stats().
+            corpus_size (int): The number of sentences in the whole corpus.
+                If given, the sampled references of the whole corpus are cached and reused.
+
+        Returns:
+            Stats: The statistics of the sentences.
+        '''
+        num_sents, num_refs = stats.counts['ref_len'].shape
+        if corpus_size is None:
+            ref_ids = self.sample_ref_ids(num_sents, num_refs, offset=stats.offset)
+        else:
+            ref_ids = self.sample_ref_ids(corpus_size, num_refs)[
+                :, stats.offset:stats.offset + num_sents
+            ]
+        iter_scores, iter_ref_lens = self.accumulate_iterations(
+            stats.counts['ngram'].transpose(1, 0, 2, 3),
+            stats.counts['ref_len'].T,
+            ref_ids
+        )
+        return self.Stats(
+            offset=stats.offset,
+            num_sents=num_sents,
+            counts={
+                'iter_scores': iter_scores,
+                'iter_ref_lens': iter_ref_lens,
+                'hyp_len': stats.counts['hyp_len'].sum()
+            }
+        )
+
+    def finalize(self, stats: MetricBaseForReferenceBased.Stats) -> float:
+        '''Compute the corpus-level score from the statistics.
+
+        Args:
+            stats (Stats): The statistics of the whole corpus.
+
+        Returns:
+            float: The corpus-level score.
+        '''
+        scores = self.iteration_scores(
+            stats.counts['iter_scores'],
+            int(stats.counts['hyp_len']),
+            stats.counts['iter_ref_lens']
+        )
+        return sum(scores) / len(scores)
+
+    def std_errors(self, scores: list[float]) -> np.ndarray:
+        '''Compute the standard error of the running mean for each number of iterations.
+
+        Args:
+            scores (list[float]): The scores of the iterations.
+
+        Returns:
+            np.ndarray: The k-th element is the standard error of the mean
+                of the first k+1 scores. The first element is always inf.
+        '''
+        x = np.array(scores, dtype=np.float64)
+        k = np.arange(1, len(x) + 1)
+        mean = np.cumsum(x) / k
+        # Unbiased variance via the running sum of squares.
+        sq = np.cumsum(x ** 2) - k * mean ** 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            var = np.where(k > 1, np.maximum(sq, 0) / (k - 1), np.inf)
+        return np.sqrt(var / k)
+
+    def converged_iters(self, scores: list[float]) -> int | None:
+        '''Find the smallest number of iterations (>= config.min_iter)
+            where the standard error is not more than config.tolerance.
+
+        Args:
+            scores (list[float]): The scores of the iterations.
+
+        Returns:
+            int | None: The number of iterations, or None if not converged yet.
+        '''
+        std_errors = self.std_errors(scores)
+        min_iter = max(self.config.min_iter, 2)
+        converged = np.flatnonzero(std_errors[min_iter - 1:] <= self.config.tolerance)
+        if len(converged) == 0:
+            return None
+        return int(converged[0]) + min_iter
 
     def score_sentence(
         self,
@@ -113,37 +364,203 @@ class GLEU(GREEN):
         Returns:
             list[float]: The sentence-level scores.
         '''
-        # The number of iteration is always 1
-        #   because we do not need to draw a reference.
-        original_iter = self.config.iter
-        self.config.iter = 1
-        scores = [[] for _ in range(len(sources))]  # The shape will be (num_sents, num_iters=1)
-        for i in range(len(references)):
-            verbose_scores, hyp_lens, ref_lens = self.score_base(
-                sources,
-                hypotheses,
-                references[i:i+1]  # Use only i-th reference
-            )
-            for iter_id, iter_scores in enumerate(verbose_scores):
-                for sent_id, sent_score in enumerate(iter_scores):
-                    # Aggregate ngram-wise score to an overall score
-                    s = self.aggregate_score(
-                        sent_score,
-                        hyp_len=hyp_lens[iter_id][sent_id],
-                        ref_len=ref_lens[iter_id][sent_id]
-                    )
-                    scores[sent_id].append(s)
+        # We do not need to draw a reference,
+        #   the score is simply the average over the references.
+        verbose_scores, hyp_lens, ref_lens = self.score_base(
+            sources,
+            hypotheses,
+            references
+        )
+        hyp_lens = hyp_lens.tolist()
+        scores = [[] for _ in range(len(sources))]  # The shape will be (num_sents, num_refs)
+        precisions = self.Scores(verbose_scores).precision.tolist()
+        for ref_ps, ref_ref_lens in zip(precisions, ref_lens.tolist()):
+            for sent_id, ps in enumerate(ref_ps):
+                # Aggregate ngram-wise score to an overall score
+                s = self.aggregate_precision(
+                    ps,
+                    hyp_len=hyp_lens[sent_id],
+                    ref_len=ref_ref_lens[sent_id]
+                )
+                scores[sent_id].append(s)
         # Average of references
         scores = [sum(s) / len(s) for s in scores]
-        self.config.iter = original_iter
         return scores
+
+    def sentence_length(self, sentence: str) -> int:
+        '''The length of a sentence in the unit of config.unit.'''
+        if self.config.unit == 'word':
+            return len(sentence.split(' '))
+        return len(sentence)
+
+    def cached_sentence_length(self, sentence: str) -> int:
+        '''Efficient sentence_length() by caching.
+            This is used for references that are shared among hypotheses.'''
+        length = self.cache_ref_len.get(sentence)
+        if length is None:
+            length = self.sentence_length(sentence)
+            self.cache_ref_len[sentence] = length
+        return length
+
+    def classify_ngrams(
+        self,
+        ms: np.ndarray,
+        mh: np.ndarray,
+        mr: np.ndarray
+    ) -> np.ndarray:
+        '''Classify n-gram counts into GLEU's TP and FP.
+            TP = TI + TK - UD, FP = OI + 2*UD.
+            N-grams not in the hypothesis contribute nothing to them.
+
+        Args:
+            ms (np.ndarray): The frequency in the source. The shape is (num_ngrams, ).
+            mh (np.ndarray): The frequency in the hypothesis. The shape is (num_ngrams, ).
+            mr (np.ndarray): The frequency in the reference. The shape is (num_ngrams, ).
+
+        Returns:
+            np.ndarray: The counts. The shape is (num_ngrams, 2) for TP and FP.
+        '''
+        ti = np.maximum(np.minimum(mr, mh) - ms, 0)
+        tk = np.minimum(np.minimum(ms, mh), mr)
+        oi = np.maximum(mh - np.maximum(ms, mr), 0)
+        ud = np.maximum(np.minimum(ms, mh) - mr, 0)
+        return np.stack([ti + tk - ud, oi + 2 * ud], axis=-1)
+
+    def sample_ref_ids(
+        self,
+        num_sents: int,
+        num_refs: int,
+        num_iters: int = None,
+        offset: int = 0
+    ) -> np.ndarray:
+        '''Draw the reference ids for the iterations.
+            The i-th row is always the same regardless of num_iters.
+
+        Args:
+            num_sents (int): The number of sentences.
+            num_refs (int): The number of references.
+            num_iters (int): The number of iterations. If None, config.iter is used.
+            offset (int): The index of the first sentence.
+                The ids are drawn for the sentences [offset, offset + num_sents).
+
+        Returns:
+            np.ndarray: The sampled reference ids.
+                The shape is (num_iterations, num_sents).
+        '''
+        if num_iters is None:
+            num_iters = self.config.iter
+        key = (offset, num_sents, num_refs)
+        dtype = np.min_scalar_type(num_refs)
+        ref_ids = self.cache_ref_ids.get(key)
+        if ref_ids is None:
+            ref_ids = np.zeros((0, num_sents), dtype=dtype)
+        if len(ref_ids) < num_iters:
+            new_ref_ids = np.zeros((num_iters - len(ref_ids), num_sents), dtype=dtype)
+            for i, iter_id in enumerate(range(len(ref_ids), num_iters)):
+                # As same as official implementation, we fix seed `iter_id * 101`.
+                new_ref_ids[i] = self.randint_sequence(
+                    iter_id * 101, offset + num_sents, num_refs
+                )[offset:]
+            ref_ids = np.concatenate([ref_ids, new_ref_ids])
+            self.cache_ref_ids[key] = ref_ids
+        return ref_ids[:num_iters]
+
+    def randint_sequence(
+        self,
+        seed: int,
+        size: int,
+        num_refs: int
+    ) -> np.ndarray:
+        '''Draw integers in [0, num_refs) with NumPy,
+            which is the same sequence as
+            `random.seed(seed); [random.randint(0, num_refs - 1) for _ in range(size)]`
+            but without touching the global random state.
+
+            Both of Python's random and np.random.RandomState use MT19937
+                and an array seed is passed to the same init_by_array().
+            Python's randint() takes the top k bits of a 32-bit output
+                and rejects values >= num_refs, where k = num_refs.bit_length().
+
+        Args:
+            seed (int): The random seed.
+            size (int): The number of integers.
+            num_refs (int): The upper bound (exclusive).
+
+        Returns:
+            np.ndarray: The drawn integers. The shape is (size, ).
+        '''
+        if num_refs == 1:
+            return np.zeros(size, dtype=np.int64)
+        key = []
+        while True:
+            key.append(seed & 0xFFFFFFFF)
+            seed >>= 32
+            if seed == 0:
+                break
+        rng = np.random.RandomState(key)
+        k = num_refs.bit_length()
+        drawn = [np.zeros(0, dtype=np.int64)]
+        remaining = size
+        while remaining > 0:
+            # The acceptance rate is num_refs / 2**k (> 0.5).
+            num_draws = remaining * (2 ** k) // num_refs + 32
+            words = rng.randint(0, 2 ** 32, size=num_draws, dtype=np.uint32)
+            candidates = (words >> np.uint32(32 - k)).astype(np.int64)
+            accepted = candidates[candidates < num_refs][:remaining]
+            drawn.append(accepted)
+            remaining -= len(accepted)
+        return np.concatenate(drawn)
+
+    def accumulate_iterations(
+        self,
+        verbose_scores: np.ndarray,
+        ref_lens: np.ndarray,
+        ref_ids: np.ndarray,
+        chunk_size: int = 4096
+    ) -> tuple[np.ndarray, np.ndarray]:
+        '''Accumulate the scores and the reference lengths over sentences
+            for each iteration, given the sampled reference ids.
+
+        Args:
+            verbose_scores (np.ndarray): The output of score_base().
+                The shape is (num_refs, num_sents, max_ngram, 2).
+            ref_lens (np.ndarray): The length of the references.
+                The shape is (num_refs, num_sents).
+            ref_ids (np.ndarray): The sampled reference ids.
+                The shape is (num_iterations, num_sents).
+            chunk_size (int): The number of sentences processed at once.
+
+        Returns:
+            np.ndarray: The corpus-level TP and FP for each iteration.
+                The shape is (num_iterations, max_ngram, 2).
+            np.ndarray: The corpus-level reference length for each iteration.
+                The shape is (num_iterations, ).
+        '''
+        num_refs, num_sents = ref_lens.shape
+        num_iters = ref_ids.shape[0]
+        # Concatenate the lengths so that they are summed in the same product.
+        # (num_refs, num_sents, max_ngram * 2 + 1)
+        features = np.concatenate([
+            verbose_scores.reshape(num_refs, num_sents, -1),
+            ref_lens[:, :, None]
+        ], axis=-1).astype(np.float64)
+        accumulated = np.zeros((num_iters, features.shape[-1]))
+        for start in range(0, num_sents, chunk_size):
+            end = min(start + chunk_size, num_sents)
+            for ref_id in range(num_refs):
+                # (num_iters, chunk) @ (chunk, max_ngram * 2 + 1)
+                is_sampled = (ref_ids[:, start:end] == ref_id).astype(np.float64)
+                accumulated += is_sampled @ features[ref_id, start:end]
+        iter_scores = accumulated[:, :-1].reshape(num_iters, -1, 2)
+        iter_ref_lens = accumulated[:, -1].astype(np.int64)
+        return iter_scores, iter_ref_lens
         
     def score_base(
         self,
         sources: list[str],
         hypotheses: list[str],
         references: list[list[str]]
-    ) -> float:
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
         '''Compute True Positive and False Negative using GREEN's reformulation.
             (https://aclanthology.org/2024.inlg-main.25.pdf)
 
@@ -153,6 +570,9 @@ class GLEU(GREEN):
                 - False Positive (FP) as OI + 2*UD.
             Finally, precision = TP / (TP+FP) will be the GLEU score.
 
+            The score is determined by the sentence id and the reference id,
+                thus we compute them once and the iterations only sample the reference ids.
+
         Args:
             sources (list[str]): Source sentence.
             hypothesis (list[str]): Corrected sentences.
@@ -160,80 +580,80 @@ class GLEU(GREEN):
                 The shape is (the number of references, the number of sentences).
         
         Returns:
-            list[list[list["Score"]]]: The verbose scores.
-                The shape is (num_iterations, num_sents, max_ngram).
-            list[list[int]]: The length for the hypotheses. 
-                The shape is (num_iterations, num_sents)
-            list[list[int]]: The length for the references. 
-                The shape is (num_iterations, num_sents) 
+            np.ndarray: The verbose scores containing TP and FP.
+                The shape is (num_refs, num_sents, max_ngram, 2).
+            np.ndarray: The length for the hypotheses. 
+                The shape is (num_sents, )
+            np.ndarray: The length for the references. 
+                The shape is (num_refs, num_sents) 
         '''
         num_sents = len(sources)
         num_refs = len(references)
-        all_ref_lens = [
-            [len(r.split(' ')) if self.config.unit == 'word' else len(r) for r in ref] \
-                for ref in references
-        ]
-        scores = []  # The shape will be (num_iters, num_sents, max_ngram)
-        ref_lens = []  # (num_iters, num_sents)
-        hyp_lens = [
-            [len(h.split(' ')) if self.config.unit == 'word' else len(h) \
-                for h in hypotheses]
-        ] * self.config.iter  # (num_iters, num_sents)
-        cached_score = np.zeros((num_refs, num_sents)).tolist()
-
-        for sent_id in range(num_sents):
-            ngram_s = self.cached_get_all_ngrams(sources[sent_id])
-            ngram_h = self.cached_get_all_ngrams(hypotheses[sent_id])
-            for ref_id in range(num_refs):
-                ngram_r = self.cached_get_all_ngrams(references[ref_id][sent_id])
-                this_score = [self.Score() for _ in range(self.config.n)]
-                for ngram in ngram_h:
-                    idx = len(ngram) - 1
-                    ms = ngram_s.get(ngram, 0)
-                    mh = ngram_h.get(ngram, 0)
-                    mr = ngram_r.get(ngram, 0)
-                    ti = max(min(mr, mh) - ms, 0)
-                    tk = min(ms, mh, mr)
-                    oi = max(mh - max(ms, mr), 0)
-                    ud = max(min(ms, mh) - mr, 0)
-                    s = this_score[idx]
-                    # TI
-                    s.tp += ti
-                    # TK
-                    s.tp += tk
-                    # OI
-                    s.fp += oi
-                    # UD
-                    s.tp -= ud
-                    s.fp += 2 * ud
-                cached_score[ref_id][sent_id] = this_score
-
-        for iter_id in range(self.config.iter):
-            # Draw the ids of the references.
-            # As same as official implementation, we fix seed `iter_id * 101`.
-            random.seed(iter_id*101)
-            sampled_ref_ids = [random.randint(0, num_refs - 1) for _ in range(num_sents)]
-            # Extract the sampled reference and its length.
-            ref_lens.append([
-                all_ref_lens[ref_id][sent_id] \
-                    for sent_id, ref_id in enumerate(sampled_ref_ids)
-            ])
-            this_iter_scores = [cached_score[ref_id][sent_id] \
-                    for sent_id, ref_id in enumerate(sampled_ref_ids)]
-            scores.append(this_iter_scores)
-        return scores, hyp_lens, ref_lens
+        verbose_scores = self.ngram_stats(
+            sources, hypotheses, references
+        ).transpose(1, 0, 2, 3)
+        hyp_lens = np.array(
+            [self.sentence_length(h) for h in hypotheses], dtype=np.int64
+        )
+        ref_lens = np.array(
+            [[self.cached_sentence_length(r) for r in ref] for ref in references], dtype=np.int64
+        ).reshape(num_refs, num_sents)
+        return verbose_scores, hyp_lens, ref_lens
     
 class GLEUOfficial(GLEU):
+    def sentence_length(self, sentence: str) -> int:
+        '''The official implementation always uses the number of words.'''
+        return len(sentence.split(' '))
+
+    def classify_ngrams(
+        self,
+        ms: np.ndarray,
+        mh: np.ndarray,
+        mr: np.ndarray
+    ) -> np.ndarray:
+        '''The official implementation contains an error
+                where the frequency of n-grams is ignored in the calculation of S\\R. 
+            As a result, when an n-gram is classified into both TK and UD, 
+                it is entirely counted as TK.
+
+        Args:
+            ms (np.ndarray): The frequency in the source. The shape is (num_ngrams, ).
+            mh (np.ndarray): The frequency in the hypothesis. The shape is (num_ngrams, ).
+            mr (np.ndarray): The frequency in the reference. The shape is (num_ngrams, ).
+
+        Returns:
+            np.ndarray: The counts. The shape is (num_ngrams, 2) for TP and FP.
+        '''
+        ti = np.maximum(np.minimum(mr, mh) - ms, 0)
+        tk = np.minimum(np.minimum(ms, mh), mr)
+        oi = np.maximum(mh - np.maximum(ms, mr), 0)
+        ud = np.maximum(np.minimum(ms, mh) - mr, 0)
+        # If TK > 0 and UD > 0, the official implementation treats both of them as TK.
+        # Considering that the TP includes "-UD" and the FP includes "2*UD",
+        #   this can handle by reducing UD by half and push the rest onto TK.
+        # For example, when a ngram has TK=2 and UD=1,
+        #   In the correct GLEU is
+        #       TP = TK-UD = 2 - 1 = 1
+        #       FP = 2*UD = 2 * 1 = 2
+        #       Precision (GLEU) = TP / (TP+FP) = 1/3
+        #   For the official implementation,
+        #       we preprocess: TK ← TK + UD/2 = 2.5, UD ← UD/2 = 0.5
+        #       TP = TK-UD = 2.5 - 0.5 = 2
+        #       FP = 2*UD = 1
+        #       Precision (GLEU) = TP / (TP+FP) = 2/3
+        # Treating UD as TK causes the difference between 1/3 and 2/3.
+        ud = np.where(tk > 0, ud / 2, ud)
+        tk = np.where(tk > 0, tk + ud, tk)
+        return np.stack([ti + tk - ud, oi + 2 * ud], axis=-1)
+
     def score_base(
         self,
         sources: list[str],
         hypotheses: list[str],
         references: list[list[str]]
-    ) -> Tuple[list[list[list["Score"]]], list[list[int]], list[list[int]]]:
-        '''The official implementation contains an error
-                where the frequency of n-grams is ignored in the calculation of S\R. 
-            As a result, when an n-gram is classified into both TK and UD, 
-                it is entirely counted as TK.
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''Compute TP and FP in the same way as the official implementation.
+            See classify_ngrams() for the difference from GLEU.
 
         Args:
             sources (list[str]): Source sentence.
@@ -242,88 +662,22 @@ class GLEUOfficial(GLEU):
                 The shape is (the number of references, the number of sentences).
         
         Returns:
-            list[list[list["Score"]]]: The verbose scores.
-                The shape is (num_iterations, num_sents, max_ngram).
-            list[list[int]]: The length for the hypotheses. 
-                The shape is (num_iterations, num_sents)
-            list[list[int]]: The length for the references. 
-                The shape is (num_iterations, num_sents) 
+            np.ndarray: The verbose scores containing TP and FP.
+                The shape is (num_refs, num_sents, max_ngram, 2).
+            np.ndarray: The length for the hypotheses. 
+                The shape is (num_sents, )
+            np.ndarray: The length for the references. 
+                The shape is (num_refs, num_sents) 
         '''
-        num_sents = len(sources)
-        num_refs = len(references)
-        all_ref_lens = [
-            [len(r.split(' ')) for r in ref] for ref in references
-        ]
-        scores = []  # The shape will be (num_iters, num_sents, max_ngram)
-        ref_lens = []  # (num_iters, num_sents)
-        # The length of hypthesis is the same in all iterations.
-        hyp_lens = [[len(h.split(' ')) for h in hypotheses]] * self.config.iter  # (num_iters, num_sents)
-        # The score is determined by the sentence id and the reference id,
-        #   thus we pre-compute and cache them.
-        # In the iterations we only sample the reference ids.
-        cached_score = np.zeros((num_refs, num_sents)).tolist()
-
-        for sent_id in range(num_sents):
-            ngram_s = self.cached_get_all_ngrams(sources[sent_id])
-            ngram_h = self.cached_get_all_ngrams(hypotheses[sent_id])
-            for ref_id in range(num_refs):
-                ngram_r = self.cached_get_all_ngrams(references[ref_id][sent_id])
-                this_score = [self.Score() for _ in range(self.config.n)]
-                for ngram in ngram_h:
-                    idx = len(ngram) - 1
-                    ms = ngram_s.get(ngram, 0)
-                    mh = ngram_h.get(ngram, 0)
-                    mr = ngram_r.get(ngram, 0)
-                    ti = max(min(mr, mh) - ms, 0)
-                    tk = min(ms, mh, mr)
-                    oi = max(mh - max(ms, mr), 0)
-                    ud = max(min(ms, mh) - mr, 0)
-                    # If TK > 0 and UD > 0, the official implementation treats both of them as TK.
-                    # Considering that the TP includes "-UD" and the FP includes "2*UD",
-                    #   this can handle by reducing UD by half and push the rest onto TK.
-                    # For example, when a ngram has TK=2 and UD=1,
-                    #   In the correct GLEU is
-                    #       TP = TK-UD = 2 - 1 = 1
-                    #       FP = 2*UD = 2 * 1 = 2
-                    #       Precision (GLEU) = TP / (TP+FP) = 1/3
-                    #   For the official implementation,
-                    #       we preprocess: TK ← TK + UD/2 = 2.5, UD ← UD/2 = 0.5
-                    #       TP = TK-UD = 2.5 - 0.5 = 2
-                    #       FP = 2*UD = 1
-                    #       Precision (GLEU) = TP / (TP+FP) = 2/3
-                    # Treating UD as TK causes the difference between 1/3 and 2/3.
-                    if tk > 0:
-                        ud = ud / 2
-                        tk += ud
-                    s = this_score[idx]
-                    # TI
-                    s.tp += ti
-                    # TK
-                    s.tp += tk
-                    # OI
-                    s.fp += oi
-                    # UD
-                    s.tp -= ud
-                    s.fp += 2 * ud
-                # The official implementation also takes max(TP, 0).
-                # This means we add |TP| if (TK+TI-UD) < 0.
-                # We handle this by adding TP to FP when TP<0, and set TP to zero.
-                for i in range(self.config.n):
-                    if this_score[i].tp < 0:
-                        this_score[i].fp += this_score[i].tp
-                        this_score[i].tp = 0
-                cached_score[ref_id][sent_id] = this_score
-
-        for iter_id in range(self.config.iter):
-            # Draw the ids of the references.
-            # As same as official implementation, we fix seed `iter_id * 101`.
-            random.seed(iter_id*101)
-            sampled_ref_ids = [random.randint(0, num_refs - 1) for _ in range(num_sents)]
-            ref_lens.append([
-                all_ref_lens[ref_id][sent_id] \
-                    for sent_id, ref_id in enumerate(sampled_ref_ids)
-            ])
-            this_iter_scores = [cached_score[ref_id][sent_id] \
-                                for sent_id, ref_id in enumerate(sampled_ref_ids)]
-            scores.append(this_iter_scores)
-        return scores, hyp_lens, ref_lens
\ No newline at end of file
+        verbose_scores, hyp_lens, ref_lens = super().score_base(
+            sources, hypotheses, references
+        )
+        # The official implementation also takes max(TP, 0).
+        # This means we add |TP| if (TK+TI-UD) < 0.
+        # We handle this by adding TP to FP when TP<0, and set TP to zero.
+        tp = verbose_scores[..., 0]
+        fp = verbose_scores[..., 1]
+        is_negative = tp < 0
+        fp[is_negative] += tp[is_negative]
+        tp[is_negative] = 0
+        return verbose_scores, hyp_lens, ref_lens
\ No newline at end of file
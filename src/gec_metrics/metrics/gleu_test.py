@@ -1,6 +1,7 @@
 from .gleu import GLEU, GLEUOfficial
 import pytest
 import math
+import random
 
 SRCS = [
     'This sentences contain gramamtical error .',
@@ -35,6 +36,84 @@ cases_official = [
     (0.369131, [0.5, 0.0, 1.0, 0.2640485]),
 ]
 
+def nested_loop_gleu(
+    scorer: GLEU,
+    sources: list[str],
+    hypotheses: list[str],
+    references: list[list[str]]
+) -> tuple[float, list[float]]:
+    '''Corpus-level and sentence-level GLEU by looping over iterations, sentences and n-grams.
+        The official quirks are applied if scorer is GLEUOfficial.
+    '''
+    official = isinstance(scorer, GLEUOfficial)
+    n = scorer.config.n
+    def length(sent):
+        return len(sent) if scorer.config.unit == 'char' and not official \
+            else len(sent.split(' '))
+    def ngram_scores(src, hyp, ref):
+        ngram_s = scorer.get_all_ngrams(src)
+        ngram_h = scorer.get_all_ngrams(hyp)
+        ngram_r = scorer.get_all_ngrams(ref)
+        this_score = [GLEU.Score() for _ in range(n)]
+        for ngram in ngram_h:
+            ms, mh, mr = ngram_s[ngram], ngram_h[ngram], ngram_r[ngram]
+            ti = max(min(mr, mh) - ms, 0)
+            tk = min(ms, mh, mr)
+            oi = max(mh - max(ms, mr), 0)
+            ud = max(min(ms, mh) - mr, 0)
+            if official and tk > 0:
+                ud = ud / 2
+                tk += ud
+            s = this_score[len(ngram) - 1]
+            s.tp += ti + tk - ud
+            s.fp += oi + 2 * ud
+        if official:
+            for s in this_score:
+                if s.tp < 0:
+                    s.fp += s.tp
+                    s.tp = 0
+        return this_score
+    def aggregate(scores, hyp_len, ref_len):
+        log_bp = min(0, 1 - ref_len / hyp_len)
+        ps = [s.precision for s in scores]
+        if any(p <= 0 for p in ps):
+            return 0
+        return math.exp(log_bp + sum(math.log(p) for p in ps) / n)
+    num_sents = len(sources)
+    num_refs = len(references)
+    cached = [[
+        ngram_scores(sources[i], hypotheses[i], ref[i]) for i in range(num_sents)
+    ] for ref in references]
+    state = random.getstate()
+    corpus_scores = []
+    for iter_id in range(scorer.config.iter):
+        random.seed(iter_id * 101)
+        ref_ids = [random.randint(0, num_refs - 1) for _ in range(num_sents)]
+        total = [GLEU.Score() for _ in range(n)]
+        hyp_len = ref_len = 0
+        for sent_id, ref_id in enumerate(ref_ids):
+            for k in range(n):
+                total[k] += cached[ref_id][sent_id][k]
+            hyp_len += length(hypotheses[sent_id])
+            ref_len += length(references[ref_id][sent_id])
+        corpus_scores.append(aggregate(total, hyp_len, ref_len))
+    random.setstate(state)
+    sent_scores = [
+        sum(
+            aggregate(cached[ref_id][i], length(hypotheses[i]), length(references[ref_id][i])) \
+                for ref_id in range(num_refs)
+        ) / num_refs for i in range(num_sents)
+    ]
+    return sum(corpus_scores) / len(corpus_scores), sent_scores
+
+def random_sentences(rng: random.Random, num_sents: int) -> list[str]:
+    '''Sentences of a small vocabulary, thus n-grams are often repeated.'''
+    vocab = ['a', 'b', 'c', 'd', '.']
+    return [
+        ' '.join(rng.choice(vocab) for _ in range(rng.choice([1, 3, 8, 15]))) \
+            for _ in range(num_sents)
+    ]
+
 class TestGLEU:
     @pytest.mark.parametrize("gold_corpus_score,gold_sent_score", cases)
     def test_metric(self, gold_corpus_score, gold_sent_score):
@@ -46,8 +125,8 @@ class TestGLEU:
         sent_score = scorer.score_sentence(
             SRCS, HYPS, REFS
         )
-        assert [math.isclose(s1, s2, abs_tol=1e-9) \
-                for s1, s2 in zip(sent_score, gold_sent_score)]
+        assert all(math.isclose(s1, s2, abs_tol=1e-9) \
+                for s1, s2 in zip(sent_score, gold_sent_score))
         
     @pytest.mark.parametrize("gold_corpus_score,gold_sent_score", cases_official)
     def test_off_metric(self, gold_corpus_score, gold_sent_score):
@@ -59,8 +138,93 @@ class TestGLEU:
         sent_score = scorer.score_sentence(
             SRCS, HYPS, REFS
         )
-        assert [math.isclose(s1, s2, abs_tol=1e-5) \
-                for s1, s2 in zip(sent_score, gold_sent_score)]
+        assert all(math.isclose(s1, s2, abs_tol=1e-5) \
+                for s1, s2 in zip(sent_score, gold_sent_score))
+    
     
     
-    
\ No newline at end of file
+    @pytest.mark.parametrize("metric_cls", [GLEU, GLEUOfficial])
+    @pytest.mark.parametrize("unit", ['word', 'char'])
+    @pytest.mark.parametrize("num_refs", [1, 3])
+    def test_same_as_nested_loop(self, metric_cls, unit, num_refs):
+        rng = random.Random(num_refs)
+        num_sents = 100
+        srcs = random_sentences(rng, num_sents)
+        hyps = random_sentences(rng, num_sents)
+        # Some of the hypotheses are not corrected.
+        hyps = [s if rng.random() < 0.2 else h for s, h in zip(srcs, hyps)]
+        refs = [random_sentences(rng, num_sents) for _ in range(num_refs)]
+        scorer = metric_cls(metric_cls.Config(iter=50, unit=unit))
+        gold_corpus_score, gold_sent_score = nested_loop_gleu(scorer, srcs, hyps, refs)
+        assert math.isclose(
+            scorer.score_corpus(srcs, hyps, refs), gold_corpus_score, abs_tol=1e-9
+        )
+        sent_score = scorer.score_sentence(srcs, hyps, refs)
+        assert len(sent_score) == num_sents
+        assert all(math.isclose(s1, s2, abs_tol=1e-9) \
+                for s1, s2 in zip(sent_score, gold_sent_score))
+
+    @pytest.mark.parametrize("num_refs", [1, 2, 3, 5])
+    def test_sample_ref_ids(self, num_refs):
+        scorer = GLEU(GLEU.Config(iter=20))
+        state = random.getstate()
+        ref_ids = scorer.sample_ref_ids(100, num_refs)
+        # The global random state should not be changed.
+        assert random.getstate() == state
+        for iter_id in range(20):
+            # The official implementation draws references in this way.
+            random.seed(iter_id*101)
+            gold = [random.randint(0, num_refs - 1) for _ in range(100)]
+            assert ref_ids[iter_id].tolist() == gold
+
+    def test_bounded_ref_ids_cache(self):
+        scorer = GLEU(GLEU.Config(iter=20, cache_max_entries=2))
+        unbounded_scorer = GLEU(GLEU.Config(iter=20))
+        for offset in range(5):
+            assert (scorer.sample_ref_ids(10, 3, offset=offset) \
+                == unbounded_scorer.sample_ref_ids(10, 3, offset=offset)).all()
+        info = scorer.cache_info()['cache_ref_ids']
+        assert info.num_entries <= 2
+        assert info.evictions > 0
+
+    def test_tolerance(self):
+        scorer = GLEU(GLEU.Config(tolerance=0.05, min_iter=5))
+        estimate = scorer.score_corpus_verbose(SRCS, HYPS, REFS)
+        assert 5 <= estimate.num_iters < 500
+        assert estimate.std_error <= 0.05
+        # Early stopping equals to running the same number of iterations.
+        fixed_scorer = GLEU(GLEU.Config(iter=estimate.num_iters))
+        corpus_score = fixed_scorer.score_corpus(SRCS, HYPS, REFS)
+        assert math.isclose(estimate.score, corpus_score, abs_tol=1e-9)
+
+    def test_num_workers(self):
+        scorer = GLEU(GLEU.Config(num_workers=2))
+        # Shard even this small input.
+        scorer.min_shard_size = 2
+        serial_scorer = GLEU()
+        assert scorer.score_corpus(SRCS, HYPS, REFS) \
+            == serial_scorer.score_corpus(SRCS, HYPS, REFS)
+        assert scorer.score_sentence(SRCS, HYPS, REFS) \
+            == serial_scorer.score_sentence(SRCS, HYPS, REFS)
+
+    def test_score_stats(self):
+        scorer = GLEU()
+        shards = [(2, 4), (0, 2)]
+        stats = [scorer.score_stats(
+            SRCS[i:j], HYPS[i:j], [r[i:j] for r in REFS], offset=i
+        ) for i, j in shards]
+        # Round trip via JSON serializable dict.
+        stats = [scorer.Stats.from_dict(s.to_dict()) for s in stats]
+        assert scorer.finalize(scorer.merge(stats)) \
+            == scorer.score_corpus(SRCS, HYPS, REFS)
+        with pytest.raises(ValueError):
+            scorer.merge(stats[1:] + stats[1:])
+
+    def test_incremental_scorer(self):
+        scorer = GLEU()
+        hyps = list(HYPS)
+        inc = scorer.incremental_scorer(SRCS, hyps, REFS)
+        assert inc.score() == scorer.score_corpus(SRCS, hyps, REFS)
+        hyps[1] = REFS[0][1]
+        inc.update(1, hyps[1])
+        assert inc.score() == scorer.score_corpus(SRCS, hyps, REFS)
@@ -3,6 +3,8 @@ from .errant import ERRANT
 import errant 
 from dataclasses import dataclass
 from collections import Counter
+import bisect
+import itertools
 import json
 
 class GoToScorer(ERRANT):
@@ -36,6 +38,36 @@ class GoToScorer(ERRANT):
         weight: float = 1.0
         is_edited: bool = False
 
+    class ChunkIndex:
+        '''Index of hypothesis chunks to find the chunks related to a reference chunk
+            without scanning all of them.
+            - spans: (o_start, o_end) -> the first chunk of the span.
+            - starts: o_start of the chunks in ascending order.
+            - num_edited: The number of edited chunks in starts[:i].
+            - covered: The positions strictly inside an edited chunk,
+                i.e., o_start < position < o_end.
+        '''
+        def __init__(self, chunks: list["GoToScorer.Chunk"]):
+            self.num_chunks = len(chunks)
+            self.spans = dict()
+            for c in chunks:
+                self.spans.setdefault((c.o_start, c.o_end), c)
+            chunks = sorted(chunks, key=lambda c: c.o_start)
+            self.starts = [c.o_start for c in chunks]
+            self.num_edited = [0] + list(itertools.accumulate(
+                int(c.is_edited) for c in chunks
+            ))
+            self.covered = set()
+            for c in chunks:
+                if c.is_edited:
+                    self.covered.update(range(c.o_start + 1, c.o_end))
+
+        def any_edited_start(self, start: int, end: int) -> bool:
+            '''Whether any edited chunk starts in [start, end).'''
+            i = bisect.bisect_left(self.starts, start)
+            j = bisect.bisect_left(self.starts, end)
+            return self.num_edited[j] - self.num_edited[i] > 0
+
     def __init__(self, config: Config = None):
         super().__init__(config)
         if not self.config.no_weight:
@@ -46,7 +78,7 @@ class GoToScorer(ERRANT):
 
     def generate_chunks(
         self,
-        edits: list[errant.edit.Edit],
+        edits: list[ERRANT.Edit],
         tokens: list[str]
     ) -> list[Chunk]:
         '''Generate a chunk sequence given an edit sequence.
@@ -55,8 +87,8 @@ class GoToScorer(ERRANT):
             - Dummy chunks will be inserted between all tokens 
                 to account for possible insertions.
         Args:
-            edits (list[errant.edit.Edit]):
-                The edit sequence that can be obtained via errant.annotate()
+            edits (list[ERRANT.Edit]):
+                The edit sequence that can be obtained via edit_extraction()
             tokens (list[str]):
                 The source tokens.
 
@@ -128,11 +160,41 @@ class GoToScorer(ERRANT):
             ))
         return new_chunks
         
+    def edit_targets(
+        self,
+        hypotheses: list[list[str]],
+        references: list[list[str]]
+    ) -> list[list[str]]:
+        '''GoToScorer uses only the reference of config.ref_id.'''
+        return hypotheses + [references[self.config.ref_id]]
+
+    def sentence_stats(
+        self,
+        sources: list[str],
+        hypotheses: list[str],
+        references: list[list[str]],
+        offset: int = 0
+    ) -> MetricBaseForReferenceBased.Stats:
+        '''Calculate the sufficient statistics for each sentence.
+            The weights are looked up from `offset`.
+            See ERRANT.sentence_stats() for the details.
+        '''
+        verbose_scores = self.score_base(
+            sources,
+            hypotheses,
+            references,
+            offset=offset,
+            classify=not self.config.skip_classification
+        )
+        return self.verbose_to_stats(verbose_scores, offset)
+
     def score_base(
         self,
         sources: list[str],
         hypotheses: list[str],
-        references: list[list[str]]
+        references: list[list[str]],
+        offset: int = 0,
+        classify: bool = True
     ) -> list[list[dict[str, "Score"]]]:
         '''Calculate scores while retaining sentence and reference boundaries.
             The results can be aggregated according to the purpose,
@@ -143,7 +205,9 @@ class GoToScorer(ERRANT):
             hypothesis (list[str]): Corrected sentences.
             references (list[list[str]]): Reference sentences.
                 The shape is (the number of references, the number of sentences).
-        
+            offset (int): The index of the first sentence in the weight file.
+            classify (bool): Whether the error types are classified.
+
         Returns:
             list[list[dict[str, "Score"]]]: The verbose scores.
                 - The list shape is (num_sents, num_refs)
@@ -152,33 +216,39 @@ class GoToScorer(ERRANT):
         num_sents = len(sources)
         num_refs = len(references)
         assert 0 <= self.config.ref_id < num_refs
+        self.prepare_edit_extraction(
+            sources, self.edit_targets([hypotheses], references), classify
+        )
         scores = list()  # The shape will be (num_sents, )
         for sent_id in range(num_sents):
             hyp_edits = self.edit_extraction(
                 sources[sent_id],
-                hypotheses[sent_id]
+                hypotheses[sent_id],
+                classify
             )
             ref_edits = self.edit_extraction(
                 sources[sent_id],
-                references[self.config.ref_id][sent_id]
+                references[self.config.ref_id][sent_id],
+                classify
             )
             hyp_chunks = self.generate_chunks(
                 hyp_edits,
-                tokens=sources[sent_id].split(' ')
+                tokens=self.tokenize(sources[sent_id])
             )
             ref_chunks = self.generate_chunks(
                 ref_edits,
-                tokens=sources[sent_id].split(' ')
+                tokens=self.tokenize(sources[sent_id])
             )
             no_weight = self.config.no_weight
             if not no_weight:
-                weights = self.weights[sent_id]
+                weights = self.weights[offset + sent_id]
                 assert len(ref_chunks) == len(weights), f"{sent_id=} {len(ref_chunks)=} {len(weights)=}"
             this_score = dict()
+            hyp_index = self.ChunkIndex(hyp_chunks)
             for i, r_chunk in enumerate(ref_chunks):
                 r_chunk.weight = 1.0 if no_weight else weights[i]
                 is_correct, try_edit = self.annotate(
-                    r_chunk, hyp_chunks
+                    r_chunk, hyp_chunks, hyp_index
                 )
                 this_score[r_chunk.type] = this_score.get(
                     r_chunk.type,
@@ -204,6 +274,7 @@ class GoToScorer(ERRANT):
         self,
         r_chunk: Chunk,
         hyp_chunks: list[Chunk],
+        hyp_index: ChunkIndex = None
     ) -> tuple[bool]:
         '''Annotate whether the reference chunk is correct
             and whether the system attempted to edit it.
@@ -213,30 +284,28 @@ class GoToScorer(ERRANT):
                 The chunk to be evaluated.
             hyp_chunks (list[Chunk]):
                 The chunk sequence for one GEC systems.
+            hyp_index (ChunkIndex):
+                The index of hyp_chunks. Pass it to annotate many reference chunks.
+                If None, it is built from hyp_chunks.
                 
         Returns:
             tuple[bool]: This contains two elements.
                 The first one represents correctness.
                 The second one represents whether the system tried to edit or not.
         '''
-        is_correct = False
-        try_edit = False
-        for h_chunk in hyp_chunks:
-            if (r_chunk.o_start, r_chunk.o_end) \
-                == (h_chunk.o_start, h_chunk.o_end):
-                if r_chunk.c_str == h_chunk.c_str:
-                    is_correct = True
-                else:
-                    is_correct = False
-                # To distuinguish TP or TN.
-                try_edit = h_chunk.is_edited
-                break
-            elif r_chunk.o_start == r_chunk.o_end:
-                is_correct = True
-            elif (r_chunk.o_start <= h_chunk.o_start < r_chunk.o_end) \
-                or (h_chunk.o_start <= r_chunk.o_start < h_chunk.o_end):
-                try_edit |= h_chunk.is_edited
-        return is_correct, try_edit
+        if hyp_index is None:
+            hyp_index = self.ChunkIndex(hyp_chunks)
+        h_chunk = hyp_index.spans.get((r_chunk.o_start, r_chunk.o_end))
+        if h_chunk is not None:
+            # To distuinguish TP or TN.
+            return r_chunk.c_str == h_chunk.c_str, h_chunk.is_edited
+        if r_chunk.o_start == r_chunk.o_end:
+            # No insertion at the position.
+            return hyp_index.num_chunks > 0, False
+        # The system tried to edit if an edited chunk overlaps with the reference chunk.
+        try_edit = hyp_index.any_edited_start(r_chunk.o_start, r_chunk.o_end) \
+            or r_chunk.o_start in hyp_index.covered
+        return False, try_edit
     
     def visualize_chunk(
         self,
@@ -260,8 +329,8 @@ class GoToScorer(ERRANT):
             src = 'This sentences contain gramamtical error .'
             trg = 'This sentence contains a grammatical error .'
             edits = scorer.edit_extraction(src, trg)
-            chunks = scorer.generate_chunks(edits, src.split(' '))
-            scorer.visualize_chunk(chunks, src.split(' '))
+            chunks = scorer.generate_chunks(edits, scorer.tokenize(src))
+            scorer.visualize_chunk(chunks, scorer.tokenize(src))
 
             # Output:
             # |   |This|   |sentences|   |contain |   |gramamtical|   |error|   | . |   |
@@ -96,3 +96,31 @@ class TestGoToScorer:
             chunks = scorer.generate_chunks(edits, tokens=SRCS[sent_id].split(' '))
             for c, cc in zip(chunks, GOLD_CHUNK[sent_id]):
                 assert c == cc
+
+    def test_irregular_spaces(self):
+        scorer = GoToScorer(GoToScorer.Config(no_weight=True))
+        # Token offsets of the edits and the chunks are consistent.
+        srcs = [s.replace(' ', '  ') + ' ' for s in SRCS]
+        assert scorer.score_sentence(srcs, HYPS, REFS) \
+            == scorer.score_sentence(SRCS, HYPS, REFS)
+
+    def test_annotate(self):
+        scorer = GoToScorer(GoToScorer.Config(no_weight=True))
+        Chunk = GoToScorer.Chunk
+        hyp_chunks = [
+            Chunk(o_start=0, o_end=0, c_str=''),
+            Chunk(o_start=0, o_end=2, c_str='a b', is_edited=True),
+            Chunk(o_start=2, o_end=2, c_str='c', is_edited=True),
+            Chunk(o_start=2, o_end=3, c_str='d'),
+        ]
+        index = GoToScorer.ChunkIndex(hyp_chunks)
+        cases = [
+            (Chunk(o_start=0, o_end=2, c_str='a b'), (True, True)),  # The same span
+            (Chunk(o_start=2, o_end=2, c_str='e'), (False, True)),
+            (Chunk(o_start=1, o_end=2, c_str='b'), (False, True)),  # Overlap
+            (Chunk(o_start=2, o_end=3, c_str='x'), (False, False)),
+            (Chunk(o_start=3, o_end=3, c_str=''), (True, False)),  # No insertion
+        ]
+        for r_chunk, gold in cases:
+            assert scorer.annotate(r_chunk, hyp_chunks, index) == gold
+            assert scorer.annotate(r_chunk, hyp_chunks) == gold
@@ -1,46 +1,269 @@
 from .base import MetricBaseForReferenceBased
-from dataclasses import dataclass
+from .cache import CacheBudget, LRUCache
+from dataclasses import dataclass, replace
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 import math
-import hashlib
+import sys
+import numpy as np
 
 class GREEN(MetricBaseForReferenceBased):
+    # Sentences per process when config.num_workers > 1.
+    min_shard_size = 1000
+
     @dataclass
     class Config(MetricBaseForReferenceBased.Config):
         '''GREEN configuration
             - n (int): Maxmimun n for n-gram.
             - beta (int): The beta for F-beta score.
             - unit (str): Word-level or character-level. Can be 'word' or 'char'.
+            - cache_max_entries (int): The maximum number of entries, e.g. sentences,
+                shared by all of the caches. If None, the caches are unbounded.
+            - cache_max_bytes (int): The maximum estimated size of all of the caches in bytes.
+                If None, the caches are unbounded.
+                The interned n-gram vocabulary is not counted.
+            - num_workers (int): The number of processes to compute n-gram statistics.
         '''
         n: int = 4
         beta: float = 2.0
         unit: str = 'word'
+        cache_max_entries: int = None
+        cache_max_bytes: int = None
+        num_workers: int = 1
 
     def __init__(self, config: Config = None):
         super().__init__(config)
-        self.cache_ngram = dict()
+        # All of the caches share a single budget.
+        self.cache_budget = CacheBudget(
+            max_entries=self.config.cache_max_entries,
+            max_bytes=self.config.cache_max_bytes
+        )
+        self.cache_ngram_ids = LRUCache(
+            budget=self.cache_budget,
+            sizeof=lambda arrays: sum(a.nbytes for a in arrays)
+        )
+        # Interned n-grams: n-gram tuple -> integer id.
+        # This is outside the budget, see maybe_reset_vocab().
+        self.ngram_vocab = dict()
+        self.cache_ngram = LRUCache(
+            budget=self.cache_budget,
+            sizeof=lambda ngrams: sys.getsizeof(ngrams) \
+                + sum(sys.getsizeof(g) for g in ngrams)
+        )
     
-    def cached_get_all_ngrams(
+    def get_all_ngrams(
         self,
         sentence: str,
-    ) -> dict[str, int]:
+    ) -> Counter:
         '''Get frequency of n-gram for all n (1 <= n <= config.n)
         '''
         if sentence == '':
-            return dict()
+            return Counter()
         if self.config.unit == 'word':
             words = sentence.split(' ')
         elif self.config.unit == 'char':
             words = sentence
-        key = hashlib.sha256(sentence.encode()).hexdigest()
-        if self.cache_ngram.get(key) is None:
-            ngrams = []
-            for n in range(1, self.config.n + 1):
-                for i in range(len(words) - n + 1):
-                    ngrams.append(tuple(words[i:i+n]))
-            self.cache_ngram[key] = Counter(ngrams)
-        return self.cache_ngram[key]
+        ngrams = []
+        for n in range(1, self.config.n + 1):
+            for i in range(len(words) - n + 1):
+                ngrams.append(tuple(words[i:i+n]))
+        return Counter(ngrams)
+
+    def cached_get_all_ngrams(
+        self,
+        sentence: str,
+    ) -> dict[str, int]:
+        '''Get frequency of n-gram for all n (1 <= n <= config.n)
+            with the same budget as the n-gram id cache.
+        The scoring uses cached_get_ngram_ids() instead.
+        '''
+        ngrams = self.cache_ngram.get(sentence)
+        if ngrams is None:
+            ngrams = self.get_all_ngrams(sentence)
+            self.cache_ngram[sentence] = ngrams
+        return ngrams
+
+    def cached_get_ngram_ids(
+        self,
+        sentence: str
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''Get interned n-grams for all n (1 <= n <= config.n).
+        Each n-gram is converted into an integer id that is shared among all sentences.
+
+        Args:
+            sentence (str): The sentence.
+
+        Returns:
+            np.ndarray: The n-gram ids. The shape is (num_ngrams, ).
+            np.ndarray: The order of each n-gram, i.e., n. The shape is (num_ngrams, ).
+            np.ndarray: The frequency of each n-gram. The shape is (num_ngrams, ).
+        '''
+        cached = self.cache_ngram_ids.get(sentence)
+        if cached is None:
+            ngrams = self.get_all_ngrams(sentence)
+            vocab = self.ngram_vocab
+            num_ngrams = len(ngrams)
+            ids = np.fromiter(
+                (vocab.setdefault(g, len(vocab)) for g in ngrams),
+                dtype=np.int64,
+                count=num_ngrams
+            )
+            orders = np.fromiter(
+                (len(g) for g in ngrams), dtype=np.int64, count=num_ngrams
+            )
+            counts = np.fromiter(
+                ngrams.values(), dtype=np.int64, count=num_ngrams
+            )
+            cached = (ids, orders, counts)
+            self.cache_ngram_ids[sentence] = cached
+        return cached
+
+    def maybe_reset_vocab(self) -> None:
+        '''The interned ids are shared among the cached sentences,
+            thus the vocabulary does not shrink when a sentence is evicted.
+        When the cache is bounded and the vocabulary becomes
+            much larger than the n-grams alive in the cache,
+            both of them are cleared to bound the memory.
+        '''
+        if not self.cache_ngram_ids.is_bounded:
+            return
+        num_alive = sum(len(ids) for ids, _, _ in self.cache_ngram_ids.values())
+        if len(self.ngram_vocab) > 2 * num_alive + 1024:
+            self.ngram_vocab = dict()
+            self.cache_ngram_ids.clear()
+
+    def classify_ngrams(
+        self,
+        ms: np.ndarray,
+        mh: np.ndarray,
+        mr: np.ndarray
+    ) -> np.ndarray:
+        '''Classify n-gram counts into TP, FP and FN.
+            TP = TD + TI + TK, FP = OD + OI, FN = UD + UI.
+
+        Args:
+            ms (np.ndarray): The frequency in the source. The shape is (num_ngrams, ).
+            mh (np.ndarray): The frequency in the hypothesis. The shape is (num_ngrams, ).
+            mr (np.ndarray): The frequency in the reference. The shape is (num_ngrams, ).
+
+        Returns:
+            np.ndarray: The counts. The shape is (num_ngrams, 3) for TP, FP, and FN.
+        '''
+        max_rh = np.maximum(mr, mh)
+        min_rh = np.minimum(mr, mh)
+        td = np.maximum(ms - max_rh, 0)
+        ti = np.maximum(min_rh - ms, 0)
+        tk = np.minimum(ms, min_rh)
+        od = np.maximum(np.minimum(ms, mr) - mh, 0)
+        oi = np.maximum(mh - np.maximum(ms, mr), 0)
+        ud = np.maximum(np.minimum(ms, mh) - mr, 0)
+        ui = np.maximum(mr - np.maximum(ms, mh), 0)
+        return np.stack([td + ti + tk, od + oi, ud + ui], axis=-1)
+
+    def ngram_stats(
+        self,
+        sources: list[str],
+        hypotheses: list[str],
+        references: list[list[str]],
+        chunk_size: int = 4096
+    ) -> np.ndarray:
+        '''Compute n-gram statistics for all sentences and references at once.
+            The n-grams of the source, hypothesis and reference are aligned
+                by their interned ids and classified by classify_ngrams().
+
+        Args:
+            sources (list[str]): Source sentence.
+            hypothesis (list[str]): Corrected sentences.
+            references (list[list[str]]): Reference sentences.
+                The shape is (the number of references, the number of sentences).
+            chunk_size (int): The number of sentences processed at once.
+
+        Returns:
+            np.ndarray: The statistics.
+                The shape is (num_sents, num_refs, max_ngram, num_stats).
+        '''
+        num_sents = len(sources)
+        num_refs = len(references)
+        n = self.config.n
+        num_shards = min(self.config.num_workers, math.ceil(num_sents / self.min_shard_size))
+        if num_shards > 1:
+            return self.parallel_ngram_stats(
+                sources, hypotheses, references, num_shards
+            )
+        self.maybe_reset_vocab()
+        results = []
+        for start in range(0, num_sents, chunk_size):
+            end = min(start + chunk_size, num_sents)
+            num_pairs = (end - start) * num_refs
+            ids, orders, counts, pair_ids, roles = [], [], [], [], []
+            for sent_id in range(start, end):
+                ngram_s = self.cached_get_ngram_ids(sources[sent_id])
+                ngram_h = self.cached_get_ngram_ids(hypotheses[sent_id])
+                for ref_id in range(num_refs):
+                    ngram_r = self.cached_get_ngram_ids(references[ref_id][sent_id])
+                    pair_id = (sent_id - start) * num_refs + ref_id
+                    for role, (i, o, c) in enumerate((ngram_s, ngram_h, ngram_r)):
+                        ids.append(i)
+                        orders.append(o)
+                        counts.append(c)
+                        pair_ids.append(np.full(len(i), pair_id, dtype=np.int64))
+                        roles.append(np.full(len(i), role, dtype=np.int64))
+            ids = np.concatenate(ids)
+            # Distinguish the same n-gram in different (sentence, reference) pairs.
+            keys = np.concatenate(pair_ids) * len(self.ngram_vocab) + ids
+            uniq_keys, inverse = np.unique(keys, return_inverse=True)
+            # m[0], m[1], m[2] are the frequency in the source, hypothesis and reference.
+            m = np.zeros((3, len(uniq_keys)), dtype=np.int64)
+            m[np.concatenate(roles), inverse] = np.concatenate(counts)
+            uniq_orders = np.zeros(len(uniq_keys), dtype=np.int64)
+            uniq_orders[inverse] = np.concatenate(orders)
+            groups = (uniq_keys // len(self.ngram_vocab)) * n + uniq_orders - 1
+            stats = self.classify_ngrams(m[0], m[1], m[2])
+            chunk_results = np.stack([
+                np.bincount(groups, weights=stats[:, k], minlength=num_pairs * n)
+                for k in range(stats.shape[1])
+            ], axis=-1)
+            results.append(chunk_results.reshape(end - start, num_refs, n, -1))
+        if results == []:
+            num_stats = self.classify_ngrams(*np.zeros((3, 0), dtype=np.int64)).shape[1]
+            return np.zeros((0, num_refs, n, num_stats))
+        return np.concatenate(results)
     
+    def parallel_ngram_stats(
+        self,
+        sources: list[str],
+        hypotheses: list[str],
+        references: list[list[str]],
+        num_shards: int
+    ) -> np.ndarray:
+        '''Compute ngram_stats() by sharding the sentences across processes.
+            The statistics are counts per sentence,
+                thus the concatenated results are the same as the serial ones.
+
+        Args:
+            sources (list[str]): Source sentence.
+            hypothesis (list[str]): Corrected sentences.
+            references (list[list[str]]): Reference sentences.
+                The shape is (the number of references, the number of sentences).
+            num_shards (int): The number of shards.
+
+        Returns:
+            np.ndarray: The statistics.
+                The shape is (num_sents, num_refs, max_ngram, num_stats).
+        '''
+        bounds = np.linspace(0, len(sources), num_shards + 1).astype(int).tolist()
+        shards = list(zip(bounds[:-1], bounds[1:]))
+        with ProcessPoolExecutor(max_workers=num_shards) as executor:
+            results = executor.map(
+                ngram_stats_worker,
+                [self.__class__] * num_shards,
+                [self.config] * num_shards,
+                [sources[s:e] for s, e in shards],
+                [hypotheses[s:e] for s, e in shards],
+                [[ref[s:e] for ref in references] for s, e in shards]
+            )
+            return np.concatenate(list(results))
+
     def aggregate_score(self, scores: list["Score"]) -> float:
         '''Aggregate n-gram scores to an overall score by the geometric mean.
         
@@ -51,17 +274,30 @@ class GREEN(MetricBaseForReferenceBased):
         Returns:
             float: The aggregated score.
         '''
-        ps = [s.precision for s in scores]
-        rs = [s.recall for s in scores]
+        return self.aggregate_precision_recall(
+            [s.precision for s in scores],
+            [s.recall for s in scores]
+        )
+
+    def aggregate_precision_recall(self, ps: list[float], rs: list[float]) -> float:
+        '''Aggregate n-gram precisions and recalls to an overall score by the geometric mean.
+
+        Args:
+            ps (list[float]): The precision of each n-gram. The shape is (n, )
+            rs (list[float]): The recall of each n-gram. The shape is (n, )
+
+        Returns:
+            float: The aggregated score.
+        '''
         if 0 in ps:
             prec = 0
         else:
             # $(\PI x)^(1/N) = exp((1/N) \sum log(x))
-            prec = math.exp(sum(math.log(p) for p in ps) / len(scores))
+            prec = math.exp(sum(math.log(p) for p in ps) / len(ps))
         if 0 in rs:
             rec = 0
         else:
-            rec = math.exp(sum(math.log(r) for r in rs) / len(scores))
+            rec = math.exp(sum(math.log(r) for r in rs) / len(rs))
         beta = self.config.beta
         f = float((1+(beta**2))*prec*rec) / (((beta**2)*prec)+rec) if prec+rec else 0.0
         return f
@@ -87,23 +323,101 @@ class GREEN(MetricBaseForReferenceBased):
         Returns:
             float: The corpus-level score.
         '''
-        verbose_scores = self.score_base(
-            sources,
-            hypotheses,
-            references
+        return self.finalize(self.score_stats(
+            sources, hypotheses, references
+        ))
+
+    def sentence_stats(
+        self,
+        sources: list[str],
+        hypotheses: list[str],
+        references: list[list[str]],
+        offset: int = 0
+    ) -> MetricBaseForReferenceBased.Stats:
+        '''Calculate the sufficient statistics for each sentence.
+            Stats.counts['ngram'] is the n-gram counts of TP, FP, FN
+                with the best reference of each sentence.
+                The shape is (num_sents, max_ngram, 3).
+            score_stats() sums them over sentences.
+
+        Args:
+            sources (list[str]): Source sentence.
+                The shape is (num_sentences, )
+            hypotheses (list[str]): Corrected sentences.
+                The shape is (num_sentences, )
+            references (list[list[str]]): Reference sentences.
+                The shape is (num_references, num_sentences).
+            offset (int): The index of the first sentence in the whole corpus.
+
+        Returns:
+            Stats: The sentence-level statistics.
+        '''
+        counts, _ = self.best_reference(sources, hypotheses, references)
+        return self.Stats(
+            offset=offset,
+            num_sents=len(sources),
+            counts={'ngram': counts}
+        )
+
+    def best_reference(
+        self,
+        sources: list[str],
+        hypotheses: list[str],
+        references: list[list[str]]
+    ) -> tuple[np.ndarray, list[float]]:
+        '''Choose the best reference of each sentence by the aggregated score.
+            The precisions and the recalls are computed in batch for all sentences and references.
+
+        Args:
+            sources (list[str]): Source sentence.
+                The shape is (num_sentences, )
+            hypotheses (list[str]): Corrected sentences.
+                The shape is (num_sentences, )
+            references (list[list[str]]): Reference sentences.
+                The shape is (num_references, num_sentences).
+
+        Returns:
+            np.ndarray: The n-gram counts of TP, FP, FN with the best reference.
+                The shape is (num_sents, max_ngram, 3).
+            list[float]: The aggregated score with the best reference.
+                The shape is (num_sents, ).
+        '''
+        stats = self.ngram_stats(
+            [s.strip() for s in sources],
+            [h.strip() for h in hypotheses],
+            [[r.strip() for r in ref] for ref in references]
+        ).astype(np.float64).reshape(
+            len(sources), len(references), self.config.n, 3
+        )  # (num_sents, num_refs, max_ngram, 3)
+        scores = self.Scores(stats, beta=self.config.beta)
+        best_ids = []
+        best_scores = []
+        for ps_for_refs, rs_for_refs in zip(
+            scores.precision.tolist(), scores.recall.tolist()
+        ):  # sentence loop
+            ref_scores = [
+                self.aggregate_precision_recall(ps, rs) \
+                    for ps, rs in zip(ps_for_refs, rs_for_refs)
+            ]
+            # The first one is chosen among the references with the same score.
+            best_id = max(range(len(ref_scores)), key=ref_scores.__getitem__)
+            best_ids.append(best_id)
+            best_scores.append(ref_scores[best_id])
+        return stats[np.arange(len(sources)), best_ids], best_scores
+
+    def finalize(self, stats: MetricBaseForReferenceBased.Stats) -> float:
+        '''Compute the corpus-level score from the statistics.
+
+        Args:
+            stats (Stats): The statistics of the whole corpus.
+
+        Returns:
+            float: The corpus-level score.
+        '''
+        scores = self.Scores(stats.counts['ngram'], beta=self.config.beta)
+        return self.aggregate_precision_recall(
+            scores.precision.tolist(), scores.recall.tolist()
         )
-        score = [self.Score(beta=self.config.beta) for _ in range(self.config.n)]
-        for v_scores in verbose_scores:  # sentence loop
-            best_score = None
-            for v_score_for_ref in v_scores:  # reference loop
-                # Choose the best reference
-                if best_score is None \
-                    or self.aggregate_score(best_score) < self.aggregate_score(v_score_for_ref):
-                    best_score = v_score_for_ref
-            # Accumulate scores for each n-gram.
-            for n in range(self.config.n):
-                score[n] += best_score[n]
-        return self.aggregate_score(score)
 
     def score_sentence(
         self,
@@ -124,21 +438,7 @@ class GREEN(MetricBaseForReferenceBased):
         Returns:
             list[float]: The sentence-level scores.
         '''
-        verbose_scores = self.score_base(
-            sources,
-            hypotheses,
-            references
-        )
-        scores = []
-        for v_scores in verbose_scores:  # sentence loop
-            best_score = None
-            for v_score_for_ref in v_scores:  # reference loop
-                # Choose the best reference
-                if best_score is None \
-                    or self.aggregate_score(best_score) < self.aggregate_score(v_score_for_ref):
-                    best_score = v_score_for_ref
-            # Accumulate scores for each n-gram.
-            scores.append(self.aggregate_score(best_score))
+        _, scores = self.best_reference(sources, hypotheses, references)
         return scores
         
     def score_base(
@@ -161,55 +461,29 @@ class GREEN(MetricBaseForReferenceBased):
             list[list[list["Score"]]]: The verbose scores.
                 The shape is (num_iterations, num_sents, max_ngram).
         '''
-        num_sents = len(sources)
+        stats = self.ngram_stats(
+            [s.strip() for s in sources],
+            [h.strip() for h in hypotheses],
+            [[r.strip() for r in ref] for ref in references]
+        )  # (num_sents, num_refs, max_ngram, 3)
         scores = []  # The shape will be (num_sents, num_refs, max_ngram)
-        for sent_id in range(num_sents):
-            ngram_s = self.cached_get_all_ngrams(sources[sent_id].strip())
-            ngram_h = self.cached_get_all_ngrams(hypotheses[sent_id].strip())
-            ngram_rs = [
-                self.cached_get_all_ngrams(ref[sent_id].strip()) for ref in references
-            ]
-            sent_score = []
-            for ngram_r in ngram_rs:
-                all_ngram = set(list(ngram_s.keys()) + list(ngram_h.keys()) + list(ngram_r.keys()))
-                this_score = [self.Score(beta=self.config.beta) for _ in range(self.config.n)]
-                for ngram in all_ngram:
-                    idx = len(ngram) - 1
-                    ms = ngram_s.get(ngram, 0)
-                    mh = ngram_h.get(ngram, 0)
-                    mr = ngram_r.get(ngram, 0)
-                    # TD
-                    this_score[idx].tp += max(
-                        ms - max(mr, mh),
-                        0
-                    )
-                    # TI
-                    this_score[idx].tp += max(
-                        min(mr, mh) - ms,
-                        0
-                    )
-                    # TK
-                    this_score[idx].tp += min(ms, mh, mr)
-                    # OD
-                    this_score[idx].fp += max(
-                        min(ms, mr) - mh,
-                        0
-                    )
-                    # OI
-                    this_score[idx].fp += max(
-                        mh - max(ms, mr),
-                        0
-                    )
-                    # UD
-                    this_score[idx].fn += max(
-                        min(ms, mh) - mr,
-                        0
-                    )
-                    # UI
-                    this_score[idx].fn += max(
-                        mr - max(ms, mh),
-                        0
-                    )
-                sent_score.append(this_score)
-            scores.append(sent_score)
-        return scores
\ No newline at end of file
+        for sent_stats in stats.tolist():
+            scores.append([
+                [
+                    self.Score(tp=tp, fp=fp, fn=fn, beta=self.config.beta) \
+                        for tp, fp, fn in ref_stats
+                ] for ref_stats in sent_stats
+            ])
+        return scores
+
+
+def ngram_stats_worker(
+    metric_cls: type,
+    config: GREEN.Config,
+    sources: list[str],
+    hypotheses: list[str],
+    references: list[list[str]]
+) -> np.ndarray:
+    '''Compute GREEN.ngram_stats() for a shard in a worker process.'''
+    metric = metric_cls(replace(config, num_workers=1))
+    return metric.ngram_stats(sources, hypotheses, references)
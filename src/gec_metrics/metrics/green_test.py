@@ -1,6 +1,10 @@
 from .green import GREEN
+from collections import Counter
+import itertools
+import numpy as np
 import pytest
 import math
+import random
 
 SRCS = [
     'This sentences contain gramamtical error .',
@@ -33,6 +37,42 @@ cases = [
     (2.0, 71.852523831581, [74.467815149281, 60.992075408949, 100.0, 68.051848160668]),
 ]
 
+def counter_score_base(
+    scorer: GREEN,
+    sources: list[str],
+    hypotheses: list[str],
+    references: list[list[str]]
+) -> list[list[list[tuple[int, int, int]]]]:
+    '''(TP, FP, FN) of each n-gram order by comparing Counters n-gram by n-gram.
+        The shape is (num_sents, num_refs, max_ngram).
+    '''
+    scores = []
+    for sent_id in range(len(sources)):
+        ngram_s = scorer.get_all_ngrams(sources[sent_id].strip())
+        ngram_h = scorer.get_all_ngrams(hypotheses[sent_id].strip())
+        sent_scores = []
+        for ref in references:
+            ngram_r = scorer.get_all_ngrams(ref[sent_id].strip())
+            this_score = [[0, 0, 0] for _ in range(scorer.config.n)]
+            for ngram in set(ngram_s) | set(ngram_h) | set(ngram_r):
+                ms, mh, mr = ngram_s[ngram], ngram_h[ngram], ngram_r[ngram]
+                s = this_score[len(ngram) - 1]
+                s[0] += max(ms - max(mr, mh), 0) + max(min(mr, mh) - ms, 0) + min(ms, mh, mr)
+                s[1] += max(min(ms, mr) - mh, 0) + max(mh - max(ms, mr), 0)
+                s[2] += max(min(ms, mh) - mr, 0) + max(mr - max(ms, mh), 0)
+            sent_scores.append([tuple(s) for s in this_score])
+        scores.append(sent_scores)
+    return scores
+
+def random_sentences(rng: random.Random, num_sents: int) -> list[str]:
+    '''Sentences of a small vocabulary, thus n-grams are often repeated.
+        Some of them are empty.'''
+    vocab = ['a', 'b', 'c', 'd', '.']
+    return [
+        ' '.join(rng.choice(vocab) for _ in range(rng.choice([0, 1, 3, 8, 15]))) \
+            for _ in range(num_sents)
+    ]
+
 class TestGREEN:
     @pytest.mark.parametrize("beta,gold_corpus_score,gold_sent_score", cases)
     def test_metric(self, beta, gold_corpus_score, gold_sent_score):
@@ -44,5 +84,99 @@ class TestGREEN:
         sent_score = scorer.score_sentence(
             SRCS, HYPS, REFS
         )
-        assert [math.isclose(100*s1, s2, abs_tol=1e-9) \
-                for s1, s2 in zip(sent_score, gold_sent_score)]
+        assert all(math.isclose(100*s1, s2, abs_tol=1e-9) \
+                for s1, s2 in zip(sent_score, gold_sent_score))
+
+    def test_classify_ngrams(self):
+        scorer = GREEN()
+        ms, mh, mr = np.array(list(itertools.product(range(4), repeat=3))).T
+        stats = scorer.classify_ngrams(ms, mh, mr).tolist()
+        for s, h, r, (tp, fp, fn) in zip(ms, mh, mr, stats):
+            assert tp == max(s - max(r, h), 0) + max(min(r, h) - s, 0) + min(s, h, r)
+            assert fp == max(min(s, r) - h, 0) + max(h - max(s, r), 0)
+            assert fn == max(min(s, h) - r, 0) + max(r - max(s, h), 0)
+
+    @pytest.mark.parametrize("unit", ['word', 'char'])
+    def test_same_as_counter(self, unit):
+        rng = random.Random(0)
+        num_sents = 200
+        srcs = random_sentences(rng, num_sents)
+        hyps = random_sentences(rng, num_sents)
+        # Some of the hypotheses are not corrected.
+        hyps = [s if rng.random() < 0.2 else h for s, h in zip(srcs, hyps)]
+        refs = [random_sentences(rng, num_sents) for _ in range(3)]
+        scorer = GREEN(GREEN.Config(unit=unit))
+        gold = counter_score_base(scorer, srcs, hyps, refs)
+        scores = scorer.score_base(srcs, hyps, refs)
+        assert all(
+            [(s.tp, s.fp, s.fn) for s in ref_scores] == gold_ref_scores
+                for sent_scores, gold_sent_scores in zip(scores, gold)
+                for ref_scores, gold_ref_scores in zip(sent_scores, gold_sent_scores)
+        )
+        assert len(scores) == len(gold)
+
+    def test_bounded_cache(self):
+        scorer = GREEN(GREEN.Config(cache_max_entries=3))
+        unbounded_scorer = GREEN()
+        for _ in range(2):
+            assert scorer.score_sentence(SRCS, HYPS, REFS) \
+                == unbounded_scorer.score_sentence(SRCS, HYPS, REFS)
+        info = scorer.cache_info()['cache_ngram_ids']
+        assert info.num_entries <= 3
+        assert info.evictions > 0
+        assert unbounded_scorer.cache_info()['cache_ngram_ids'].hits > 0
+
+    def test_cached_get_all_ngrams(self):
+        scorer = GREEN(GREEN.Config(n=2, cache_max_entries=1))
+        ngrams = scorer.cached_get_all_ngrams('a b a b')
+        assert ngrams == {('a',): 2, ('b',): 2, ('a', 'b'): 2, ('b', 'a'): 1}
+        assert scorer.cached_get_all_ngrams('a b a b') is ngrams
+        scorer.cached_get_all_ngrams('c')
+        info = scorer.cache_info()['cache_ngram']
+        assert (info.hits, info.num_entries, info.evictions) == (1, 1, 1)
+
+    def test_shared_cache_budget(self):
+        max_bytes = 20000
+        scorer = GREEN(GREEN.Config(cache_max_bytes=max_bytes))
+        scorer.score_sentence(SRCS, HYPS, REFS)
+        for sent in SRCS + HYPS:
+            scorer.cached_get_all_ngrams(sent)
+        info = scorer.cache_info()
+        assert info['cache_ngram_ids'].num_bytes + info['cache_ngram'].num_bytes <= max_bytes
+        assert info['cache_ngram_ids'].evictions + info['cache_ngram'].evictions > 0
+
+    def test_num_workers(self):
+        scorer = GREEN(GREEN.Config(num_workers=2))
+        # Shard even this small input.
+        scorer.min_shard_size = 2
+        serial_scorer = GREEN()
+        assert scorer.score_corpus(SRCS, HYPS, REFS) \
+            == serial_scorer.score_corpus(SRCS, HYPS, REFS)
+        assert scorer.score_sentence(SRCS, HYPS, REFS) \
+            == serial_scorer.score_sentence(SRCS, HYPS, REFS)
+
+    def test_score_stats(self):
+        scorer = GREEN()
+        shards = [(2, 4), (0, 2)]
+        stats = [scorer.score_stats(
+            SRCS[i:j], HYPS[i:j], [r[i:j] for r in REFS], offset=i
+        ) for i, j in shards]
+        # Round trip via JSON serializable dict.
+        stats = [scorer.Stats.from_dict(s.to_dict()) for s in stats]
+        assert scorer.finalize(scorer.merge(stats)) \
+            == scorer.score_corpus(SRCS, HYPS, REFS)
+        with pytest.raises(ValueError):
+            scorer.merge(stats[1:] + stats[1:])
+
+    def test_incremental_scorer(self):
+        scorer = GREEN()
+        hyps = list(HYPS)
+        inc = scorer.incremental_scorer(SRCS, hyps, REFS)
+        assert inc.score() == scorer.score_corpus(SRCS, hyps, REFS)
+        hyps[1] = REFS[0][1]
+        inc.update(1, hyps[1])
+        assert inc.score() == scorer.score_corpus(SRCS, hyps, REFS)
+        inc.remove(0)
+        assert inc.score() == scorer.score_corpus(
+            SRCS[1:], hyps[1:], [r[1:] for r in REFS]
+        )
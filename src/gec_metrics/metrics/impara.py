@@ -4,10 +4,10 @@ from transformers import (
     AutoTokenizer,
     PreTrainedTokenizer
 )
-from .base import MetricBase, MetricBaseForReferenceFree
+from .base import MetricBaseForReferenceFree
+from .batching import run_length_batches
 import torch
 import torch.nn as nn
-import math
 from dataclasses import dataclass
 
 class SimilarityEstimator(nn.Module):
@@ -84,7 +84,7 @@ class SimilarityEstimator(nn.Module):
 
 class IMPARA(MetricBaseForReferenceFree):
     @dataclass
-    class Config(MetricBase.Config):
+    class Config(MetricBaseForReferenceFree.Config):
         '''IMPARA configuration.
             - model_qe (str): Quality estimation model.
             - model_se (str): Similarity estimation model.
@@ -92,6 +92,8 @@ class IMPARA(MetricBaseForReferenceFree):
             - threshold (float): Threshold for the similarity score.
             - no_cuda (bool): If True, work on CPU.
             - batch_size (int): Batch size for the inference.
+            - max_tokens (int): The maximum number of tokens in a batch including padding.
+                If None, only batch_size is used.
         '''
         model_qe: str = 'gotutiyan/IMPARA-QE'
         model_se: str = 'bert-base-cased'
@@ -99,6 +101,7 @@ class IMPARA(MetricBaseForReferenceFree):
         threshold: float = 0.9
         no_cuda: bool = False
         batch_size: int = 32
+        max_tokens: int = None
 
     def __init__(self, config: Config = None):
         super().__init__(config)
@@ -126,42 +129,52 @@ class IMPARA(MetricBaseForReferenceFree):
         Returns:
             list[float]: The sentence-level scores.
         '''
-        scores = []
-        batch_size = self.config.batch_size
-        for i in range(math.ceil(len(sources) / batch_size)):
-            tokenizer_args = {
-                'max_length': self.config.max_length,
-                'padding': "max_length",
-                'truncation': True,
-                'return_tensors': 'pt'
-            }
-            hyp_encode_qe = self.tokenizer_qe(
-                hypotheses[i*batch_size:(i+1)*batch_size],
-                **tokenizer_args
+        if len(sources) == 0:
+            return []
+        tokenizer_args = {
+            'max_length': self.config.max_length,
+            'truncation': True
+        }
+        # Tokenize once, and pad each batch to its longest input.
+        hyp_encode_qe = self.tokenizer_qe(hypotheses, **tokenizer_args)
+        src_encode_se = self.tokenizer_se(sources, **tokenizer_args)
+        hyp_encode_se = self.tokenizer_se(hypotheses, **tokenizer_args)
+        lengths = [
+            max(map(len, ids)) for ids in zip(
+                hyp_encode_qe['input_ids'],
+                src_encode_se['input_ids'],
+                hyp_encode_se['input_ids']
             )
-            src_encode_se = self.tokenizer_se(
-                sources[i*batch_size:(i+1)*batch_size],
-                **tokenizer_args
-            )
-            hyp_encode_se = self.tokenizer_se(
-                hypotheses[i*batch_size:(i+1)*batch_size],
-                **tokenizer_args
-            )
-            hyp_encode_qe = {k: v.to(self.model_qe.device) for k, v in hyp_encode_qe.items()}
-            src_encode_se = {k: v.to(self.model_se.device) for k, v in src_encode_se.items()}
-            hyp_encode_se = {k: v.to(self.model_se.device) for k, v in hyp_encode_se.items()}
+        ]
+
+        def batch_scores(ids: list[int]) -> list[float]:
+            def pad(encode, tokenizer, device):
+                batch = tokenizer.pad(
+                    {k: [v[i] for i in ids] for k, v in encode.items()},
+                    return_tensors='pt'
+                )
+                return {k: v.to(device) for k, v in batch.items()}
+            batch_hyp_qe = pad(hyp_encode_qe, self.tokenizer_qe, self.model_qe.device)
+            batch_src_se = pad(src_encode_se, self.tokenizer_se, self.model_se.device)
+            batch_hyp_se = pad(hyp_encode_se, self.tokenizer_se, self.model_se.device)
             with torch.no_grad():
                 qe_scores = self.model_qe(
-                    hyp_encode_qe['input_ids'],
-                    hyp_encode_qe['attention_mask']
+                    batch_hyp_qe['input_ids'],
+                    batch_hyp_qe['attention_mask']
                 ).logits.view(-1)
                 se_scores = self.model_se(
-                    src_encode_se['input_ids'],
-                    src_encode_se['attention_mask'],
-                    hyp_encode_se['input_ids'],
-                    hyp_encode_se['attention_mask'],
+                    batch_src_se['input_ids'],
+                    batch_src_se['attention_mask'],
+                    batch_hyp_se['input_ids'],
+                    batch_hyp_se['attention_mask'],
                 ).view(-1)
             qe_scores = torch.sigmoid(qe_scores)
             qe_scores[se_scores < self.config.threshold] = 0
-            scores += qe_scores.tolist()
-        return scores
\ No newline at end of file
+            return qe_scores.tolist()
+
+        return run_length_batches(
+            batch_scores,
+            lengths,
+            batch_size=self.config.batch_size,
+            max_tokens=self.config.max_tokens
+        )
\ No newline at end of file
@@ -3,6 +3,8 @@ import errant
 from .bertscore import BertScore
 from dataclasses import dataclass
 from .base import MetricBaseForSourceFree
+from .cache import LRUCache, PersistentCache
+import hashlib
 
 class PTERRANT(ERRANT):
     @dataclass
@@ -14,11 +16,20 @@ class PTERRANT(ERRANT):
         - weight_model_config (MetricBaseForSourceFree.Config):
             The config instance of the weight model.
             If not specified, it uses the default one.
+        - weight_cache (str): The path to the file to persist the scores of the weight model across runs.
+            If None, they are cached only in memory.
+        - weight_cache_max_entries (int): The maximum number of the weight model scores cached in memory.
+            If None, the cache is unbounded.
+        - weight_cache_max_bytes (int): The maximum estimated size of the in-memory weight cache in bytes.
+            If None, the cache is unbounded.
 
         Also, you can use the same configurations as ERRANT.
         '''
         weight_model_name: str = 'bertscore'
         weight_model_config: MetricBaseForSourceFree.Config = None
+        weight_cache: str = None
+        weight_cache_max_entries: int = None
+        weight_cache_max_bytes: int = None
 
     def __init__(self, config: Config = None):
         super().__init__(config)
@@ -33,42 +44,155 @@ class PTERRANT(ERRANT):
             # Use default config
             weight_model_config = weight_model_cls.Config()
         self.weight_model = weight_model_cls(weight_model_config)
+        # The weight model scores of (sentence, reference),
+        #   shared among the edits of all systems.
+        self.cache_weight = LRUCache(
+            max_entries=self.config.weight_cache_max_entries,
+            max_bytes=self.config.weight_cache_max_bytes
+        )
+        self.cache_weight_disk = None
+        if self.config.weight_cache is not None:
+            self.cache_weight_disk = PersistentCache(
+                self.config.weight_cache, version=self.weight_cache_version()
+            )
+
+    def weight_cache_version(self) -> str:
+        '''The version of the persistent weight cache.
+            The cached scores are valid only with the same weight model and its configuration.'''
+        config_str = repr(self.weight_model.config)
+        return f'{self.config.weight_model_name}-' \
+            + hashlib.sha256(config_str.encode()).hexdigest()
+
+    def weight_model_scores(self, pairs: list[tuple[str, str]]) -> list[float]:
+        '''Efficient weight_model.score_sentence() by caching.
+            Uncached pairs are scored by a single call of the weight model.
+
+        Args:
+            pairs (list[tuple[str, str]]): The pairs of a sentence and a reference.
+
+        Returns:
+            list[float]: The score of each pair.
+        '''
+        scores = dict()  # pair -> score
+        uncached = dict()  # pair -> key of the persistent cache
+        for pair in pairs:
+            if pair in scores or pair in uncached:
+                continue
+            score = self.cache_weight.get(pair)
+            key = None
+            if score is None and self.cache_weight_disk is not None:
+                # Only the persistent cache needs a string key.
+                key = hashlib.sha256((pair[0] + '|||' + pair[1]).encode()).hexdigest()
+                score = self.cache_weight_disk.get(key)
+                if score is not None:
+                    self.cache_weight[pair] = score
+            if score is None:
+                uncached[pair] = key
+            else:
+                scores[pair] = score
+        if uncached:
+            sents, refs = zip(*uncached)
+            new_scores = self.weight_model.score_sentence(list(sents), [list(refs)])
+            for (pair, key), score in zip(uncached.items(), new_scores):
+                scores[pair] = score
+                self.cache_weight[pair] = score
+                if key is not None:
+                    self.cache_weight_disk[key] = score
+        return [scores[pair] for pair in pairs]
 
     def calc_edit_weights(
         self,
         src: str,
         ref: str,
-        edits: list[errant.edit.Edit]
-    ) -> list[float]:
+        edits: list[ERRANT.Edit]
+    ) -> dict[tuple, float]:
         '''Calculate a weight for each edit.
 
         Args:
             src (str): Source sentence.
             src (str): Reference sentence.
-            edits (list[errant.edit.Edit]): Edits.
+            edits (list[ERRANT.Edit]): Edits.
 
         Returns:
-            list[float]: The weight of each edit.
+            dict[tuple, float]: The weight of each edit with the key (o_start, o_end, c_str).
         '''
-        if edits == []:
-            return []
-        tuple_edits = [(e.o_start, e.o_end, e.c_str) for e in edits]
-        # Remove duplications
-        edits = [edits[i] for i, e in enumerate(tuple_edits) if e not in tuple_edits[:i]]
-        num_edits = len(edits)
-        sents = [self.apply_edits(src, [e]) for e in edits]
-        scores1 = self.weight_model.score_sentence([src], [[ref]]) * num_edits
-        scores2 = self.weight_model.score_sentence(sents, [[ref] * num_edits])
-        weights = [abs(s2 - s1) for s1, s2 in zip(scores1, scores2)]
-        return {
-            (e.o_start, e.o_end, e.c_str): w for e, w in zip(edits, weights)
-        }
+        return self.calc_corpus_edit_weights([src], [[ref]], [[edits]])[0][0]
+
+    def calc_corpus_edit_weights(
+        self,
+        sources: list[str],
+        references: list[list[str]],
+        edits_list: list[list[list[ERRANT.Edit]]]
+    ) -> list[list[dict[tuple, float]]]:
+        '''Calculate the weights of the edits for all sentences and references at once.
+            The pairs of the (edited) source and the reference of the whole corpus
+                are scored by a single call of the weight model, so that it can use large batches.
+            The scores are cached, thus the edits shared among systems are scored once.
+
+        Args:
+            sources (list[str]): Source sentences.
+                The shape is (num_sents, ).
+            references (list[list[str]]): Reference sentences.
+                The shape is (num_refs, num_sents).
+            edits_list (list[list[list[ERRANT.Edit]]]): The edits to be weighted.
+                The shape is (num_sents, num_refs, num_edits).
+
+        Returns:
+            list[list[dict[tuple, float]]]: The weight of each edit with the key (o_start, o_end, c_str).
+                The shape is (num_sents, num_refs).
+        '''
+        pairs = dict()  # (sentence, reference) -> index of the weight model input
+        requests = []  # (num_sents, num_refs, ) of (source pair id, {edit key: edited pair id})
+        for sent_id, src in enumerate(sources):
+            requests.append([])
+            for ref_id, edits in enumerate(edits_list[sent_id]):
+                ref = references[ref_id][sent_id]
+                edit_pairs = dict()
+                for e in edits:
+                    key = (e.o_start, e.o_end, e.c_str)
+                    if key not in edit_pairs:
+                        edit_pairs[key] = pairs.setdefault(
+                            (self.apply_edits(src, [e]), ref), len(pairs)
+                        )
+                src_pair = pairs.setdefault((src, ref), len(pairs)) \
+                    if edit_pairs else None
+                requests[-1].append((src_pair, edit_pairs))
+        scores = self.weight_model_scores(list(pairs))
+        return [[
+            {
+                key: abs(scores[pair_id] - scores[src_pair]) \
+                    for key, pair_id in edit_pairs.items()
+            } for src_pair, edit_pairs in sent_requests
+        ] for sent_requests in requests]
+
+    def prepare_systems(
+        self,
+        sources: list[str],
+        hypotheses: list[list[str]],
+        references: list[list[str]]
+    ) -> None:
+        '''Extract the edits of all systems and compute their weights at once.
+            See ERRANT.prepare_systems() for the details.
+        '''
+        super().prepare_systems(sources, hypotheses, references)
+        classify = not self.config.skip_classification
+        edits_list = []  # shape will be: (num_sents, num_refs)
+        for sent_id, src in enumerate(sources):
+            hyp_edits = sum([
+                self.edit_extraction(src, hyps[sent_id], classify) for hyps in hypotheses
+            ], [])
+            edits_list.append([
+                hyp_edits + self.edit_extraction(src, refs[sent_id], classify) \
+                    for refs in references
+            ])
+        self.calc_corpus_edit_weights(sources, references, edits_list)
 
     def score_base(
         self,
         sources: list[str],
         hypotheses: list[str],
-        references: list[list[str]]
+        references: list[list[str]],
+        classify: bool = True
     ) -> list[list[dict[str, "Score"]]]:
         '''Calculate scores while retaining sentence and reference boundaries.
             The results can be aggregated according to the purpose,
@@ -79,6 +203,7 @@ class PTERRANT(ERRANT):
             hypothesis (list[str]): Corrected sentences.
             references (list[list[str]]): Reference sentences.
                 The shape is (the number of references, the number of sentences).
+            classify (bool): Whether the error types are classified.
         
         Returns:
             list[list[dict[str, "Score"]]]: The verbose scores.
@@ -87,39 +212,53 @@ class PTERRANT(ERRANT):
         '''
         num_sents = len(sources)
         num_refs = len(references)
-        scores = []  # shape will be: (num_sents, num_refs, )
+        self.prepare_edit_extraction(
+            sources, self.edit_targets([hypotheses], references), classify
+        )
+        hyp_edits_list = []  # shape will be: (num_sents, )
+        ref_edits_list = []  # shape will be: (num_sents, num_refs)
         for sent_id in range(num_sents):
-            hyp_edits = self.edit_extraction(
+            hyp_edits_list.append(self.edit_extraction(
                 sources[sent_id],
-                hypotheses[sent_id]
-            )
-            ref_edits_list = [self.edit_extraction(
+                hypotheses[sent_id],
+                classify
+            ))
+            ref_edits_list.append([self.edit_extraction(
                 sources[sent_id],
-                references[ref_id][sent_id]
-            ) for ref_id in range(num_refs)]
-            
+                references[ref_id][sent_id],
+                classify
+            ) for ref_id in range(num_refs)])
+        # The weights of all edits are computed at once.
+        weights_list = self.calc_corpus_edit_weights(
+            sources,
+            references,
+            [
+                [hyp_edits + ref_edits for ref_edits in ref_edits_for_refs] \
+                    for hyp_edits, ref_edits_for_refs in zip(hyp_edits_list, ref_edits_list)
+            ]
+        )
+        scores = []  # shape will be: (num_sents, num_refs, )
+        for sent_id in range(num_sents):
             sent_scores = []  # shape will be: (num_refs, )
-            h_edits = [(e.o_start, e.o_end, e.c_str) for e in hyp_edits]
-            h_types = [e.type for e in hyp_edits]
-            for ref_id, ref_edits in enumerate(ref_edits_list):
-                weights = self.calc_edit_weights(
+            h_edits, h_types, h_set = self.edit_index(hyp_edits_list[sent_id])
+            for ref_id in range(num_refs):
+                weights = weights_list[sent_id][ref_id]
+                r_edits, r_types, r_set = self.reference_edit_index(
                     sources[sent_id],
                     references[ref_id][sent_id],
-                    hyp_edits + ref_edits
+                    classify
                 )
-                r_edits = [(e.o_start, e.o_end, e.c_str) for e in ref_edits]
-                r_types = [e.type for e in ref_edits]
                 this_score = dict()
                 for h_edit, h_type in zip(h_edits, h_types):
                     this_score[h_type] = this_score.get(
                         h_type, self.Score(beta=self.config.beta)
                     )
-                    if h_edit in r_edits:
+                    if h_edit in r_set:
                         this_score[h_type].tp += weights[h_edit]
                     else:
                         this_score[h_type].fp += weights[h_edit]
                 for r_edit, r_type in zip(r_edits, r_types):
-                    if r_edit not in h_edits:
+                    if r_edit not in h_set:
                         this_score[r_type] = this_score.get(
                             r_type, self.Score(beta=self.config.beta)
                         )
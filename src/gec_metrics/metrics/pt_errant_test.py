@@ -52,3 +52,54 @@ class TestPTERRANT:
         print(sent_score)
         assert [math.isclose(s1, s2, abs_tol=1e-6) \
                 for s1, s2 in zip(sent_score, gold_sent_score)]
+
+    def test_calc_corpus_edit_weights(self):
+        scorer = PTERRANT(PTERRANT.Config())
+        edits_list = [
+            [
+                scorer.edit_extraction(src, hyp) + scorer.edit_extraction(src, ref[sent_id]) \
+                    for ref in REFS
+            ] for sent_id, (src, hyp) in enumerate(zip(SRCS, HYPS))
+        ]
+        weights_list = scorer.calc_corpus_edit_weights(SRCS, REFS, edits_list)
+        # The gold weights are computed edit by edit on another instance,
+        #   so that the caches of the scorer are not used.
+        weight_model = BertScore(BertScore.Config())
+        for sent_id, src in enumerate(SRCS):
+            for ref_id, refs in enumerate(REFS):
+                ref = refs[sent_id]
+                src_score = weight_model.score_sentence([src], [[ref]])[0]
+                gold = dict()
+                for e in edits_list[sent_id][ref_id]:
+                    key = (e.o_start, e.o_end, e.c_str)
+                    if key in gold:
+                        continue
+                    edited_score = weight_model.score_sentence(
+                        [scorer.apply_edits(src, [e])], [[ref]]
+                    )[0]
+                    gold[key] = abs(edited_score - src_score)
+                weights = weights_list[sent_id][ref_id]
+                assert weights.keys() == gold.keys()
+                assert all(math.isclose(weights[k], gold[k], abs_tol=1e-6) for k in gold)
+
+    def test_weight_cache(self, tmp_path):
+        config = PTERRANT.Config(weight_cache=str(tmp_path / 'weight.cache'))
+        scorer = PTERRANT(config)
+        score = scorer.score_corpus(SRCS, HYPS, REFS)
+        # The edits that are already weighted are not weighted again.
+        num_entries = len(scorer.cache_weight)
+        scorer.rank_systems(SRCS, [HYPS, HYPS], REFS)
+        assert len(scorer.cache_weight) == num_entries
+        # The scores are restored from the file without the weight model.
+        restored = PTERRANT(config)
+        assert restored.score_corpus(SRCS, HYPS, REFS) == score
+        assert restored.cache_info()['cache_weight_disk'].misses == 0
+
+    def test_bounded_weight_cache(self):
+        scorer = PTERRANT(PTERRANT.Config(weight_cache_max_entries=2))
+        unbounded_scorer = PTERRANT(PTERRANT.Config())
+        assert scorer.score_sentence(SRCS, HYPS, REFS) \
+            == unbounded_scorer.score_sentence(SRCS, HYPS, REFS)
+        info = scorer.cache_info()['cache_weight']
+        assert info.num_entries <= 2
+        assert info.evictions > 0
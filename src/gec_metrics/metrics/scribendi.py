@@ -1,4 +1,5 @@
-from .base import MetricBase, MetricBaseForReferenceFree
+from .base import MetricBaseForReferenceFree
+from .batching import run_length_batches
 from dataclasses import dataclass
 from transformers import AutoModelForCausalLM, AutoTokenizer
 import torch
@@ -7,18 +8,21 @@ import abc
 
 class Scribendi(MetricBaseForReferenceFree):
     @dataclass
-    class Config(MetricBase.Config):
+    class Config(MetricBaseForReferenceFree.Config):
         '''Scribendi configuration.
             - model (str): Model id of a language model.
             - threshold (float): Threshold for the maximum values of 
                 the token sort ratio and the levenshtein distance ratio.
             - no_cuda (bool): If True, work on CPU.
             - batch_size (int): Batch size for the inference.
+            - max_tokens (int): The maximum number of tokens in a batch including padding.
+                If None, only batch_size is used.
         '''
         model: str = 'gpt2'
         threshold: float = 0.8
         no_cuda: bool = False
         batch_size: int = 32
+        max_tokens: int = None
 
     def __init__(self, config: Config = None):
         super().__init__(config)
@@ -28,27 +32,18 @@ class Scribendi(MetricBaseForReferenceFree):
         if not self.config.no_cuda:
             self.model.cuda()
     
-    def score_corpus(
-        self,
-        sources: list[str],
-        hypotheses: list[str]
-    ) -> float:
-        '''Calculate a corpus-level score.
+    def aggregate_sentence_scores(self, scores: list[float]) -> float:
+        '''Aggregate sentence-level scores into a corpus-level score.
+        Scribendi uses the sum of the sentence-level scores.
 
         Args:
-            sources (list[str]): Source sentence.
+            scores (list[float]): The sentence-level scores.
                 The shape is (num_sentences, )
-            hypotheses (list[str]): Corrected sentences.
-                The shape is (num_sentences, )
-        
+
         Returns:
             float: The corpus-level score.
         '''
-        sentence_scores = self.score_sentence(
-            sources,
-            hypotheses
-        )
-        return sum(sentence_scores)
+        return sum(scores)
     
     def score_sentence(
         self,
@@ -111,14 +106,17 @@ class Scribendi(MetricBaseForReferenceFree):
         Returns:
             list[float]: The list of perplexity.
         '''
-        ppls = []
+        if len(sents) == 0:
+            return []
         sents = [self.tokenizer.bos_token + sent for sent in sents]
-        batch_size = self.config.batch_size
-        for i in range(len(sents)//batch_size+1):
-            batch = sents[i*batch_size:(i+1)*batch_size]
-            if len(batch) == 0:
-                continue
-            inputs = self.tokenizer(batch, return_tensors='pt', padding=True)
+        # Tokenize once, and pad each batch of similar lengths to its longest input.
+        encode = self.tokenizer(sents)
+
+        def batch_ppls(ids: list[int]) -> list[float]:
+            inputs = self.tokenizer.pad(
+                {k: [v[i] for i in ids] for k, v in encode.items()},
+                return_tensors='pt'
+            )
             if not self.config.no_cuda:
                 inputs = {k: v.cuda() for k, v in inputs.items()}
             with torch.no_grad():
@@ -138,8 +136,14 @@ class Scribendi(MetricBaseForReferenceFree):
                 ).view(batch_size, seq_len)
                 # The probability is normalized by the length.
                 loss = (loss * shift_mask).sum(dim=1) / shift_mask.sum(dim=1)
-                ppls += torch.exp(loss).tolist()
-        return ppls
+                return torch.exp(loss).tolist()
+
+        return run_length_batches(
+            batch_ppls,
+            [len(ids) for ids in encode['input_ids']],
+            batch_size=self.config.batch_size,
+            max_tokens=self.config.max_tokens
+        )
                 
     def token_sort_ratio(self, src: str, pred: str) -> float:
         '''
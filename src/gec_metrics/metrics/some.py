@@ -1,12 +1,12 @@
-from .base import MetricBase, MetricBaseForReferenceFree
+from .base import MetricBaseForReferenceFree
+from .batching import run_length_batches
 from dataclasses import dataclass
 from transformers import AutoModelForSequenceClassification, AutoTokenizer
 import torch
-import math
 
 class SOME(MetricBaseForReferenceFree):
     @dataclass
-    class Config(MetricBase.Config):
+    class Config(MetricBaseForReferenceFree.Config):
         '''SOME configuration.
             - model_g (str): Model for grammaticality.
             - model_f (str): Model for fluency.
@@ -17,6 +17,8 @@ class SOME(MetricBaseForReferenceFree):
             - no_cuda (bool): If True, work on CPU.
             - batch_size (int): Batch size for inference.
             - max_length (int): Maximum length of inputs.
+            - max_tokens (int): The maximum number of tokens in a batch including padding.
+                If None, only batch_size is used.
         '''
         model_g: str = 'gfm-models/grammer'
         model_f: str = 'gfm-models/fluency'
@@ -27,6 +29,7 @@ class SOME(MetricBaseForReferenceFree):
         no_cuda: bool = False
         batch_size: int = 32
         max_length: int = 128
+        max_tokens: int = None
 
     def __init__(self, config: Config = None):
         super().__init__(config)
@@ -63,43 +66,44 @@ class SOME(MetricBaseForReferenceFree):
         Returns:
             list[float]: The sentence-level scores.
         '''
-        batch_size = self.config.batch_size
-        scores = []
-        for i in range(math.ceil(len(sources) / batch_size)):
-            tokenizer_args = {
-                'max_length': self.config.max_length,
-                'padding': "max_length",
-                'truncation': True,
-                'return_tensors': 'pt'
-            }
-            encode_f = self.tokenizer(
-                hypotheses[i*batch_size:(i+1)*batch_size],
-                **tokenizer_args
-            )
-            encode_g = self.tokenizer(
-                hypotheses[i*batch_size:(i+1)*batch_size],
-                **tokenizer_args
-            )
-            encode_m = self.tokenizer(
-                sources[i*batch_size:(i+1)*batch_size],
-                hypotheses[i*batch_size:(i+1)*batch_size],
-                **tokenizer_args
-            )
-            encode_f = {k: v.to(self.model_f.device) for k, v in encode_f.items()}
-            encode_g = {k: v.to(self.model_g.device) for k, v in encode_g.items()}
-            encode_m = {k: v.to(self.model_m.device) for k, v in encode_m.items()}
+        if len(sources) == 0:
+            return []
+        tokenizer_args = {
+            'max_length': self.config.max_length,
+            'truncation': True
+        }
+        # Tokenize once, and pad each batch to its longest input.
+        #   The grammaticality and the fluency models share the inputs.
+        encode_h = self.tokenizer(hypotheses, **tokenizer_args)
+        encode_m = self.tokenizer(sources, hypotheses, **tokenizer_args)
+        lengths = [
+            max(len(h), len(m)) for h, m in zip(encode_h['input_ids'], encode_m['input_ids'])
+        ]
+
+        def batch_scores(ids: list[int]) -> list[float]:
+            def pad(encode, device):
+                batch = self.tokenizer.pad(
+                    {k: [v[i] for i in ids] for k, v in encode.items()},
+                    return_tensors='pt'
+                )
+                return {k: v.to(device) for k, v in batch.items()}
             with torch.no_grad():
-                scores_g = self.model_g(**encode_g).logits.view(-1).tolist()
+                scores_g = self.model_g(**pad(encode_h, self.model_g.device)).logits.view(-1).tolist()
                 scores_g = [self.min_max_normalize(s) for s in scores_g]
-                scores_f = self.model_f(**encode_f).logits.view(-1).tolist()
+                scores_f = self.model_f(**pad(encode_h, self.model_f.device)).logits.view(-1).tolist()
                 scores_f = [self.min_max_normalize(s) for s in scores_f]
-                scores_m = self.model_m(**encode_m).logits.view(-1).tolist()
+                scores_m = self.model_m(**pad(encode_m, self.model_m.device)).logits.view(-1).tolist()
                 scores_m = [self.min_max_normalize(s) for s in scores_m]
-            batch_scores = [
+            return [
                 self.config.weight_f * s_f \
                 + self.config.weight_g * s_g \
                 + self.config.weight_m * s_m \
                 for s_f, s_g, s_m in zip(scores_f, scores_g, scores_m)
             ]
-            scores += batch_scores
-        return scores
+
+        return run_length_batches(
+            batch_scores,
+            lengths,
+            batch_size=self.config.batch_size,
+            max_tokens=self.config.max_tokens
+        )
\ No newline at end of file